@@ -1,99 +1,158 @@
 import cv2
-import math
-from ultralytics import YOLO
-
-# 1. Load the YOLOv8n model
-print("Loading model...")
-model = YOLO('yolov8n.pt')
-
-# 2. Load the image
-image_path = 'ESUA/phase2_spatial_understanding/sample.jpg'
-image = cv2.imread(image_path)
-
-if image is None:
-    print(f"Error: Could not load image from {image_path}")
-    exit()
-
-# 3. Run inference
-print("Running inference...")
-results = model(image)
-result = results[0]
-
-# List to store detected object details
-objects = []
-
-print("\n--- Detected Objects ---")
-# 4. Extract Objects and Calculate Centers
-for box in result.boxes:
-    # Coordinates
-    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-    
-    # Class Name
-    class_id = int(box.cls[0].item())
-    class_name = result.names[class_id]
-    
-    # Calculate Center Point
-    cx = (x1 + x2) // 2
-    cy = (y1 + y2) // 2
-    
-    # Store for later
-    objects.append({
-        "name": class_name,
-        "box": (x1, y1, x2, y2),
-        "center": (cx, cy)
-    })
-    
-    print(f"Object: {class_name} | Center: ({cx}, {cy})")
-
-# 5. Determine Spatial Relationships
-print("\n--- Spatial Relationships ---")
+import numpy as np
 
 # Threshold for "Near" (pixels) - this is a simple heuristic
-NEAR_THRESHOLD = 400 
-
-for i in range(len(objects)):
-    for j in range(i + 1, len(objects)):
-        obj_a = objects[i]
-        obj_b = objects[j]
-        
-        name_a = obj_a['name']
-        name_b = obj_b['name']
-        
-        center_a = obj_a['center']
-        center_b = obj_b['center']
-        
-        # Calculate Euclidean Distance
-        distance = math.sqrt((center_a[0] - center_b[0])**2 + (center_a[1] - center_b[1])**2)
-        
-        # Determine Near/Far
-        proximity = "near" if distance < NEAR_THRESHOLD else "far from"
-        
-        # Determine Left/Right (based on X coordinate)
-        if center_a[0] < center_b[0]:
-            horizontal_rel = f"{name_a} is to the left of {name_b}"
-        else:
-            horizontal_rel = f"{name_a} is to the right of {name_b}"
-            
-        # Determine Overlapping
-        # Two rectangles do NOT overlap if one is to the right of the other, 
-        # or one is above the other.
-        box_a = obj_a['box'] # x1, y1, x2, y2
-        box_b = obj_b['box']
-        
-        # Check for NO overlap conditions
-        no_overlap = (box_a[2] < box_b[0] or  # A right < B left
-                      box_a[0] > box_b[2] or  # A left > B right
-                      box_a[3] < box_b[1] or  # A bottom < B top
-                      box_a[1] > box_b[3])    # A top > B bottom
-        
-        overlap_status = "overlaps with" if not no_overlap else "does not overlap"
-        
-        # Print the sentence
-        print(f"- {horizontal_rel}")
-        print(f"- {name_a} is {proximity} {name_b} (Distance: {distance:.2f})")
-        if not no_overlap:
-             print(f"- {name_a} {overlap_status} {name_b}")
-        print("---")
+NEAR_THRESHOLD = 400
 
+# Max gap (pixels) between a bottom edge and a top edge to count as "on top of"
+TOUCH_TOLERANCE = 10
 
+
+def compute_relation_matrices(boxes, near_threshold=NEAR_THRESHOLD, touch_tolerance=TOUCH_TOLERANCE):
+    """
+    Computes all pairwise spatial relations in one NumPy pass.
+
+    Entry [i, j] of every matrix describes object i relative to object j,
+    e.g. left_of[i, j] means "i is to the left of j". Diagonals are False / 0.
+
+    Args:
+        boxes (array-like): (N, 4) boxes as x1, y1, x2, y2.
+        near_threshold (float): Centre distance below which objects are "near".
+        touch_tolerance (float): Pixel gap allowed for "on top of".
+
+    Returns:
+        dict: 'distance', 'intersection', 'iou' as (N, N) float32 arrays and
+        'near', 'overlaps', 'left_of', 'right_of', 'above', 'below',
+        'contains', 'inside', 'on_top_of' as (N, N) bool arrays.
+    """
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    n = len(b)
+    x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    cx = (x1 + x2) / 2
+    cy = (y1 + y2) / 2
+    off_diag = ~np.eye(n, dtype=bool)
+
+    # Centre distance
+    dx = cx[:, None] - cx[None, :]
+    dy = cy[:, None] - cy[None, :]
+    distance = np.hypot(dx, dy)
+
+    # Overlap
+    overlap_w = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    overlap_h = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    intersection = overlap_w * overlap_h
+    area = (x2 - x1) * (y2 - y1)
+    union = area[:, None] + area[None, :] - intersection
+    iou = np.where(union > 0, intersection / np.maximum(union, 1e-6), 0).astype(np.float32)
+    np.fill_diagonal(intersection, 0)
+    np.fill_diagonal(iou, 0)
+
+    # Containment: box j lies entirely inside box i
+    contains = ((x1[:, None] <= x1[None, :]) & (y1[:, None] <= y1[None, :]) &
+                (x2[:, None] >= x2[None, :]) & (y2[:, None] >= y2[None, :]) & off_diag)
+
+    # "On top of": i's bottom edge touches j's top edge, with horizontal overlap
+    on_top_of = ((np.abs(y2[:, None] - y1[None, :]) <= touch_tolerance) &
+                 (overlap_w > 0) & (cy[:, None] < cy[None, :]) & off_diag)
+
+    left_of = dx < 0
+    above = dy < 0
+
+    return {
+        'distance': distance,
+        'intersection': intersection,
+        'iou': iou,
+        'near': (distance < near_threshold) & off_diag,
+        'overlaps': intersection > 0,
+        'left_of': left_of,
+        'right_of': left_of.T.copy(),
+        'above': above,
+        'below': above.T.copy(),
+        'contains': contains,
+        'inside': contains.T.copy(),
+        'on_top_of': on_top_of
+    }
+
+
+def main():
+    from ultralytics import YOLO
+
+    # 1. Load the YOLOv8n model
+    print("Loading model...")
+    model = YOLO('yolov8n.pt')
+
+    # 2. Load the image
+    image_path = 'ESUA/phase2_spatial_understanding/sample.jpg'
+    image = cv2.imread(image_path)
+
+    if image is None:
+        print(f"Error: Could not load image from {image_path}")
+        exit()
+
+    # 3. Run inference
+    print("Running inference...")
+    results = model(image)
+    result = results[0]
+
+    # List to store detected object details
+    objects = []
+
+    print("\n--- Detected Objects ---")
+    # 4. Extract Objects and Calculate Centers
+    for box in result.boxes:
+        # Coordinates
+        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+
+        # Class Name
+        class_id = int(box.cls[0].item())
+        class_name = result.names[class_id]
+
+        # Calculate Center Point
+        cx = (x1 + x2) // 2
+        cy = (y1 + y2) // 2
+
+        # Store for later
+        objects.append({
+            "name": class_name,
+            "box": (x1, y1, x2, y2),
+            "center": (cx, cy)
+        })
+
+        print(f"Object: {class_name} | Center: ({cx}, {cy})")
+
+    # 5. Determine Spatial Relationships (all pairs at once)
+    print("\n--- Spatial Relationships ---")
+
+    rel = compute_relation_matrices([obj['box'] for obj in objects])
+
+    for i in range(len(objects)):
+        for j in range(i + 1, len(objects)):
+            name_a = objects[i]['name']
+            name_b = objects[j]['name']
+
+            # Determine Near/Far
+            proximity = "near" if rel['near'][i, j] else "far from"
+
+            # Determine Left/Right (based on X coordinate)
+            if rel['left_of'][i, j]:
+                horizontal_rel = f"{name_a} is to the left of {name_b}"
+            else:
+                horizontal_rel = f"{name_a} is to the right of {name_b}"
+
+            # Print the sentence
+            print(f"- {horizontal_rel}")
+            print(f"- {name_a} is {proximity} {name_b} (Distance: {rel['distance'][i, j]:.2f})")
+            if rel['overlaps'][i, j]:
+                print(f"- {name_a} overlaps with {name_b} (IoU: {rel['iou'][i, j]:.2f})")
+            if rel['contains'][i, j] or rel['contains'][j, i]:
+                outer, inner = (name_a, name_b) if rel['contains'][i, j] else (name_b, name_a)
+                print(f"- {inner} is inside {outer}")
+            if rel['on_top_of'][i, j] or rel['on_top_of'][j, i]:
+                top, bottom = (name_a, name_b) if rel['on_top_of'][i, j] else (name_b, name_a)
+                print(f"- {top} is on top of {bottom}")
+            print("---")
+
+
+if __name__ == "__main__":
+    main()
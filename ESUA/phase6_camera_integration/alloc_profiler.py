@@ -0,0 +1,401 @@
+# Allocation Profiler and Steady-State GC
+
+# Long-running runners show latency jitter that grows with uptime. The usual
+# suspect is the cyclic garbage collector: every short-lived dict, tuple and
+# list the hot loop creates counts towards a collection, and a full (gen 2)
+# collection walks every object the process owns - model weights wrappers,
+# caches, history - in the middle of a frame.
+#
+# AllocProfiler (opt-in, slows the loop down) reports per stage and frame:
+#   - net allocated memory blocks (sys.getallocatedblocks),
+#   - transient peak bytes (tracemalloc peak above the stage's starting point),
+# times every collection via gc.callbacks, and compares tracemalloc
+# snapshots every SNAPSHOT_INTERVAL frames to list the lines whose
+# allocations keep growing.
+#
+# SteadyStateGC keeps collections out of the frame path once the runner is
+# warm: after WARMUP_FRAMES it collects once and gc.freeze()s everything that
+# exists (model, buffers, caches), so later collections never scan it, then
+#   - 'tuned':  keeps the default gen-0 passes but makes older ones rare, or
+#   - 'manual': disables automatic collection and collects at the end of a
+#               frame instead: a cheap gen-0 pass every COLLECT_EVERY frames,
+#               a gen-1 pass every GEN1_EVERY frames and a full pass every
+#               FULL_EVERY frames, so cycles that survived a young pass are
+#               still freed and memory stays bounded. The older passes run
+#               early (from half their interval on) on an idle frame, i.e.
+#               one the motion gate let skip inference.
+#
+# Besides the frame pool and display buffer, camera_runner reuses its
+# per-frame result containers in every mode: the reasoning object list, the
+# risk pair list (risk_rules.find_risk_pairs(out=...)), the onset list and
+# the explanation lines. Object dicts, event dicts and the explanation
+# context built at an onset are not pooled: the tracker, the temporal rules
+# and the event store keep references to them beyond the frame.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/camera_runner.py --profile-alloc --steady-state tuned
+#   python ESUA/phase6_camera_integration/alloc_profiler.py bench --frames 5000
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# --- CONFIGURATION ---
+SNAPSHOT_INTERVAL = 300     # Frames between tracemalloc snapshot comparisons
+TOP_SITES = 8               # Allocation sites listed in the report
+LATENCY_WINDOW = 4096       # Frame latencies kept for percentiles (ring buffer)
+WARMUP_FRAMES = 50
+TUNED_THRESHOLD = (700, 100, 1000)  # Default gen-0 passes; older generations rarely
+COLLECT_EVERY = 10          # 'manual' mode: frames between gen-0 passes
+GEN1_EVERY = 300            # 'manual' mode: frames between gen-1 passes (~10 s at 30 FPS)
+FULL_EVERY = 9000           # 'manual' mode: frames between full passes (~5 min at 30 FPS)
+GC_MODES = ('off', 'tuned', 'manual')
+HISTORY_FRAMES = 300        # bench: frames of objects kept alive
+LINGER_FRAMES = 40          # bench: frames a garbage cycle stays referenced (outlives a gen-0 pass)
+
+
+class GCMonitor:
+    """
+    Times every garbage collection through gc.callbacks.
+    """
+
+    def __init__(self):
+        self.counts = [0, 0, 0]
+        self.pause = [0.0, 0.0, 0.0]
+        self.max_pause = 0.0
+        self.collected = 0
+        self._start = None
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            pause = time.perf_counter() - self._start
+            generation = info['generation']
+            self.counts[generation] += 1
+            self.pause[generation] += pause
+            self.max_pause = max(self.max_pause, pause)
+            self.collected += info['collected']
+            self._start = None
+
+    def close(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+    def report(self):
+        parts = [f"gen{g}: {self.counts[g]} ({1e3 * self.pause[g]:.1f}ms)" for g in range(3)]
+        return (f"GC: {', '.join(parts)} | longest pause {1e3 * self.max_pause:.2f}ms, "
+                f"{self.collected} objects collected")
+
+
+class LatencyRing:
+    """
+    Fixed-size ring of frame latencies for percentiles.
+    """
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, value):
+        self._values[self.count % len(self._values)] = value
+        self.count += 1
+
+    def percentiles(self, q=(50, 99)):
+        n = min(self.count, len(self._values))
+        if n == 0:
+            return [0.0 for _ in q]
+        return np.percentile(self._values[:n], q).tolist()
+
+    def max(self):
+        n = min(self.count, len(self._values))
+        return float(self._values[:n].max()) if n else 0.0
+
+
+class AllocProfiler:
+    """
+    Attributes allocations and time to named stages of a frame.
+
+    Call mark(stage) after each stage (the work since the previous mark belongs
+    to `stage`) and end_frame(stage) after the last one.
+    """
+
+    def __init__(self, snapshot_interval=SNAPSHOT_INTERVAL, top=TOP_SITES):
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.stages = {}        # name -> [runs, blocks, peak bytes, seconds]
+        self.frames = 0
+        self.latency = LatencyRing()
+        self.gc = GCMonitor()
+        self.growth = []        # Top growing allocation sites from the last comparison
+        tracemalloc.start()
+        self._snapshot = None
+        self._frame_start = None
+        self._begin()
+
+    def _begin(self):
+        tracemalloc.reset_peak()
+        self._traced = tracemalloc.get_traced_memory()[0]
+        self._blocks = sys.getallocatedblocks()
+        self._time = time.perf_counter()
+        if self._frame_start is None:
+            self._frame_start = self._time
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        current, peak = tracemalloc.get_traced_memory()
+        entry = self.stages.setdefault(stage, [0, 0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += sys.getallocatedblocks() - self._blocks
+        entry[2] += max(0, peak - self._traced)
+        entry[3] += now - self._time
+        self._begin()
+
+    def end_frame(self, stage):
+        self.mark(stage)
+        self.latency.add(self._time - self._frame_start)
+        self._frame_start = self._time
+        self.frames += 1
+        if self.frames % self.snapshot_interval == 0:
+            self._compare_snapshots()
+            self._begin()
+
+    def _compare_snapshots(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        if self._snapshot is not None:
+            stats = snapshot.compare_to(self._snapshot, 'lineno')
+            self.growth = [s for s in stats if s.size_diff > 0][:self.top]
+        self._snapshot = snapshot
+
+    def close(self):
+        tracemalloc.stop()
+        self.gc.close()
+
+    def report(self):
+        lines = [f"Allocations over {self.frames} frames (per run of each stage):",
+                 f"{'stage':>10} | {'runs':>6} | {'net blocks':>10} | {'peak KB':>8} | ms"]
+        for name, (runs, blocks, peak, seconds) in self.stages.items():
+            lines.append(f"{name:>10} | {runs:6d} | {blocks / runs:10.1f} | {peak / runs / 1024:8.1f} | "
+                         f"{1e3 * seconds / runs:.2f}")
+        p50, p99 = self.latency.percentiles()
+        lines.append(f"Frame latency: p50 {1e3 * p50:.2f}ms, p99 {1e3 * p99:.2f}ms, "
+                     f"max {1e3 * self.latency.max():.2f}ms (profiler overhead included)")
+        lines.append(self.gc.report())
+        if self.growth:
+            lines.append(f"Growing allocation sites (last {self.snapshot_interval} frames):")
+            lines.extend(f"  {stat}" for stat in self.growth)
+        return '\n'.join(lines)
+
+
+class SteadyStateGC:
+    """
+    Keeps garbage collection out of the steady-state frame path (see module header).
+    """
+
+    def __init__(self, mode='tuned', warmup_frames=WARMUP_FRAMES, collect_every=COLLECT_EVERY,
+                 gen1_every=GEN1_EVERY, full_every=FULL_EVERY):
+        """
+        Args:
+            mode (str): 'off', 'tuned' or 'manual' (see module header).
+            warmup_frames (int): Frames before the freeze.
+            collect_every, gen1_every, full_every (int): 'manual' mode: frames
+                between gen-0, gen-1 and full passes.
+        """
+        if mode not in GC_MODES:
+            raise ValueError(f"Unknown GC mode: {mode}")
+        self.mode = mode
+        self.warmup_frames = warmup_frames
+        self.collect_every = collect_every
+        self.every = (collect_every, gen1_every, full_every)
+        self.frames = 0
+        self.frozen = 0
+        self._last = [0, 0, 0]       # Frame of the last pass reaching each generation
+        self._threshold = gc.get_threshold()
+        self._was_enabled = gc.isenabled()
+
+        # Statistics ('manual' mode)
+        self.collections = [0, 0, 0]
+        self.idle_collections = 0    # Gen-1 / full passes run early on an idle frame
+        self.collect_time = [0.0, 0.0, 0.0]
+        self.max_pause = [0.0, 0.0, 0.0]
+        self.collected = 0
+
+    def _collect(self, generation):
+        start = time.perf_counter()
+        self.collected += gc.collect(generation)
+        pause = time.perf_counter() - start
+        self.collections[generation] += 1
+        self.collect_time[generation] += pause
+        self.max_pause[generation] = max(self.max_pause[generation], pause)
+        for g in range(generation + 1):
+            self._last[g] = self.frames
+
+    def frame_done(self, idle=False):
+        """
+        Call once per frame, after the frame has been shown.
+
+        Args:
+            idle (bool): Nothing was analyzed this frame (e.g. motion-gated), so
+                an older-generation pass due soon may run now.
+        """
+        if self.mode == 'off':
+            return
+        self.frames += 1
+        if self.frames == self.warmup_frames:
+            gc.collect()
+            gc.freeze()
+            self.frozen = gc.get_freeze_count()
+            self._last = [self.frames] * 3
+            if self.mode == 'tuned':
+                gc.set_threshold(*TUNED_THRESHOLD)
+            else:
+                gc.disable()
+        elif self.mode == 'manual' and self.frames > self.warmup_frames:
+            for generation in (2, 1, 0):
+                since = self.frames - self._last[generation]
+                every = self.every[generation]
+                if since >= every:
+                    self._collect(generation)
+                    break
+                if generation and idle and since >= every // 2:
+                    self._collect(generation)
+                    self.idle_collections += 1
+                    break
+
+    def close(self):
+        gc.set_threshold(*self._threshold)
+        if self._was_enabled:
+            gc.enable()
+        gc.unfreeze()
+
+    def report(self):
+        if self.mode == 'off':
+            return "GC: default settings"
+        line = f"GC: steady-state '{self.mode}' mode, {self.frozen} objects frozen after {self.warmup_frames} frames"
+        if self.mode == 'manual':
+            passes = ', '.join(f"gen{g} {self.collections[g]}x max {1e3 * self.max_pause[g]:.1f}ms"
+                               for g in range(3))
+            line += (f" | manual passes: {passes} ({self.idle_collections} on idle frames), "
+                     f"{1e3 * sum(self.collect_time):.0f}ms total, {self.collected} objects freed")
+        return line
+
+
+def bench(mode, frames, heap_objects, objects_per_frame, garbage=0, seed=0):
+    """
+    Runs the live runner's reasoning and drawing path on synthetic detections
+    under one GC mode and measures per-frame latency (GC work included).
+
+    `heap_objects` long-lived objects stand in for what a real runner keeps
+    alive (model wrappers, caches): full collections have to walk them. The
+    objects of the last HISTORY_FRAMES frames are kept too, as the event store
+    queue and trackers do, so young objects survive and get promoted.
+    `garbage` reference cycles per frame stand in for the detector's
+    per-call objects, which only the collector can free; they stay referenced
+    for LINGER_FRAMES frames, so they survive a gen-0 pass before dying.
+
+    Returns:
+        dict: Latency percentiles (seconds), collections per generation, GC
+        time and the unfrozen objects left in the older generations at the end
+        (grows without bound if cycles there are never collected).
+    """
+    import collections
+    import cv2
+    import detections
+    import risk_events
+    import risk_rules
+    import temporal_rules
+
+    rng = np.random.default_rng(seed)
+    names = {0: 'person', 41: 'cup', 63: 'laptop', 73: 'book', 76: 'scissors'}
+    class_ids = np.array(list(names), dtype=np.int32)
+    display = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    heap = [{'id': i, 'parts': [i, str(i)]} for i in range(heap_objects)]
+    tracker = risk_events.RiskEventTracker(describe=lambda *pair: f"{pair[0]}: {pair[1]['name']}")
+    temporal = temporal_rules.TemporalRuleEngine()
+    history = collections.deque(maxlen=HISTORY_FRAMES)
+    lingering = collections.deque(maxlen=LINGER_FRAMES)
+    steady = SteadyStateGC(mode)
+    ring = LatencyRing(frames)
+    monitor = None
+    reasoning_objects, pairs = [], []   # Reused per frame, like camera_runner's containers
+
+    for i in range(frames + WARMUP_FRAMES):
+        if i == WARMUP_FRAMES:
+            monitor = GCMonitor()  # Steady state only: the warm-up collection is not counted
+        centers = rng.uniform([40, 40], [600, 440], size=(objects_per_frame, 2)).astype(np.float32)
+        boxes = np.hstack([centers - 30, centers + 30])
+        confs = rng.uniform(0.3, 0.9, objects_per_frame).astype(np.float32)
+        ids = class_ids[rng.integers(0, len(class_ids), objects_per_frame)]
+
+        start = time.perf_counter()
+        cycles = []
+        for _ in range(garbage):
+            node = {}
+            node['self'] = node
+            cycles.append(node)
+        lingering.append(cycles)
+        objects = detections.to_objects(boxes, confs, ids, names)
+        reasoning_objects.clear()
+        reasoning_objects.extend(obj for obj in objects if obj['categories'])
+        risk_rules.find_risk_pairs(reasoning_objects, 300, out=pairs)
+        tracker.update(pairs, i / 30.0)
+        temporal.update(objects, pairs, i / 30.0)
+        for obj in objects:
+            x1, y1, x2, y2 = obj['box']
+            cv2.rectangle(display, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        history.append(objects)
+        steady.frame_done()
+        if i >= WARMUP_FRAMES:
+            ring.add(time.perf_counter() - start)
+
+    monitor.close()
+    old_objects = len(gc.get_objects(1)) + len(gc.get_objects(2))
+    steady.close()
+    del heap
+    p50, p99, p999 = ring.percentiles((50, 99, 99.9))
+    return {'mode': mode, 'p50': p50, 'p99': p99, 'p999': p999, 'max': ring.max(),
+            'collections': monitor.counts, 'gc_time': sum(monitor.pause), 'old_objects': old_objects}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steady-state GC benchmark for the ESUA frame path.")
+    parser.add_argument('command', choices=['bench', 'bench-one'])
+    parser.add_argument('--mode', choices=GC_MODES, default='off', help=argparse.SUPPRESS)
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--heap', type=int, default=300000, help="Long-lived objects (simulated runner state)")
+    parser.add_argument('--objects', type=int, default=8, help="Detections per frame")
+    parser.add_argument('--garbage', type=int, default=50, help="Reference cycles per frame (detector-side garbage)")
+    args = parser.parse_args()
+    options = ['--frames', str(args.frames), '--heap', str(args.heap),
+               '--objects', str(args.objects), '--garbage', str(args.garbage)]
+
+    if args.command == 'bench-one':
+        print(json.dumps(bench(args.mode, args.frames, args.heap, args.objects, args.garbage)))
+        return
+
+    print(f"{args.frames} frames, {args.objects} detections/frame, {args.heap} long-lived objects, "
+          f"{args.garbage} cycles/frame")
+    print(f"{'mode':>8} | {'p50 ms':>7} | {'p99 ms':>7} | {'p99.9 ms':>8} | {'max ms':>7} | "
+          f"collections (gen0/1/2) | GC total ms | objects left in gen 1/2")
+    for mode in GC_MODES:
+        # A fresh interpreter per mode, so one run's heap layout does not skew the next
+        out = subprocess.run([sys.executable, __file__, 'bench-one', '--mode', mode] + options,
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:>8} | {1e3 * r['p50']:7.3f} | {1e3 * r['p99']:7.3f} | {1e3 * r['p999']:8.3f} | "
+              f"{1e3 * r['max']:7.2f} | {'/'.join(str(c) for c in r['collections']):>22} | "
+              f"{1e3 * r['gc_time']:11.1f} | {r['old_objects']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# ESUA Analysis Service: asyncio HTTP API around the detection + reasoning pipeline
+
+# Other systems POST an encoded image (JPEG/PNG) and get back objects, spatial
+# relations, risks and explanations as JSON - no webcam or GUI needed.
+#
+# Requests arriving within BATCH_WINDOW_MS of each other are coalesced into a
+# single batched detector call. The detector runs on one dedicated thread;
+# image decoding, rules and templates run on a small thread pool, so the event
+# loop itself only parses HTTP and moves futures around.
+#
+# Endpoints:
+#   POST /analyze   body = image bytes
+#   GET  /health
+#   GET  /metrics
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/analysis_service.py --port 8765 --batch-window-ms 10
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import detections
+import risk_rules
+import explanation_templates
+import object_categories
+import runtime_config
+import spatial_relations
+import thread_budget
+
+# --- CONFIGURATION ---
+HOST = '127.0.0.1'
+PORT = 8765
+MODEL_PATH = 'yolov8n.pt'
+BATCH_WINDOW_MS = 10       # Wait this long after the first request for more to batch with
+MAX_BATCH = 8              # Max images per detector call
+MAX_CONCURRENCY = 32       # Requests being processed at once; the rest wait
+REQUEST_TIMEOUT = 10.0     # Seconds, from request parsed to response ready
+MAX_BODY_BYTES = 10 * 1024 * 1024
+REASONING_WORKERS = 2
+NEAR_THRESHOLD = 300
+CLASS_FILTER = True        # Only detect categorized classes (+ object_categories.DISPLAY_ONLY_CLASSES)
+
+
+def analyze_detections(boxes, confs, class_ids, names, near_threshold=NEAR_THRESHOLD):
+    """
+    Runs Phases 2-4 on one image's detections and returns a JSON-ready dict.
+    """
+    objects = detections.to_objects(boxes, confs, class_ids, names)
+
+    # Same geometry helpers as the runners, so the service cannot diverge from them
+    rel = spatial_relations.compute_relation_matrices([obj['box'] for obj in objects],
+                                                      near_threshold=near_threshold)
+    first, second = np.triu_indices(len(objects), 1)
+    relations = [{
+        'a': i,
+        'b': j,
+        'distance': round(float(rel['distance'][i, j]), 1),
+        'proximity': "near" if rel['near'][i, j] else "far from",
+        'horizontal': "left of" if rel['left_of'][i, j] else "right of"
+    } for i, j in zip(first.tolist(), second.tolist())]
+
+    # Uncategorized objects (e.g. 'person') are reported but never form risk pairs
+    reasoning_objects = [obj for obj in objects if obj['categories']]
+    risks = []
+    for risk_type, obj_a, obj_b in risk_rules.find_risk_pairs(reasoning_objects, near_threshold):
+        context_data = {
+            'obj_a': obj_a['name'],
+            'cat_a': obj_a['categories'][0] if obj_a['categories'] else 'object',
+            'obj_b': obj_b['name'],
+            'cat_b': ','.join(obj_b['categories'])
+        }
+        risks.append({
+            'risk_type': risk_type,
+            'obj_a': obj_a['name'],
+            'obj_b': obj_b['name'],
+            'explanation': explanation_templates.get_explanation(risk_type, context_data)
+        })
+
+    return {'objects': objects, 'relations': relations, 'risks': risks}
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent detect requests into batched detector calls.
+    """
+
+    def __init__(self, model, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH, cpus=None):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.classes = object_categories.class_ids_for(model.names) if CLASS_FILTER else None
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detector',
+                                            initializer=thread_budget.pin_thread, initargs=(cpus,))
+        self._task = None
+
+        # Statistics
+        self.batches = 0
+        self.images = 0
+        self.detect_time = 0.0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def detect(self, image):
+        """
+        Returns (boxes, confs, class_ids, names) for one decoded image.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    def _detect_batch(self, images):
+        start = time.perf_counter()
+        results = self.model(images, classes=self.classes, verbose=False)
+        out = [detections.result_to_arrays(r) + (r.names,) for r in results]
+        self.detect_time += time.perf_counter() - start
+        return out
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests that timed out while waiting are not sent to the detector
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                outputs = await loop.run_in_executor(self._executor, self._detect_batch, [b[0] for b in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.images += len(batch)
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+
+class AnalysisService:
+    """
+    Minimal HTTP/1.1 server (one request per connection) built on asyncio streams.
+    """
+
+    def __init__(self, model, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH,
+                 max_concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT, stream_plan=None, affinity=False):
+        """
+        Args:
+            stream_plan (dict): thread_budget stream plan. Decoding and rules
+                get the capture + reasoning cores, the detector its own cores.
+            affinity (bool): Pin the executor threads to those cores.
+        """
+        workers = REASONING_WORKERS
+        detector_cpus = reasoning_cpus = None
+        if stream_plan:
+            workers = len(stream_plan['capture']) + len(stream_plan['reasoning'])
+            if affinity:
+                detector_cpus = stream_plan['detector']
+                reasoning_cpus = stream_plan['capture'] + stream_plan['reasoning']
+
+        self.batcher = MicroBatcher(model, window_ms, max_batch, cpus=detector_cpus)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = None
+        self._reasoning = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reasoning',
+                                             initializer=thread_budget.pin_thread, initargs=(reasoning_cpus,))
+
+        # Statistics
+        self.started = time.time()
+        self.counters = collections.Counter()
+        self.in_flight = 0
+        self.latencies = collections.deque(maxlen=2000)
+
+    async def analyze(self, body):
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(self._reasoning, decode_image, body)
+        if image is None:
+            raise ValueError("Could not decode image")
+        boxes, confs, class_ids, names = await self.batcher.detect(image)
+        return await loop.run_in_executor(self._reasoning, analyze_detections, boxes, confs, class_ids, names)
+
+    async def handle(self, reader, writer):
+        start = time.perf_counter()
+        status, payload = 500, {'error': 'internal error'}
+        try:
+            method, path, body = await read_request(reader)
+            if method == 'GET' and path == '/health':
+                status, payload = 200, {'status': 'ok'}
+            elif method == 'GET' and path == '/metrics':
+                status, payload = 200, self.metrics()
+            elif method == 'POST' and path == '/analyze':
+                self.counters['requests'] += 1
+                async with self._semaphore:
+                    self.in_flight += 1
+                    try:
+                        payload = await asyncio.wait_for(self.analyze(body), self.timeout)
+                        status = 200
+                    finally:
+                        self.in_flight -= 1
+                self.latencies.append(time.perf_counter() - start)
+            else:
+                status, payload = 404, {'error': 'not found'}
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            status, payload = 504, {'error': 'timeout'}
+        except ValueError as e:
+            self.counters['bad_requests'] += 1
+            status, payload = 400, {'error': str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            self.counters['errors'] += 1
+            payload = {'error': str(e)}
+
+        if status >= 400:
+            self.counters[f'status_{status}'] += 1
+        await write_response(writer, status, payload)
+
+    def metrics(self):
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return round(1e3 * lat[min(len(lat) - 1, int(p * len(lat)))], 2) if lat else None
+
+        b = self.batcher
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'counters': dict(self.counters),
+            'in_flight': self.in_flight,
+            'batches': b.batches,
+            'avg_batch_size': round(b.images / b.batches, 2) if b.batches else 0,
+            'avg_detect_ms_per_image': round(1e3 * b.detect_time / b.images, 2) if b.images else 0,
+            'latency_ms': {'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99)},
+            'batch_window_ms': 1e3 * b.window,
+            'max_batch': b.max_batch
+        }
+
+    async def serve(self, host=HOST, port=PORT):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"✅ ESUA analysis service listening on http://{host}:{port} "
+              f"(batch window {1e3 * self.batcher.window:.0f}ms, max batch {self.batcher.max_batch})")
+        async with server:
+            await server.serve_forever()
+
+
+def decode_image(body):
+    return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+async def read_request(reader):
+    """
+    Parses one HTTP request. Returns (method, path, body).
+    """
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], body
+
+
+async def write_response(writer, status, payload):
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+    body = json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n").encode('latin-1')
+    try:
+        writer.write(head + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESUA HTTP analysis service.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT)
+    args = parser.parse_args()
+
+    # CPU budget before the model creates its thread pools
+    config = runtime_config.load_config()
+    stream_plan = thread_budget.setup('service', config)
+
+    from ultralytics import YOLO
+    print("Loading model...")
+    model = YOLO(args.model)
+
+    service = AnalysisService(model, args.batch_window_ms, args.max_batch, args.max_concurrency, args.timeout,
+                              stream_plan, config['cpu_affinity'])
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Analysis service stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Batch Analyzer: phases 2-4 over a corpus of images, videos and recordings
+
+# Runs detection + spatial relations + risk rules + explanations on every
+# frame of every input and writes one JSON line per frame. Detector output
+# goes through the detection cache, so after the first pass over a corpus,
+# rule / threshold / template changes are re-evaluated without running YOLO.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/batch_analyzer.py ESUA/*/sample.jpg recordings/desk --out results.jsonl
+#   python ESUA/phase6_camera_integration/batch_analyzer.py clip.mp4 --every 5 --no-cache
+#   python ESUA/phase6_camera_integration/batch_analyzer.py recordings/* --vectorized   # batch_reasoning, no 'relations'
+
+import argparse
+import json
+import os
+import time
+import cv2
+import analysis_service
+import batch_reasoning
+import detection_cache
+import detections
+import object_categories
+import recording
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+CHUNK_FRAMES = 4096   # Frames per batch_reasoning call with --vectorized
+
+
+def iter_frames(inputs, every=1):
+    """
+    Yields (source, frame index, frame) for images, videos and recording directories.
+    """
+    for path in inputs:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(path)
+            if image is not None:
+                yield path, 0, image
+            continue
+
+        cap = recording.open_source(path)
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if index % every == 0:
+                yield path, index, frame
+            index += 1
+        cap.release()
+
+
+def write_chunk(out, chunk, names, near_threshold):
+    """
+    Reasons over a chunk of (source, index, boxes, confs, class_ids) at once and writes its lines.
+
+    Returns:
+        int: Number of risks written.
+    """
+    boxes, confs, class_ids, offsets = batch_reasoning.pack([c[2:] for c in chunk])
+    hits = batch_reasoning.reason_batch(boxes, class_ids, offsets, names, near_threshold)
+    risks = batch_reasoning.explain_hits(hits, class_ids, names, len(chunk))
+    for (source, index, b, c, k), frame_risks in zip(chunk, risks):
+        out.write(json.dumps({'source': os.path.basename(source), 'frame': index,
+                              'objects': detections.to_objects(b, c, k, names), 'risks': frame_risks}) + '\n')
+    return len(hits['frame'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ESUA phases 2-4 over images, videos and recordings.")
+    parser.add_argument('inputs', nargs='+')
+    parser.add_argument('--out', default='ESUA/phase6_camera_integration/batch_results.jsonl')
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--near', type=float, default=analysis_service.NEAR_THRESHOLD)
+    parser.add_argument('--every', type=int, default=1, help="Analyze every Nth video frame")
+    parser.add_argument('--cache-dir', default=detection_cache.DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="Always run the detector")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="Reason over chunks of frames at once (batch_reasoning); omits per-pair 'relations'")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    infer_kwargs = {'imgsz': args.imgsz, 'conf': args.conf, 'classes': object_categories.class_ids_for(model.names)}
+    detector = None if args.no_cache else detection_cache.CachedDetector(model, args.cache_dir, args.model,
+                                                                         **infer_kwargs)
+
+    frames = risks = 0
+    detect_time = reason_time = 0.0
+    chunk = []
+    start = time.perf_counter()
+    with open(args.out, 'w') as out:
+        for source, index, frame in iter_frames(args.inputs, args.every):
+            t0 = time.perf_counter()
+            if detector is not None:
+                boxes, confs, class_ids = detector.detect(frame)
+            else:
+                boxes, confs, class_ids = detections.result_to_arrays(model(frame, verbose=False, **infer_kwargs)[0])
+            t1 = time.perf_counter()
+            detect_time += t1 - t0
+            frames += 1
+            if args.vectorized:
+                chunk.append((source, index, boxes, confs, class_ids))
+                if len(chunk) >= CHUNK_FRAMES:
+                    risks += write_chunk(out, chunk, model.names, args.near)
+                    chunk = []
+                    reason_time += time.perf_counter() - t1
+                continue
+            analysis = analysis_service.analyze_detections(boxes, confs, class_ids, model.names, args.near)
+            reason_time += time.perf_counter() - t1
+
+            out.write(json.dumps({'source': os.path.basename(source), 'frame': index, **analysis}) + '\n')
+            risks += len(analysis['risks'])
+        if chunk:
+            t1 = time.perf_counter()
+            risks += write_chunk(out, chunk, model.names, args.near)
+            reason_time += time.perf_counter() - t1
+
+    if detector is not None:
+        detector.close()
+    elapsed = time.perf_counter() - start
+    print(f"Analyzed {frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-6):.1f} frames/s), "
+          f"{risks} risks -> {args.out}")
+    print(f"Detection {1e3 * detect_time / max(1, frames):.2f}ms/frame, "
+          f"reasoning {1e3 * reason_time / max(1, frames):.2f}ms/frame")
+    if detector is not None:
+        print(detector.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Burst Confirmation: snapshot-level checks of new live warnings, in the background
+
+# snapshot_analyzer.py confirms objects over several frames with lower
+# per-class thresholds, but only when someone presses 'c'; the live runner
+# warns on what the nano model sees in single frames. The confirmer closes the
+# gap without slowing the live loop:
+#
+#   1. When the risk event tracker reports an onset, submit() copies a short
+#      window of recent frames out of the frame pool (BURST_FRAMES frames,
+#      spaced like analyzed frames) into a preallocated buffer.
+#   2. A worker thread runs the snapshot burst analysis on the window: its own
+#      model instance (optionally a larger one), class-aware thresholds from
+#      esua_config.json, temporal confirmation, then the risk and zone rules.
+#   3. poll() hands back a verdict per submitted risk: confirmed if the burst
+#      analysis finds the same risk, retracted otherwise. A retracted risk is
+#      filtered out of the live risk pairs for RETRACTED_TTL seconds.
+#
+# Only onsets are submitted, so the worker idles while the scene is stable.
+# When every buffer is busy, further onsets stay unverified (shown as usual)
+# rather than queue up behind stale windows. A burst that fails (model
+# weights missing, inference error) is counted and its warnings also stay
+# unverified; nothing is retracted on a failure.
+#
+# Usage:
+#   burst = BurstConfirmer(config, near_threshold=300, zones=zones)
+#   risk_pairs = burst.filter(risk_pairs, now)
+#   burst.submit(keys, pool, seq, stride=SKIP_FRAMES, now=now)   # on onset
+#   for key, confirmed, latency in burst.poll(now): ...
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import risk_rules
+import detections
+import object_categories
+import param_tuner
+
+# --- CONFIGURATION ---
+BURST_MODEL = 'yolov8n.pt'   # Weights for the worker's own model ('yolov8s.pt' = slower, more accurate)
+BURST_FRAMES = 5             # Frames per burst window (snapshot_analyzer.BUFFER_SIZE)
+BURST_SLOTS = 2              # Window buffers: one being analyzed, one queued
+CONFIRMED_TTL = 30.0         # Seconds a confirmation answers a repeated onset without a new burst
+RETRACTED_TTL = 10.0         # Seconds a retracted risk is suppressed in the live loop
+
+
+class BurstConfirmer:
+    """
+    Confirms or retracts new live warnings with a background burst analysis.
+
+    submit(), poll() and filter() are called from the live loop only; the
+    worker thread touches nothing but its window buffer and its model.
+    """
+
+    def __init__(self, config, near_threshold, zones=None, model_path=BURST_MODEL, frames=BURST_FRAMES,
+                 slots=BURST_SLOTS, model=None, rules=None):
+        """
+        Args:
+            config (dict): Runtime config (imgsz, analysis_size, class-aware thresholds,
+                confirmation frames, grouping distance).
+            near_threshold (float): Same "near" threshold the live loop uses.
+            zones (scene_zones.ZoneMap): Zones of the camera, so zone risks can be confirmed too.
+            model_path (str): Weights of the worker's model (loaded lazily on the worker).
+            frames (int): Frames per burst window.
+            slots (int): Number of window buffers (bounds the work in flight).
+            model: Optional already-loaded model (mainly for experiments).
+            rules (rule_config.RuleWatcher): Hot-reloaded categories and rules to apply
+                (None = the built-in ones).
+        """
+        self.rules = rules
+        self.near_threshold = near_threshold
+        self.zones = zones
+        self.model_path = model_path
+        self.frames = frames
+        self.imgsz = config['imgsz']
+        self.small_thr = config['small_object_threshold']
+        self.person_thr = config['person_threshold']
+        self.default_thr = config['default_threshold']
+        self.min_frames = min(config['confirmation_threshold_frames'], frames)
+        self.grouping_distance = config['grouping_distance_threshold']
+        self._model = model
+        self._classes = None
+        self._classes_for = None  # Rule tables self._classes was derived from
+        self._thresholds = None   # Class id -> confidence threshold
+
+        w, h = config['analysis_size']
+        self._free = [np.empty((frames, h, w, 3), dtype=np.uint8) for _ in range(slots)]
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._jobs = []          # (future, buffer, keys, submitted)
+        self._early = []         # (key, True) verdicts answered from self.confirmed
+        self.confirmed = {}      # risk key -> expiry time
+        self.retracted = {}      # risk key -> expiry time
+
+        # Statistics
+        self.bursts = 0
+        self.checked = 0
+        self.confirmations = 0
+        self.retractions = 0
+        self.skipped_busy = 0
+        self.errors = 0           # Bursts that raised; their warnings stay unverified
+        self.suppressed = 0       # Live risk pairs dropped because they were retracted
+        self.burst_time = 0.0     # Seconds the worker spent per burst (sum)
+        self.latency = []         # Seconds from submit to verdict
+
+    def _get_model(self):
+        if self._model is None:
+            from ultralytics import YOLO
+            self._model = YOLO(self.model_path)
+        return self._model
+
+    def _detect(self, model, frame, tables):
+        """
+        Detects one frame with snapshot_analyzer's class-aware thresholds.
+        """
+        if self._classes is None or tables is not self._classes_for:
+            self._classes_for = tables
+            self._classes = object_categories.class_ids_for(model.names) if tables is None \
+                else tables.class_ids_for(model.names)
+        if self._thresholds is None:
+            self._thresholds = np.full(max(model.names) + 1, self.default_thr, dtype=np.float32)
+            for class_id, name in model.names.items():
+                if name in param_tuner.SMALL_OBJECTS:
+                    self._thresholds[class_id] = self.small_thr
+                elif name == 'person':
+                    self._thresholds[class_id] = self.person_thr
+        result = model(frame, imgsz=self.imgsz, conf=min(self.small_thr, self.person_thr, self.default_thr),
+                       classes=self._classes, verbose=False)[0]
+        boxes, confs, class_ids = detections.result_to_arrays(result)
+        keep = confs >= self._thresholds[class_ids]
+        categories = tables.categories if tables is not None else None
+        return [obj for obj in detections.to_objects(boxes[keep], confs[keep], class_ids[keep], result.names,
+                                                     categories=categories)
+                if obj['categories']]
+
+    def _analyze(self, window, count):
+        """
+        Worker: burst analysis of `count` frames; returns the risk keys it finds.
+        """
+        start = time.perf_counter()
+        model = self._get_model()
+        tables = self.rules.tables if self.rules is not None else None
+        per_frame = [self._detect(model, window[i], tables) for i in range(count)]
+        confirmed = param_tuner.confirm_objects(per_frame, self.grouping_distance, min(self.min_frames, count))
+        if tables is not None:
+            pairs = tables.find_risk_pairs(confirmed, self.near_threshold)
+        else:
+            pairs = risk_rules.find_risk_pairs(confirmed, self.near_threshold)
+        if self.zones is not None:
+            pairs += self.zones.find_zone_risks(confirmed)
+        return {risk_rules.risk_key(*p) for p in pairs}, time.perf_counter() - start
+
+    def filter(self, risk_pairs, now):
+        """
+        Drops live risk pairs whose warning was retracted less than RETRACTED_TTL ago.
+        """
+        if not self.retracted:
+            return risk_pairs
+        for key in [k for k, expiry in self.retracted.items() if expiry <= now]:
+            del self.retracted[key]
+        kept = [p for p in risk_pairs if risk_rules.risk_key(*p) not in self.retracted]
+        self.suppressed += len(risk_pairs) - len(kept)
+        return kept
+
+    def submit(self, keys, pool, seq, stride=1, now=None):
+        """
+        Queues a burst analysis of the frames up to `seq` for newly active risks.
+
+        Args:
+            keys (list): Risk keys (risk_type, name_a, name_b) that just had their onset.
+            pool (frame_pool.FramePool): Frame history of the live loop.
+            seq (int): Sequence number of the frame the onset was seen in.
+            stride (int): Frames between window frames (the live loop's SKIP_FRAMES).
+            now (float): Timestamp in seconds (defaults to time.time()).
+
+        Returns:
+            bool: True if a burst was queued.
+        """
+        now = time.time() if now is None else now
+        pending = []
+        for key in keys:
+            if self.confirmed.get(key, 0) > now:
+                self._early.append((key, True))
+            else:
+                pending.append(key)
+        if not pending:
+            return False
+        if not self._free:
+            self.skipped_busy += len(pending)
+            return False
+
+        # Window frames spaced like analyzed frames, but never older than the pool keeps
+        stride = max(1, min(stride, (pool.capacity - 1) // max(1, self.frames - 1)))
+        window = self._free.pop()
+        count = 0
+        for s in range(seq - (self.frames - 1) * stride, seq + 1, stride):
+            frame = pool.get(s)
+            if frame is not None:
+                np.copyto(window[count], frame)
+                count += 1
+        if not count:
+            self._free.append(window)   # Nothing to analyze: the warnings stay unverified
+            return False
+        future = self._executor.submit(self._analyze, window, count)
+        self._jobs.append((future, window, pending, time.perf_counter()))
+        self.bursts += 1
+        self.checked += len(pending)
+        return True
+
+    def poll(self, now):
+        """
+        Collects finished bursts.
+
+        Returns:
+            list: (risk key, confirmed, latency seconds) verdicts, oldest first.
+        """
+        verdicts = [(key, confirmed, 0.0) for key, confirmed in self._early]
+        self._early.clear()
+        while self._jobs and self._jobs[0][0].done():
+            future, window, keys, submitted = self._jobs.pop(0)
+            self._free.append(window)
+            try:
+                found, elapsed = future.result()
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"❌ Burst confirmation failed ({e}); warnings stay unverified")
+                continue
+            latency = time.perf_counter() - submitted
+            self.burst_time += elapsed
+            self.latency.append(latency)
+            for key in keys:
+                if key in found:
+                    self.confirmed[key] = now + CONFIRMED_TTL
+                    self.confirmations += 1
+                    verdicts.append((key, True, latency))
+                else:
+                    self.confirmed.pop(key, None)
+                    self.retracted[key] = now + RETRACTED_TTL
+                    self.retractions += 1
+                    verdicts.append((key, False, latency))
+        return verdicts
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def report(self):
+        if not self.bursts:
+            return f"Burst confirmation: no bursts ({self.skipped_busy} onsets unverified while busy)"
+        failed = f", {self.errors} bursts failed" if self.errors else ""
+        avg_burst = 1000 * self.burst_time / max(1, len(self.latency))
+        latency = sorted(self.latency)
+        p95 = 1000 * latency[int(0.95 * (len(latency) - 1))] if latency else 0.0
+        return (f"Burst confirmation: {self.bursts} bursts checked {self.checked} warnings | "
+                f"{self.confirmations} confirmed, {self.retractions} retracted, "
+                f"{self.skipped_busy} unverified while busy{failed}, {self.suppressed} live pairs suppressed | "
+                f"{avg_burst:.0f}ms per burst, verdict p95 {p95:.0f}ms after onset")
@@ -1,14 +1,77 @@
+import argparse
+import signal
+import threading
 import cv2
 import time
-import math
+import numpy as np
 from ultralytics import YOLO
-import object_categories
-import risk_rules
 import explanation_templates
+import motion_gate
+import detections
+import detector_cascade
+import risk_events
+import event_store
+import frame_pool
+import runtime_config
+import thread_budget
+import recording
+import detection_cache
+import preview_server
+import risk_heatmap
+import temporal_rules
+import scene_zones
+import alloc_profiler
+import burst_confirm
+import rule_config
+
+def refresh_explanations(lines, tracker, temporal):
+    """
+    Refills `lines` (reused across frames) with the active temporal and risk explanations.
+    """
+    lines.clear()
+    if temporal is not None:
+        lines.extend(temporal.active())
+    lines.extend(text for (_, _, _, text) in tracker.active())
+
 
 def main():
+    parser = argparse.ArgumentParser(description="ESUA real-time assistant.")
+    recording.add_source_arguments(parser)
+    parser.add_argument('--detection-cache', action='store_true',
+                        help="Reuse cached detector output for frames seen before (replays, videos)")
+    parser.add_argument('--serve', type=int, metavar='PORT', help="Stream the annotated feed over local HTTP (MJPEG)")
+    parser.add_argument('--preview-fps', type=float, default=preview_server.MAX_FPS,
+                        help="Encode rate cap for --serve (independent of the inference rate)")
+    parser.add_argument('--headless', action='store_true', help="No window; stop with Ctrl+C")
+    parser.add_argument('--heatmap', action='store_true', help="Overlay the rolling risk heatmap")
+    parser.add_argument('--cascade', action='store_true',
+                        help="Hold warnings back until a larger model has confirmed them")
+    parser.add_argument('--cascade-model', default=detector_cascade.CASCADE_MODEL,
+                        help="Weights of the --cascade confirmation model")
+    parser.add_argument('--burst-confirm', action='store_true',
+                        help="Re-check new warnings over a short frame window in the background")
+    parser.add_argument('--burst-model', default=burst_confirm.BURST_MODEL,
+                        help="Weights of the --burst-confirm model (a second model instance)")
+    parser.add_argument('--profile-alloc', action='store_true',
+                        help="Report allocations and time per stage, GC pauses and frame latency (slow)")
+    parser.add_argument('--steady-state', choices=alloc_profiler.GC_MODES, default='off',
+                        help="Freeze warm-up objects and keep GC out of the frame path")
+    args = parser.parse_args()
+
     print("Initializing ESUA Camera Runner...")
-    print("Press 'q' to quit.")
+    print("Press Ctrl+C to quit." if args.headless else "Press 'q' to quit.")
+
+    # Performance settings (defaults or tuned values from esua_config.json)
+    config = runtime_config.load_config()
+    CAMERA_ID = 0
+
+    # Categories, risk rules and templates: esua_rules.json is watched and recompiled in the
+    # background; the loop picks up the current tables once per analyzed frame
+    rules = rule_config.RuleWatcher().start()
+    tables = rules.tables
+
+    # CPU budget: cap torch/OpenCV pools before the model spins them up
+    thread_budget.setup('live', config, stream=CAMERA_ID)
 
     # 1. Load Model
     # Using YOLOv8n for speed on CPU
@@ -18,133 +81,248 @@ def main():
         print(f"Error loading model: {e}")
         return
 
-    # 2. Open Camera
+    # 2. Open Camera (or a video file / recording to replay)
     # Index 0 is usually the default webcam
-    cap = cv2.VideoCapture(0)
+    cap = recording.open_runner_source(args)
+    replaying = isinstance(cap, recording.ReplayCapture)
     
     if not cap.isOpened():
-        print("❌ Error: Could not open webcam.")
+        print(f"❌ Error: Could not open source {args.source}.")
         print("Please check if your camera is connected and not used by another app.")
         print("Exiting...")
         return
 
     print("✅ Camera opened successfully.")
 
-    # Performance settings
+    # Recording: analyzed frames and detector output, for exact replays later
+    recorder = recording.Recorder(args.record, args.record_encoding, names=model.names) if args.record else None
+
     frame_count = 0
-    SKIP_FRAMES = 5  # Run inference every 5 frames to keep UI responsive
+    inferences = 0
+    SKIP_FRAMES = config['skip_frames']  # Run inference every N frames to keep UI responsive
+    NEAR_THRESHOLD = config['near_threshold'] # Pixels (adjusted for webcam resolution)
+    ANALYSIS_SIZE = tuple(config['analysis_size'])  # (width, height) every frame is resized to
+    IMGSZ = config['imgsz']  # YOLO inference size
+
+    # Class filter: only detect classes that appear in a risk category (plus display-only
+    # ones like 'person'), so NMS and postprocessing never see the other COCO classes
+    CLASS_FILTER_ENABLED = True
+    detect_classes = tables.class_ids_for(model.names) if CLASS_FILTER_ENABLED else None
+    detected_total = 0    # Boxes returned by the detector
+    reasoned_total = 0    # Objects entering the pair stage
+    pair_checks_total = 0
+
+    # Detection cache: replaying the same footage skips YOLO on every cached frame
+    # (its class filter is part of the cache key and stays as it was at startup)
+    cached_detector = None
+    if args.detection_cache:
+        cached_detector = detection_cache.CachedDetector(model, imgsz=IMGSZ, classes=detect_classes)
+
+    # Detector cascade: confirm risk candidates with a larger model before warning
+    CASCADE_ENABLED = args.cascade
+    cascade = None
+    if CASCADE_ENABLED:
+        cascade = detector_cascade.DetectorCascade(args.cascade_model, near_threshold=NEAR_THRESHOLD, async_mode=True)
+
+    # Scene zones: location rules (e.g. sharp object on the table edge) from precomputed masks
+    zones = scene_zones.ZoneMap.from_config(config, CAMERA_ID, ANALYSIS_SIZE)
+    if zones is not None:
+        print(f"Scene zones: {', '.join(zones.names)}")
+
+    # Burst confirmation: new warnings are re-checked over a short frame window in the
+    # background (lower per-class thresholds, temporal confirmation) and confirmed or retracted
+    BURST_CONFIRM_ENABLED = args.burst_confirm
+    burst = None
+    if BURST_CONFIRM_ENABLED:
+        burst = burst_confirm.BurstConfirmer(config, NEAR_THRESHOLD, zones=zones, model_path=args.burst_model,
+                                             rules=rules)
+
+    # Risk events: warnings appear/disappear with hysteresis instead of per frame
+    tracker = risk_events.RiskEventTracker(
+        describe=lambda *pair: explanation_templates.describe_risk(*pair, explain=tables.explain))
+
+    # Temporal rules: "liquid near electronics > 30 s", "sharp object left unattended", ...
+    TEMPORAL_RULES_ENABLED = True
+    temporal = temporal_rules.TemporalRuleEngine(explain=lambda *args: tables.explain(*args)) \
+        if TEMPORAL_RULES_ENABLED else None
+
+    # History: detections, risk events and explanations go to SQLite in the background
+    STORE_ENABLED = True
+    store = event_store.EventStore(camera=CAMERA_ID) if STORE_ENABLED else None
+
+    # Risk heatmap: decayed risk-seconds per grid cell, exported to heatmaps/ periodically
+    HEATMAP_ENABLED = True
+    heatmap = risk_heatmap.RiskHeatmap(ANALYSIS_SIZE, camera=CAMERA_ID) if HEATMAP_ENABLED else None
+
+    # Motion gate: skip inference entirely while the scene is unchanged
+    MOTION_GATE_ENABLED = True
+    MOTION_GATE_METHOD = 'absdiff'   # 'absdiff' or 'histogram'
+    MOTION_THRESHOLD = None          # None = method default; lower = more sensitive
+    MOTION_REFRESH_INTERVAL = 10.0   # Seconds; force a fresh analysis at least this often
+    gate = motion_gate.MotionGate(method=MOTION_GATE_METHOD,
+                                  threshold=MOTION_THRESHOLD,
+                                  refresh_interval=MOTION_REFRESH_INTERVAL)
     
     # Store last known risks to display during skipped frames
     current_explanations = []
-    current_boxes = [] # Store boxes: (x1, y1, x2, y2, label, color)
+    current_objects = [] # Drawn straight from the object dicts (no per-box display tuples)
+    # Per-frame result containers, cleared and refilled instead of reallocated
+    # (object and event dicts are not pooled: the tracker and the store keep them)
+    reasoning_objects = []
+    found_pairs = []
+    onsets = []
+    BOX_COLOR = (0, 255, 0)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to read frame.")
-            break
+    # Preallocated frames at the analysis resolution (no per-frame allocation).
+    # Pool slots keep the clean frame history; drawing happens on `display`.
+    POOL_CAPACITY = 16
+    pool = frame_pool.FramePool(POOL_CAPACITY, ANALYSIS_SIZE)
+    display = np.empty((ANALYSIS_SIZE[1], ANALYSIS_SIZE[0], 3), dtype=np.uint8)
+
+    # Preview server: frames are JPEG-encoded once (rate-capped) and shared by all viewers
+    preview = preview_server.PreviewServer(args.serve, max_fps=args.preview_fps).start() if args.serve else None
+
+    # Headless: Ctrl+C ends the loop, so the cleanup below still runs
+    stop = threading.Event()
+    if args.headless:
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
 
+    # Allocation profiling / steady-state GC (see alloc_profiler.py)
+    profiler = alloc_profiler.AllocProfiler() if args.profile_alloc else None
+    steady = alloc_profiler.SteadyStateGC(args.steady_state)
+
+    while not stop.is_set():
         # Resize for performance (optional, but good for CPU)
         # width=640 is standard specific for YOLOv8
-        frame = cv2.resize(frame, (640, 480))
+        ret, seq, frame = pool.read(cap)
+        if not ret:
+            print("Replay finished." if replaying else "Error: Failed to read frame.")
+            break
         
         # Increment frame counter
         frame_count += 1
+        now = recording.source_time(cap)  # Recorded time when replaying, so events reproduce exactly
+        rec_seq = recorder.write_frame(frame, now) if recorder is not None else None
+        if profiler is not None:
+            profiler.mark('capture')
         
         # --- ML PIPELINE (Run only every N frames) ---
-        if frame_count % SKIP_FRAMES == 0:
-            current_explanations = []
-            current_boxes = []
+        # If the motion gate sees no change, the previous boxes and explanations are kept
+        run_inference = frame_count % SKIP_FRAMES == 0
+        if run_inference and MOTION_GATE_ENABLED:
+            run_inference = gate.should_run(frame, now)
+
+        # A cascade confirmation that finished while inference is skipped is shown right away
+        if cascade is not None and any(confirmed for _, confirmed, _ in cascade.poll(now)):
+            run_inference = True
+
+        if run_inference:
+            # Rules: one reference read per analyzed frame; a reload swaps it between frames
+            if rules.tables is not tables:
+                tables = rules.use()
+                if CLASS_FILTER_ENABLED:
+                    detect_classes = tables.class_ids_for(model.names)
             
             # A. Detection
-            results = model(frame, verbose=False) # verbose=False to reduce console spam
-            result = results[0]
+            cpu_start = time.process_time()
+            if cached_detector is not None:
+                boxes, confs, class_ids = cached_detector.detect(frame)
+            else:
+                results = model(frame, imgsz=IMGSZ, classes=detect_classes, verbose=False) # verbose=False to reduce console spam
+                boxes, confs, class_ids = detections.result_to_arrays(results[0])
+            gate.record_inference(time.process_time() - cpu_start)
             
-            objects = []
-            
-            # Extract data
-            for box in result.boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                
-                class_id = int(box.cls[0].item())
-                class_name = result.names[class_id]
-                
-                cx = (x1 + x2) // 2
-                cy = (y1 + y2) // 2
-                
-                categories = object_categories.get_categories(class_name)
-                
-                obj_data = {
-                    "name": class_name,
-                    "center": (cx, cy),
-                    "categories": categories,
-                    "box": (x1, y1, x2, y2)
-                }
-                objects.append(obj_data)
-                
-                # Add to display list
-                # Color based on risk status could be added, for now Green
-                current_boxes.append((x1, y1, x2, y2, class_name, (0, 255, 0)))
+            if recorder is not None:
+                recorder.write_detections(rec_seq, boxes, confs, class_ids)
+            objects = detections.to_objects(boxes, confs, class_ids, model.names, categories=tables.categories)
+            current_objects = objects
+            if profiler is not None:
+                profiler.mark('detect')
 
-            # B. Spatial & Risk Reasoning
-            NEAR_THRESHOLD = 300 # Pixels (adjusted for webcam resolution)
+            # B. Spatial & Risk Reasoning (uncategorized objects are display-only)
+            reasoning_objects.clear()
+            reasoning_objects.extend(obj for obj in objects if obj['categories'])
+            risk_pairs = tables.find_risk_pairs(reasoning_objects, NEAR_THRESHOLD, out=found_pairs)
+            inferences += 1
+            detected_total += len(objects)
+            reasoned_total += len(reasoning_objects)
+            pair_checks_total += len(reasoning_objects) * (len(reasoning_objects) - 1) // 2
             
-            for i in range(len(objects)):
-                for j in range(i + 1, len(objects)):
-                    obj_a = objects[i]
-                    obj_b = objects[j]
-                    
-                    center_a = obj_a['center']
-                    center_b = obj_b['center']
-                    
-                    distance = math.sqrt((center_a[0] - center_b[0])**2 + (center_a[1] - center_b[1])**2)
-                    
-                    if distance < NEAR_THRESHOLD:
-                         # Check Risks
-                        risk_type = None
-                        cats_a = obj_a['categories']
-                        cats_b = obj_b['categories']
-                        
-                        if ('liquid' in cats_a and 'electronics' in cats_b) or \
-                           ('liquid' in cats_b and 'electronics' in cats_a):
-                            risk_type = 'spill_risk'
-                        elif ('liquid' in cats_a and 'flammable' in cats_b) or \
-                             ('liquid' in cats_b and 'flammable' in cats_a):
-                            risk_type = 'damage_risk'
-                            
-                        # If risk detected, generate explanation
-                        if risk_type:
-                            # Context swap for template
-                            if 'liquid' in cats_b: 
-                                t_obj_a, t_obj_b = obj_b, obj_a
-                            else:
-                                t_obj_a, t_obj_b = obj_a, obj_b
-                                
-                            context_data = {
-                                'obj_a': t_obj_a['name'],
-                                'cat_a': t_obj_a['categories'][0] if t_obj_a['categories'] else 'object',
-                                'obj_b': t_obj_b['name'],
-                                'cat_b': ','.join(t_obj_b['categories'])
-                            }
-                            
-                            # Get full text
-                            full_expl = explanation_templates.get_explanation(risk_type, context_data)
-                            
-                            # Just take the first line (Observation) and last (Suggestion) for on-screen display to save space
-                            lines = full_expl.split('\n')
-                            short_text = f"⚠️ {lines[0]} -> {lines[-1]}"
-                            current_explanations.append(short_text)
-                            
-                            # Change box color to Red for involved objects
-                            # (Simplified: we won't update the box list for now to keep code simple)
+            # Cascade: only show warnings the larger model has confirmed
+            if cascade is not None:
+                risk_pairs = cascade.update(frame, reasoning_objects, risk_pairs, now, tables=tables)
+            
+            # Zone rules (after the cascade: a zone is not something the larger model can re-detect)
+            if zones is not None:
+                risk_pairs += zones.find_zone_risks(reasoning_objects)
+            
+            # Warnings the burst analysis retracted stay suppressed for a while
+            if burst is not None:
+                risk_pairs = burst.filter(risk_pairs, now)
+            
+            if heatmap is not None:
+                heatmap.update(risk_pairs, now)
+            
+            # C. Risk events (hysteresis), explanations are generated once per onset
+            if store is not None:
+                store.add_detections(objects, ts=now, frame=frame_count)
+            
+            onsets.clear()
+            for event in tracker.update(risk_pairs, now):
+                if event['event'] == 'onset':
+                    onsets.append((event['risk_type'], event['obj_a'], event['obj_b']))
+                if store is not None:
+                    store.add_event(event)
+                    if event['event'] == 'onset':
+                        store.add_explanation(event['risk_type'], event['text'], ts=now)
+                if event['event'] != 'ongoing':
+                    print(f"[{event['event'].upper()}] {event['risk_type']}: {event['obj_a']} / {event['obj_b']} "
+                          f"({event['duration']:.1f}s)")
+            if burst is not None and onsets:
+                burst.submit(onsets, pool, seq, stride=SKIP_FRAMES, now=now)
+            
+            if temporal is not None:
+                for event in temporal.update(objects, risk_pairs, now):
+                    if store is not None:
+                        store.add_event(event)
+                        if event['event'] == 'onset':
+                            store.add_explanation(event['risk_type'], event['text'], ts=now)
+                    print(f"[{event['event'].upper()}] {event['risk_type']}: {event['obj_a']}"
+                          f"{' / ' + event['obj_b'] if event['obj_b'] else ''} ({event['duration']:.1f}s)")
+            
+            refresh_explanations(current_explanations, tracker, temporal)
+            if profiler is not None:
+                profiler.mark('reason')
+
+        # Burst verdicts arrive a few frames after the onset (also while inference is skipped)
+        if burst is not None:
+            verdicts = burst.poll(now)
+            for key, confirmed, latency in verdicts:
+                event = tracker.confirm(key, now) if confirmed else tracker.retract(key, now)
+                if event is None:
+                    continue
+                if store is not None:
+                    store.add_event(event)
+                print(f"[{event['event'].upper()}] {event['risk_type']}: {event['obj_a']} / {event['obj_b']} "
+                      f"(burst verdict after {latency * 1000:.0f}ms)")
+            if verdicts:
+                refresh_explanations(current_explanations, tracker, temporal)
 
         # --- DISPLAY LOOP (Runs every frame) ---
+        np.copyto(display, frame)
+        if zones is not None:
+            zones.draw(display)
+        if heatmap is not None:
+            heatmap.maybe_export(now, frame)
+            if args.heatmap:
+                heatmap.render(display)
         
         # 1. Draw Boxes
-        for (x1, y1, x2, y2, label, color) in current_boxes:
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        # Color based on risk status could be added, for now Green
+        for obj in current_objects:
+            x1, y1, x2, y2 = obj['box']
+            cv2.rectangle(display, (x1, y1), (x2, y2), BOX_COLOR, 2)
+            cv2.putText(display, obj['name'], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, BOX_COLOR, 2)
             
         # 2. Draw Explanations (Overlay)
         if current_explanations:
@@ -155,19 +333,67 @@ def main():
                 if i >= 3: break
                 
                 # Simple text drawing
-                cv2.putText(frame, text, (10, start_y + (i * 25)), 
+                cv2.putText(display, text, (10, start_y + (i * 25)), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1, cv2.LINE_AA)
                             
         # Show Frame
-        cv2.imshow('ESUA Real-Time Assistant', frame)
+        if preview is not None:
+            preview.publish(display)
+        if not args.headless:
+            cv2.imshow('ESUA Real-Time Assistant', display)
 
-        # Quit on 'q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            # Quit on 'q'
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+        if profiler is not None:
+            profiler.end_frame('display')
+        steady.frame_done(idle=not run_inference)
 
     # Cleanup
     cap.release()
-    cv2.destroyAllWindows()
+    if not args.headless:
+        cv2.destroyAllWindows()
+    if preview is not None:
+        preview.close()
+        print(preview.report())
+    steady.close()
+    print(steady.report())
+    if profiler is not None:
+        profiler.close()
+        print(profiler.report())
+    if MOTION_GATE_ENABLED:
+        print(gate.report())
+    if inferences:
+        classes = f"{len(detect_classes)}/{len(model.names)} classes" if detect_classes is not None else "all classes"
+        print(f"Detection: {classes} | {detected_total / inferences:.1f} boxes, "
+              f"{reasoned_total / inferences:.1f} reasoning objects, "
+              f"{pair_checks_total / inferences:.1f} pair checks per inference")
+    if cascade is not None:
+        cascade.close()
+        print(cascade.report())
+    if burst is not None:
+        burst.close()
+        print(burst.report())
+    print(tracker.report())
+    if temporal is not None:
+        print(temporal.report())
+    if heatmap is not None:
+        if heatmap.updates and heatmap.export_dir:
+            heatmap.export(now, pool.get(pool.seq), block=True)
+        heatmap.close()
+        print(heatmap.report())
+    rules.close()
+    print(rules.report())
+    if store is not None:
+        store.close()
+        print(store.report())
+    if recorder is not None:
+        recorder.close()
+        print(recorder.report())
+    if cached_detector is not None:
+        cached_detector.close()
+        print(cached_detector.report())
     print("Camera runner stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+# Class Filter Benchmark
+
+# Measures what passing the category-derived class ids to YOLO (`classes=`)
+# and dropping uncategorized objects before the pair stage saves, compared to
+# detecting all 80 COCO classes and pairing everything:
+#   - YOLO postprocess time (NMS + box scaling), from result.speed
+#   - boxes returned per frame
+#   - objects / pair checks entering risk reasoning, and their time
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/class_filter_bench.py --video clip.mp4
+#   python ESUA/phase6_camera_integration/class_filter_bench.py --images ESUA/*/sample.jpg
+
+import argparse
+import glob
+import time
+import cv2
+import detections
+import object_categories
+import recording
+import risk_rules
+
+NEAR_THRESHOLD = 300
+MAX_FRAMES = 300
+
+
+def read_frames(video=None, images=(), max_frames=MAX_FRAMES):
+    frames = [img for img in (cv2.imread(p) for p in images) if img is not None]
+    if video:
+        cap = recording.open_source(video)
+        while len(frames) < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+def measure(model, frames, classes, drop_uncategorized, imgsz=640, conf=0.10):
+    """
+    Runs detection + reasoning over `frames` with one configuration.
+
+    Returns:
+        dict: Per-frame averages (postprocess_ms, inference_ms, boxes,
+        reasoning_objects, pair_checks, reasoning_ms).
+    """
+    totals = dict.fromkeys(('postprocess_ms', 'inference_ms', 'boxes', 'reasoning_objects',
+                            'pair_checks', 'reasoning_ms'), 0.0)
+    for frame in frames:
+        result = model(frame, imgsz=imgsz, conf=conf, classes=classes, verbose=False)[0]
+        totals['postprocess_ms'] += result.speed.get('postprocess', 0.0)
+        totals['inference_ms'] += result.speed.get('inference', 0.0)
+
+        start = time.perf_counter()
+        boxes, confs, class_ids = detections.result_to_arrays(result)
+        objects = detections.to_objects(boxes, confs, class_ids, result.names)
+        if drop_uncategorized:
+            objects = [obj for obj in objects if obj['categories']]
+        risk_rules.find_risk_pairs(objects, NEAR_THRESHOLD)
+        totals['reasoning_ms'] += 1e3 * (time.perf_counter() - start)
+
+        totals['boxes'] += len(boxes)
+        totals['reasoning_objects'] += len(objects)
+        totals['pair_checks'] += len(objects) * (len(objects) - 1) // 2
+
+    return {k: v / max(1, len(frames)) for k, v in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the savings of category-driven class filtering.")
+    parser.add_argument('--video')
+    parser.add_argument('--images', nargs='*', default=[])
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.10, help="Low, like the snapshot analyzer")
+    args = parser.parse_args()
+
+    images = [p for pattern in args.images for p in glob.glob(pattern)]
+    frames = read_frames(args.video, images)
+    if not frames:
+        print("No frames to measure (use --video or --images).")
+        return
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    classes = object_categories.class_ids_for(model.names)
+    print(f"{len(frames)} frames | filter keeps {len(classes)}/{len(model.names)} classes: "
+          f"{', '.join(model.names[c] for c in classes)}")
+
+    measure(model, frames[:1], None, False, args.imgsz, args.conf)  # Warm-up
+    full = measure(model, frames, None, False, args.imgsz, args.conf)
+    filtered = measure(model, frames, classes, True, args.imgsz, args.conf)
+
+    print(f"\n{'per frame':>20} | {'all classes':>11} | {'filtered':>9} | saving")
+    for key in ('postprocess_ms', 'inference_ms', 'boxes', 'reasoning_objects', 'pair_checks', 'reasoning_ms'):
+        a, b = full[key], filtered[key]
+        saving = f"{100 * (a - b) / a:5.1f}%" if a else "    -"
+        print(f"{key:>20} | {a:11.2f} | {b:9.2f} | {saving}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Detection Cache: content-addressed detector output on disk
+
+# Changing a rule, threshold or template does not change what YOLO sees, yet
+# every experiment used to rerun the detector on the same footage. The cache
+# stores detector output keyed by
+#   - a hash of the frame pixels (and shape),
+#   - the model identity (hash of the weights file), and
+#   - the inference parameters (imgsz, conf, classes, ...),
+# so reasoning-only experiments skip inference entirely on repeated frames.
+#
+# Layout: one namespace directory per (model, parameters), holding meta.json
+# and columnar segments (seg_*.npz): keys (N, 16) uint8, starts/counts/costs
+# per frame and boxes/confs/class_ids per detection. Segments are only ever
+# added (written to a temp file, then renamed), so several processes can fill
+# the same cache.
+#
+# Usage:
+#   detector = CachedDetector(model, imgsz=640, conf=0.25)
+#   boxes, confs, class_ids = detector.detect(frame)
+#   python ESUA/phase6_camera_integration/detection_cache.py info
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import detections
+
+# --- CONFIGURATION ---
+DEFAULT_CACHE_DIR = 'ESUA/phase6_camera_integration/detection_cache'
+FLUSH_EVERY = 1000     # Frames buffered in memory before a segment is written
+KEY_BYTES = 16
+COST_CLOCK = 'wall'   # Recorded detector costs are wall seconds (older caches held CPU seconds)
+
+_weights_digests = {}  # (path, size, mtime) -> digest
+
+
+def frame_key(frame):
+    """
+    Returns the 16-byte content hash of a frame (pixels, shape and dtype).
+    """
+    h = hashlib.blake2b(digest_size=KEY_BYTES)
+    h.update(f"{frame.shape}{frame.dtype}".encode())
+    h.update(np.ascontiguousarray(frame).data)
+    return h.digest()
+
+
+def model_identity(model, weights=None):
+    """
+    Identifies a model by the content of its weights file.
+
+    Args:
+        model: Loaded model (ultralytics YOLO exposes ckpt_path).
+        weights (str): Weights path, if the model does not expose it.
+
+    Returns:
+        str: e.g. 'yolov8n.pt:3b1d...' (the bare name if no file is found).
+    """
+    path = weights or getattr(model, 'ckpt_path', None) or getattr(model, 'model_name', None)
+    if not path:
+        return type(model).__name__
+    if not os.path.isfile(path):
+        return str(path)
+
+    stat = os.stat(path)
+    stamp = (path, stat.st_size, stat.st_mtime)
+    if stamp not in _weights_digests:
+        h = hashlib.blake2b(digest_size=8)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _weights_digests[stamp] = h.hexdigest()
+    return f"{os.path.basename(path)}:{_weights_digests[stamp]}"
+
+
+def namespace_key(model_id, params):
+    text = json.dumps({'model': model_id, 'params': params, 'costs': COST_CLOCK}, sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class DetectionCache:
+    """
+    Detector output for one (model, inference parameters) namespace.
+    """
+
+    def __init__(self, model_id, params, root=DEFAULT_CACHE_DIR, names=None):
+        """
+        Args:
+            model_id (str): See model_identity().
+            params (dict): JSON-serializable inference parameters.
+            root (str): Cache directory.
+            names (dict): Class id -> name, stored for consumers without a model.
+        """
+        self.dir = os.path.join(root, namespace_key(model_id, params))
+        os.makedirs(self.dir, exist_ok=True)
+        meta_path = os.path.join(self.dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump({'model': model_id, 'params': params,
+                           'names': {str(k): v for k, v in (names or {}).items()}}, f, indent=2)
+
+        self._index = {}      # key -> (segment, start, count, cost)
+        self._segments = []   # [(boxes, confs, class_ids)]
+        for path in sorted(glob.glob(os.path.join(self.dir, 'seg_*.npz'))):
+            self._load_segment(path)
+        self._pending = []    # [(key, boxes, confs, class_ids, cost)]
+        self._pending_index = {}
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.last_cost = 0.0  # Detector wall seconds recorded for the last get()/put()
+
+    def _load_segment(self, path):
+        with np.load(path) as data:
+            seg = len(self._segments)
+            self._segments.append((data['boxes'], data['confs'], data['class_ids'].astype(np.int32)))
+            for key, start, count, cost in zip(data['keys'], data['starts'].tolist(),
+                                               data['counts'].tolist(), data['costs'].tolist()):
+                self._index[key.tobytes()] = (seg, start, count, cost)
+
+    def __len__(self):
+        return len(self._index) + len(self._pending_index)
+
+    def get(self, key):
+        """
+        Returns (boxes, confs, class_ids) for a frame key, or None on a miss.
+        """
+        entry = self._index.get(key)
+        if entry is not None:
+            seg, start, count, cost = entry
+            boxes, confs, class_ids = self._segments[seg]
+            self.hits += 1
+            self.last_cost = cost
+            return boxes[start:start + count], confs[start:start + count], class_ids[start:start + count]
+
+        pending = self._pending_index.get(key)
+        if pending is not None:
+            self.hits += 1
+            self.last_cost = pending[4]
+            return pending[1:4]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, boxes, confs, class_ids, cost=0.0):
+        """
+        Adds detector output for a frame key (`cost` = detector wall seconds).
+        """
+        if key in self._index or key in self._pending_index:
+            return
+        entry = (key, boxes, confs, class_ids, cost)
+        self._pending.append(entry)
+        self._pending_index[key] = entry
+        self.last_cost = cost
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes pending entries as a new segment.
+        """
+        if not self._pending:
+            return
+        counts = np.array([len(p[1]) for p in self._pending], dtype=np.int32)
+        columns = {
+            'keys': np.frombuffer(b''.join(p[0] for p in self._pending), dtype=np.uint8).reshape(-1, KEY_BYTES),
+            'starts': np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64),
+            'counts': counts,
+            'costs': np.array([p[4] for p in self._pending], dtype=np.float32),
+            'boxes': np.concatenate([p[1] for p in self._pending]).astype(np.float32).reshape(-1, 4),
+            'confs': np.concatenate([p[2] for p in self._pending]).astype(np.float32),
+            'class_ids': np.concatenate([p[3] for p in self._pending]).astype(np.int16)
+        }
+
+        name = f"seg_{int(time.time() * 1000):013d}_{os.getpid()}"
+        tmp = os.path.join(self.dir, 'tmp_' + name + '.npz')  # Not matched by seg_*.npz until renamed
+        np.savez(tmp, **columns)
+        os.replace(tmp, os.path.join(self.dir, name + '.npz'))
+
+        self._pending = []
+        self._pending_index = {}
+        self._load_segment(os.path.join(self.dir, name + '.npz'))
+
+    def close(self):
+        self.flush()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"Detection cache: {self.hits}/{lookups} hits ({rate:.0f}%), "
+                f"{len(self)} frames cached in {self.dir}")
+
+
+class CachedDetector:
+    """
+    Runs the model only for frames whose output is not cached yet.
+    """
+
+    def __init__(self, model, cache_dir=DEFAULT_CACHE_DIR, weights=None, **infer_kwargs):
+        """
+        Args:
+            model: Loaded YOLO model.
+            cache_dir (str): Cache root directory.
+            weights (str): Weights path, if the model does not expose ckpt_path.
+            **infer_kwargs: Inference parameters (imgsz, conf, classes, ...); part of the key.
+        """
+        self.model = model
+        self.kwargs = infer_kwargs
+        self.names = model.names
+        params = {k: list(v) if isinstance(v, (list, tuple)) else v for k, v in infer_kwargs.items()}
+        self.cache = DetectionCache(model_identity(model, weights), params, cache_dir, self.names)
+
+    def detect(self, frame):
+        """
+        Returns (boxes, confs, class_ids) for one frame, from the cache if possible.
+        """
+        key = frame_key(frame)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        result = self.model(frame, verbose=False, **self.kwargs)[0]
+        arrays = detections.result_to_arrays(result)
+        self.cache.put(key, *arrays, cost=time.perf_counter() - start)
+        return arrays
+
+    def close(self):
+        self.cache.close()
+
+    def report(self):
+        return self.cache.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the ESUA detection cache.")
+    parser.add_argument('command', choices=['info'])
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    namespaces = sorted(glob.glob(os.path.join(args.cache_dir, '*', 'meta.json')))
+    if not namespaces:
+        print(f"No cached detections in {args.cache_dir}")
+        return
+    for meta_path in namespaces:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        directory = os.path.dirname(meta_path)
+        segments = glob.glob(os.path.join(directory, 'seg_*.npz'))
+        frames = 0
+        for path in segments:
+            with np.load(path) as data:
+                frames += len(data['keys'])
+        size = sum(os.path.getsize(p) for p in segments)
+        print(f"{os.path.basename(directory)}: {meta['model']} {json.dumps(meta['params'], sort_keys=True)} | "
+              f"{frames} frames in {len(segments)} segments, {size / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Helpers for working with detector output as NumPy arrays
+
+# Ultralytics returns a Results object with one Boxes entry per detection.
+# Pulling every box out with .cpu().numpy() and .item() costs one small copy per
+# field per box; these helpers convert the whole result in one go.
+
+import numpy as np
+import object_categories
+
+
+def result_to_arrays(result):
+    """
+    Converts a YOLO result into plain arrays.
+
+    Args:
+        result: A single ultralytics Results object.
+
+    Returns:
+        tuple: (boxes, confs, class_ids)
+            boxes (np.ndarray): (N, 4) float32 in x1, y1, x2, y2 pixels.
+            confs (np.ndarray): (N,) float32 confidences.
+            class_ids (np.ndarray): (N,) int32 COCO class ids.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return empty_arrays()
+
+    return (boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            boxes.cls.cpu().numpy().astype(np.int32))
+
+
+def empty_arrays():
+    """
+    Returns the (boxes, confs, class_ids) triple for "no detections".
+    """
+    return (np.zeros((0, 4), dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int32))
+
+
+_categories = {}  # class name -> category list, shared by all objects of that class (do not mutate)
+_NO_CATEGORIES = []
+
+
+def to_objects(boxes, confs, class_ids, names, categories=None):
+    """
+    Builds the object dicts used by the spatial and risk logic.
+
+    Args:
+        categories (dict): Optional class name -> category list (e.g.
+            rule_config.RuleTables.categories) instead of object_categories.
+
+    Returns:
+        list: Dicts with 'name', 'center', 'categories', 'box' and 'conf'.
+    """
+    objects = []
+    for (x1, y1, x2, y2), conf, class_id in zip(boxes.astype(int).tolist(), confs.tolist(), class_ids.tolist()):
+        class_name = names[class_id]
+        if categories is not None:
+            cats = categories.get(class_name, _NO_CATEGORIES)
+        else:
+            cats = _categories.get(class_name)
+            if cats is None:
+                cats = _categories[class_name] = object_categories.get_categories(class_name)
+        objects.append({
+            "name": class_name,
+            "center": ((x1 + x2) // 2, (y1 + y2) // 2),
+            "categories": cats,
+            "box": (x1, y1, x2, y2),
+            "conf": conf
+        })
+    return objects
+
+
+def box_iou(box, boxes):
+    """
+    IoU between one box (4,) and many boxes (N, 4).
+    """
+    ix1 = np.maximum(box[0], boxes[:, 0])
+    iy1 = np.maximum(box[1], boxes[:, 1])
+    ix2 = np.minimum(box[2], boxes[:, 2])
+    iy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+def nms(boxes, confs, class_ids, iou_threshold=0.5):
+    """
+    Class-aware greedy Non-Maximum Suppression.
+
+    Boxes of different classes never suppress each other (they are shifted
+    apart by a per-class offset, the same trick YOLO uses internally).
+
+    Returns:
+        np.ndarray: Indices of the boxes to keep, highest confidence first.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    offset = class_ids.astype(np.float32)[:, None] * (float(boxes.max()) + 1.0)
+    shifted = boxes + offset
+
+    order = np.argsort(-confs)
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        if len(order) == 1:
+            break
+        ious = box_iou(shifted[i], shifted[order[1:]])
+        order = order[1:][ious < iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
@@ -0,0 +1,287 @@
+# Detector Cascade: nano model every frame, larger model only on risk candidates
+
+# yolov8n is fast but misses cups; a larger model is accurate but too slow to
+# run on every frame. The cascade keeps the nano model on the normal schedule
+# and escalates to the larger model only when the rule engine sees a potential
+# risk pair, or a low-confidence object in a risk-relevant category. A warning
+# from the nano pass is held back until the larger model has confirmed it.
+#
+# The live loop passes its current rule tables (rule_config), so confirmation
+# uses the same categories and rules as the nano pass. poll() is called on
+# every frame: when a confirmation finishes while inference is being skipped
+# (frame skipping, motion gate), the runner analyzes that frame right away
+# instead of waiting for the next scheduled inference. Confirmed pairs are
+# returned with the nano model's object dicts where the nano model sees the
+# same objects, so downstream stages (tracking, temporal rules) get the
+# objects of the current frame.
+#
+# If the larger model fails (weights missing, inference error), the cascade
+# reports it once and turns itself off: from then on warnings pass through
+# unconfirmed, as without --cascade, instead of being held back forever.
+#
+# Usage:
+#   cascade = DetectorCascade(near_threshold=300)
+#   risk_pairs = cascade.update(frame, objects, risk_pairs, now, tables=tables)   # on inference frames
+#   for key, confirmed, latency in cascade.poll(now): ...                        # on every frame
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import risk_rules
+import detections
+import object_categories
+
+# --- CONFIGURATION ---
+CASCADE_MODEL = 'yolov8s.pt'   # Larger model used for confirmation
+ESCALATE_CONF = 0.40           # Nano detections in risk categories below this are re-checked
+REGION_MARGIN = 80             # Pixels of context around the escalated objects
+FULL_FRAME_FRACTION = 0.6      # If the region covers more than this, run on the whole frame
+CONFIRMED_TTL = 3.0            # Seconds a confirmation stays valid without being seen again
+REJECTED_TTL = 5.0             # Seconds before a retracted candidate may be escalated again
+MATCH_DISTANCE = 60            # Pixels between a confirmed object and the nano detection standing for it
+
+
+class DetectorCascade:
+    """
+    Holds the larger model, escalation decisions and confirmation state.
+
+    In async mode a single background worker runs the larger model; while a
+    confirmation is in flight, further escalations are skipped rather than
+    queued, so the live loop never waits and the worker never falls behind.
+    """
+
+    def __init__(self, model_path=CASCADE_MODEL, near_threshold=300, async_mode=True, model=None):
+        """
+        Args:
+            model_path (str): Weights of the larger model (loaded lazily).
+            near_threshold (float): Same "near" threshold the live loop uses.
+            async_mode (bool): Run confirmations on a worker thread.
+            model: Optional already-loaded model (mainly for experiments).
+        """
+        self.model_path = model_path
+        self.near_threshold = near_threshold
+        self.async_mode = async_mode
+        self._model = model
+        self._classes = None
+        self._classes_for = None   # Rule tables self._classes was derived from
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if async_mode else None
+        self._future = None
+
+        self.confirmed = {}   # risk key -> (expiry time, risk_type, obj_a, obj_b)
+        self.rejected = {}    # risk key / object name -> expiry time
+        self.disabled = False   # Set after a failed confirmation: warnings pass through
+
+        # Statistics
+        self.nano_runs = 0
+        self.escalations = 0
+        self.skipped_busy = 0
+        self.errors = 0
+        self.large_time = 0.0      # Seconds spent in the larger model
+        self.added_latency = []    # Seconds from escalation to confirmed/retracted
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                from ultralytics import YOLO
+                self._model = YOLO(self.model_path)
+            return self._model
+
+    def _escalation_targets(self, objects, candidates, now, tables=None):
+        """
+        Returns (pending candidates, low-confidence objects) that need the larger model.
+        """
+        risk_categories = risk_rules.RISK_CATEGORIES if tables is None else tables.risk_categories
+        pending = []
+        for candidate in candidates:
+            key = risk_rules.risk_key(*candidate)
+            if key not in self.confirmed and self.rejected.get(key, 0) <= now:
+                pending.append(candidate)
+
+        uncertain = [o for o in objects
+                     if o['conf'] < ESCALATE_CONF
+                     and any(cat in o['categories'] for cat in risk_categories)
+                     and self.rejected.get(o['name'], 0) <= now]
+        return pending, uncertain
+
+    def _region(self, boxes, frame_shape):
+        h, w = frame_shape[:2]
+        boxes = np.array(boxes)
+        x1 = max(0, int(boxes[:, 0].min()) - REGION_MARGIN)
+        y1 = max(0, int(boxes[:, 1].min()) - REGION_MARGIN)
+        x2 = min(w, int(boxes[:, 2].max()) + REGION_MARGIN)
+        y2 = min(h, int(boxes[:, 3].max()) + REGION_MARGIN)
+        if (x2 - x1) * (y2 - y1) > FULL_FRAME_FRACTION * w * h:
+            return 0, 0, w, h
+        return x1, y1, x2, y2
+
+    def _confirm(self, crop, offset, pending, uncertain, submitted, tables):
+        """
+        Runs the larger model on the region and returns the risk pairs it sees.
+        """
+        start = time.perf_counter()
+        model = self._get_model()
+        if self._classes is None or tables is not self._classes_for:
+            # Only risk categories matter for confirmation; no display-only classes
+            self._classes_for = tables
+            self._classes = object_categories.class_ids_for(model.names, display_only=()) if tables is None \
+                else tables.class_ids_for(model.names, display_only=())
+        result = model(crop, classes=self._classes, verbose=False)[0]
+        boxes, confs, class_ids = detections.result_to_arrays(result)
+        boxes += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+        if tables is None:
+            objects = detections.to_objects(boxes, confs, class_ids, result.names)
+            pairs = risk_rules.find_risk_pairs(objects, self.near_threshold)
+        else:
+            objects = detections.to_objects(boxes, confs, class_ids, result.names, categories=tables.categories)
+            pairs = tables.find_risk_pairs(objects, self.near_threshold)
+        self.large_time += time.perf_counter() - start
+        return pairs, pending, uncertain, submitted
+
+    def _apply(self, outcome, now):
+        pairs, pending, uncertain, submitted = outcome
+        found = {risk_rules.risk_key(*p): p for p in pairs}
+        latency = now - submitted
+
+        verdicts = []
+        for key, pair in found.items():
+            self.confirmed[key] = (now + CONFIRMED_TTL,) + pair
+            verdicts.append((key, True, latency))
+        for candidate in pending:
+            key = risk_rules.risk_key(*candidate)
+            if key not in found:
+                self.rejected[key] = now + REJECTED_TTL
+                verdicts.append((key, False, latency))
+        for obj in uncertain:
+            self.rejected[obj['name']] = now + REJECTED_TTL
+
+        self.added_latency.append(latency)
+        return verdicts
+
+    def _fail(self, error):
+        """
+        Turns the cascade off after a failed confirmation; held warnings are released unconfirmed.
+        """
+        self.errors += 1
+        self.disabled = True
+        self.confirmed.clear()
+        print(f"❌ Cascade confirmation failed ({error}); showing warnings unconfirmed from now on")
+
+    def poll(self, now=None):
+        """
+        Collects a finished confirmation; call on every frame, also when inference is skipped.
+
+        Returns:
+            list: (risk key, confirmed, latency seconds) verdicts, empty if nothing finished.
+        """
+        now = time.monotonic() if now is None else now
+        if self._future is not None and self._future.done():
+            future, self._future = self._future, None
+            try:
+                outcome = future.result()
+            except Exception as e:
+                self._fail(e)
+                return []
+            return self._apply(outcome, now)
+        return []
+
+    def _on_nano(self, pair, objects):
+        """
+        Replaces the objects of a confirmed pair by the nano detections standing
+        for them in this frame (same class, nearest centre), where there are any.
+        """
+        max_d2 = MATCH_DISTANCE ** 2
+        result = [pair[0]]
+        for obj in pair[1:]:
+            best, best_d2 = obj, max_d2
+            if not any(obj is other for other in objects):
+                cx, cy = obj['center']
+                for other in objects:
+                    if other['name'] == obj['name']:
+                        d2 = (cx - other['center'][0]) ** 2 + (cy - other['center'][1]) ** 2
+                        if d2 <= best_d2:
+                            best, best_d2 = other, d2
+            result.append(best)
+        return tuple(result)
+
+    def update(self, frame, objects, candidates, now=None, tables=None):
+        """
+        Feeds one nano-model result into the cascade.
+
+        Args:
+            frame (np.ndarray): The frame the nano model ran on.
+            objects (list): Nano object dicts (with 'conf').
+            candidates (list): (risk_type, obj_a, obj_b) tuples from the rule engine.
+            now (float): Timestamp in seconds (defaults to time.monotonic()).
+            tables (rule_config.RuleTables): Current categories and rules
+                (None = the built-in ones).
+
+        Returns:
+            list: Confirmed (risk_type, obj_a, obj_b) tuples that may be shown now,
+            with this frame's nano objects where the nano model sees them.
+        """
+        now = time.monotonic() if now is None else now
+        self.nano_runs += 1
+        self.poll(now)
+        if self.disabled:
+            return list(candidates)
+
+        # Candidates the nano model still sees keep their confirmation alive
+        for candidate in candidates:
+            key = risk_rules.risk_key(*candidate)
+            if key in self.confirmed:
+                self.confirmed[key] = (now + CONFIRMED_TTL,) + candidate
+
+        pending, uncertain = self._escalation_targets(objects, candidates, now, tables)
+        if pending or uncertain:
+            if self._future is not None:
+                self.skipped_busy += 1
+            else:
+                boxes = [o['box'] for c in pending for o in c[1:]] + [o['box'] for o in uncertain]
+                x1, y1, x2, y2 = self._region(boxes, frame.shape)
+                crop = frame[y1:y2, x1:x2].copy()  # Pool slots get recycled by the live loop
+                self.escalations += 1
+                if self.async_mode:
+                    self._future = self._executor.submit(self._confirm, crop, (x1, y1), pending, uncertain, now,
+                                                         tables)
+                else:
+                    start = time.perf_counter()
+                    try:
+                        outcome = self._confirm(crop, (x1, y1), pending, uncertain, now, tables)
+                    except Exception as e:
+                        self._fail(e)
+                        return list(candidates)
+                    # On the caller's clock: the frame waited for the larger model
+                    self._apply(outcome, now + time.perf_counter() - start)
+
+        # Drop expired entries
+        self.confirmed = {k: v for k, v in self.confirmed.items() if v[0] > now}
+        self.rejected = {k: v for k, v in self.rejected.items() if v > now}
+
+        return [self._on_nano(v[1:], objects) for v in self.confirmed.values()]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        latency = self.added_latency
+        return {
+            'nano_runs': self.nano_runs,
+            'escalations': self.escalations,
+            'escalation_rate': self.escalations / self.nano_runs if self.nano_runs else 0.0,
+            'skipped_busy': self.skipped_busy,
+            'errors': self.errors,
+            'avg_large_ms': 1e3 * self.large_time / self.escalations if self.escalations else 0.0,
+            'avg_added_latency_ms': 1e3 * sum(latency) / len(latency) if latency else 0.0,
+            'max_added_latency_ms': 1e3 * max(latency) if latency else 0.0
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"Cascade: escalated {s['escalations']}/{s['nano_runs']} nano runs "
+                f"({s['escalation_rate']:.0%}), {s['skipped_busy']} skipped while busy, "
+                f"{s['errors']} failed, "
+                f"large model {s['avg_large_ms']:.0f}ms, warning delay "
+                f"avg {s['avg_added_latency_ms']:.0f}ms / max {s['max_added_latency_ms']:.0f}ms")
@@ -0,0 +1,265 @@
+# Edge Node: detection only, detections streamed to a scene aggregator
+
+# A capture box runs the camera and the detector and nothing else; reasoning,
+# storage and dashboards run once, centrally, in scene_aggregator.py. Each
+# analyzed frame is sent as a scene_protocol message (header + 10 bytes per
+# detection) over one TCP connection.
+#
+# Every detected class is sent, not only the classes the built-in categories
+# use: categories and rules live in the aggregator's hot-reloaded rules file,
+# so a class added there is reasoned about without touching the edges, and an
+# extra detection costs only 10 bytes.
+#
+# Sending never blocks the capture loop. Messages go into a small queue that
+# a sender thread drains. The aggregator acknowledges every processed frame
+# and the sender keeps at most WINDOW frames unacknowledged; if the aggregator
+# (or the network) falls behind, the sender waits for ACKs, the queue fills up
+# and the *oldest* frames are dropped - the aggregator always gets the
+# freshest state, and the dropped sequence numbers show up there as losses.
+# Frames therefore never pile up in socket buffers, which would hold thousands
+# of these small messages before TCP flow control pushed back. A lost
+# connection is retried every RECONNECT_DELAY seconds while frames keep being
+# counted and dropped.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/edge_node.py --aggregator 192.168.1.10:9750 --node 3
+#   python ESUA/phase6_camera_integration/edge_node.py --source recordings/desk --recorded-detections --node 1
+#   python ESUA/phase6_camera_integration/edge_node.py --synthetic 30 --duration 10   # No camera / model
+
+import argparse
+import collections
+import socket
+import threading
+import time
+import batch_reasoning
+import detections
+import frame_pool
+import recording
+import runtime_config
+import scene_protocol
+import thread_budget
+
+# --- CONFIGURATION ---
+AGGREGATOR = '127.0.0.1:9750'
+MAX_QUEUE = 4              # Frames waiting to be sent; older ones are dropped beyond this
+WINDOW = 2                 # Frames sent but not yet acknowledged by the aggregator
+RECONNECT_DELAY = 1.0      # Seconds between connection attempts
+
+
+class EdgeSender:
+    """
+    Sends scene_protocol messages to the aggregator from a background thread.
+    """
+
+    def __init__(self, address, node, names, frame_size, max_queue=MAX_QUEUE):
+        """
+        Args:
+            address (str): Aggregator 'host:port'.
+            node (int): This node's id.
+            names (dict): Detector class id -> name (sent in the HELLO).
+            frame_size (tuple): (width, height) of the analyzed frames.
+            max_queue (int): Messages kept while the link is slow or down.
+        """
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.node = node
+        self.hello = scene_protocol.encode_hello(node, names, frame_size)
+        self._queue = collections.deque()
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+        self._closing = False
+        self._closed = threading.Event()
+        self._in_flight = collections.deque()   # Seqs sent and not yet acknowledged
+        self._acks = b''
+        self.seq = 0
+
+        # Statistics
+        self.frames = 0
+        self.sent = 0
+        self.dropped = 0          # Dropped from the queue (backpressure or no connection)
+        self.bytes_sent = 0
+        self.connects = 0
+        self.send_errors = 0
+
+        self._thread = threading.Thread(target=self._run, name='edge-sender', daemon=True)
+        self._thread.start()
+
+    def send(self, boxes, confs, class_ids, capture_ts):
+        """
+        Queues one analyzed frame; never blocks.
+        """
+        message = scene_protocol.encode_frame(self.node, self.seq, boxes, confs, class_ids, capture_ts)
+        self.seq += 1
+        self.frames += 1
+        with self._cond:
+            if len(self._queue) >= self._max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(message)
+            self._cond.notify()
+
+    def _connect(self):
+        while not self._closing:
+            try:
+                sock = socket.create_connection(self.address, timeout=RECONNECT_DELAY)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(None)
+                sock.sendall(self.hello)
+                self._in_flight.clear()
+                self._acks = b''
+                self.connects += 1
+                return sock
+            except OSError:
+                # Nobody is listening: send() keeps only the freshest frames meanwhile
+                if self._closed.wait(RECONNECT_DELAY):
+                    break
+        return None
+
+    def _wait_window(self, sock):
+        """
+        Reads ACKs until fewer than WINDOW frames are unacknowledged.
+        """
+        size = scene_protocol.HEADER.size
+        while len(self._in_flight) >= WINDOW:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionError("Aggregator closed the connection")
+            self._acks += data
+            while len(self._acks) >= size:
+                kind, _, _, seq, _, _, _ = scene_protocol.parse_header(self._acks[:size])
+                self._acks = self._acks[size:]
+                if kind == scene_protocol.KIND_ACK:
+                    while self._in_flight and self._in_flight[0] <= seq:
+                        self._in_flight.popleft()
+
+    def _run(self):
+        sock = None
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                message = self._queue.popleft()
+            if sock is None:
+                sock = self._connect()
+                if sock is None:
+                    break
+                with self._cond:
+                    if self._queue:
+                        # Frames arrived while connecting: the held one is the stalest
+                        self.dropped += 1
+                        message = self._queue.popleft()
+            try:
+                self._wait_window(sock)
+                sock.sendall(scene_protocol.restamp(message, time.time()))
+                self._in_flight.append(scene_protocol.HEADER.unpack_from(message)[5])
+                self.sent += 1
+                self.bytes_sent += len(message)
+            except (OSError, ValueError):
+                self.send_errors += 1
+                sock.close()
+                sock = None
+        if sock is not None:
+            sock.close()
+
+    def close(self, timeout=2.0):
+        """
+        Sends what is still queued (up to `timeout` seconds) and disconnects.
+        """
+        deadline = time.time() + timeout
+        while self._queue and time.time() < deadline and self.connects:
+            time.sleep(0.01)
+        with self._cond:
+            self._closing = True
+            self._queue.clear()
+            self._cond.notify()
+        self._closed.set()
+        self._thread.join(timeout)
+
+    def report(self):
+        per_frame = self.bytes_sent / self.sent if self.sent else 0.0
+        return (f"Edge node {self.node}: {self.frames} frames, {self.sent} sent ({per_frame:.1f} bytes/frame), "
+                f"{self.dropped} dropped under backpressure, {self.connects} connections, "
+                f"{self.send_errors} send errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESUA edge node: detect and stream detections to an aggregator.")
+    recording.add_source_arguments(parser, record=False)
+    parser.add_argument('--aggregator', default=AGGREGATOR, help="host:port of scene_aggregator.py")
+    parser.add_argument('--node', type=int, default=0, help="Node id (also the camera id at the aggregator)")
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--recorded-detections', action='store_true',
+                        help="Send the detections stored in a recording instead of running the model")
+    parser.add_argument('--synthetic', type=float, metavar='FPS',
+                        help="Send random detections at this rate (no camera or model; for link tests)")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    args = parser.parse_args()
+
+    config = runtime_config.load_config()
+    size = tuple(config['analysis_size'])
+    stop_at = time.time() + args.duration if args.duration else None
+
+    if args.synthetic:
+        corpus, names = batch_reasoning.synthetic_corpus(1000, size=size, seed=args.node)
+        sender = EdgeSender(args.aggregator, args.node, names, size)
+        print(f"Edge node {args.node}: synthetic detections at {args.synthetic:.0f} FPS -> {args.aggregator}")
+        interval = 1.0 / args.synthetic
+        next_due = time.perf_counter()
+        i = 0
+        try:
+            while stop_at is None or time.time() < stop_at:
+                sender.send(*corpus[i % len(corpus)], time.time())
+                i += 1
+                next_due += interval
+                time.sleep(max(0.0, next_due - time.perf_counter()))
+        except KeyboardInterrupt:
+            pass
+        sender.close()
+        print(sender.report())
+        return
+
+    thread_budget.setup('live', config, stream=args.node)
+    cap = recording.open_runner_source(args)
+    if not cap.isOpened():
+        print(f"❌ Error: Could not open source {args.source}.")
+        return
+    replay_dets = args.recorded_detections and isinstance(cap, recording.ReplayCapture)
+    if replay_dets:
+        model, names = None, cap.names
+    else:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+        names = model.names
+
+    pool = frame_pool.FramePool(4, size)
+    sender = EdgeSender(args.aggregator, args.node, names, size)
+    print(f"Edge node {args.node}: {args.source} -> {args.aggregator} (Ctrl+C to stop)")
+    frame_count = 0
+    try:
+        while stop_at is None or time.time() < stop_at:
+            ok, seq, frame = pool.read(cap)
+            if not ok:
+                break
+            capture_ts = time.time()
+            frame_count += 1
+            if replay_dets:
+                dets = cap.detections(cap.pos - 1)
+                if dets is None:
+                    continue   # The recorder's detector did not run on this frame
+            elif frame_count % config['skip_frames']:
+                continue
+            else:
+                dets = detections.result_to_arrays(
+                    model(frame, imgsz=config['imgsz'], verbose=False)[0])
+            sender.send(*dets, capture_ts)
+    except KeyboardInterrupt:
+        pass
+    cap.release()
+    sender.close()
+    print(sender.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# Event Store: SQLite history of detections, risk events and explanations
+
+# The live loop must never block on disk, so writes go into a bounded queue and
+# a background thread commits them in batched transactions (WAL mode). Reads
+# use their own connection, so queries can run while the runner is writing.
+#
+# Usage (query CLI):
+#   python ESUA/phase6_camera_integration/event_store.py events --risk spill_risk --camera 2 --since 7d
+#   python ESUA/phase6_camera_integration/event_store.py detections --class cup --since 1h
+#   python ESUA/phase6_camera_integration/event_store.py bench
+
+import argparse
+import datetime
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+
+# --- CONFIGURATION ---
+DEFAULT_DB_PATH = 'ESUA/phase6_camera_integration/esua_events.db'
+BATCH_SIZE = 500           # Max rows per transaction
+FLUSH_INTERVAL = 0.5       # Seconds; commit at least this often when rows are pending
+MAX_QUEUE = 20000          # Pending rows; beyond this new rows are dropped (and counted)
+# Event kinds of risk_events.RiskEventTracker (incl. burst verdicts) and temporal_rules
+EVENT_KINDS = ('onset', 'ongoing', 'resolved', 'confirmed', 'retracted')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera INTEGER NOT NULL,
+    frame INTEGER,
+    class_name TEXT NOT NULL,
+    conf REAL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE TABLE IF NOT EXISTS risk_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    risk_type TEXT NOT NULL,
+    obj_a TEXT,
+    obj_b TEXT,
+    start REAL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS explanations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera INTEGER NOT NULL,
+    risk_type TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_det_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS idx_det_camera_ts ON detections (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_det_class_ts ON detections (class_name, ts);
+CREATE INDEX IF NOT EXISTS idx_risk_ts ON risk_events (ts);
+CREATE INDEX IF NOT EXISTS idx_risk_camera_ts ON risk_events (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_risk_type_ts ON risk_events (risk_type, ts);
+CREATE INDEX IF NOT EXISTS idx_risk_obj_a ON risk_events (obj_a, ts);
+CREATE INDEX IF NOT EXISTS idx_risk_obj_b ON risk_events (obj_b, ts);
+CREATE INDEX IF NOT EXISTS idx_expl_ts ON explanations (ts);
+CREATE INDEX IF NOT EXISTS idx_expl_camera_ts ON explanations (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_expl_type_ts ON explanations (risk_type, ts);
+"""
+
+INSERTS = {
+    'detections': "INSERT INTO detections (ts, camera, frame, class_name, conf, x1, y1, x2, y2) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'risk_events': "INSERT INTO risk_events (ts, camera, event, risk_type, obj_a, obj_b, start, duration) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    'explanations': "INSERT INTO explanations (ts, camera, risk_type, text) VALUES (?, ?, ?, ?)"
+}
+
+
+def connect(path):
+    """
+    Opens the database in WAL mode and makes sure the schema exists.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class EventStore:
+    """
+    Non-blocking writer. All add_* methods only enqueue tuples.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, camera=0, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self.path = path
+        self.camera = camera
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        # Statistics
+        self.written = 0
+        self.dropped = 0
+        self.transactions = 0
+
+        # Create the schema before returning so queries work immediately
+        connect(path).close()
+        self._thread = threading.Thread(target=self._writer, name='event-store', daemon=True)
+        self._thread.start()
+
+    def _put(self, table, row):
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            self.dropped += 1
+
+    def add_detections(self, objects, ts=None, frame=None):
+        """
+        Queues one row per object dict (needs 'name' and 'box', 'conf' optional).
+        """
+        ts = time.time() if ts is None else ts
+        for obj in objects:
+            x1, y1, x2, y2 = obj['box']
+            self._put('detections', (ts, self.camera, frame, obj['name'], obj.get('conf'), x1, y1, x2, y2))
+
+    def add_event(self, event):
+        """
+        Queues a risk event dict as produced by risk_events.RiskEventTracker.
+        """
+        self._put('risk_events', (event['time'], self.camera, event['event'], event['risk_type'],
+                                  event['obj_a'], event['obj_b'], event['start'], event['duration']))
+
+    def add_explanation(self, risk_type, text, ts=None):
+        self._put('explanations', (time.time() if ts is None else ts, self.camera, risk_type, text))
+
+    def _writer(self):
+        conn = connect(self.path)
+        pending = {table: [] for table in INSERTS}
+        count = 0
+        deadline = None
+        running = True
+
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is None:
+                    running = False
+                else:
+                    pending[item[0]].append(item[1])
+                    count += 1
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if count and (count >= self.batch_size or not running or time.monotonic() >= deadline):
+                with conn:  # One transaction for the whole batch
+                    for table, rows in pending.items():
+                        if rows:
+                            conn.executemany(INSERTS[table], rows)
+                            rows.clear()
+                self.written += count
+                self.transactions += 1
+                count = 0
+                deadline = None
+
+        conn.close()
+
+    def close(self):
+        """
+        Commits everything still queued and stops the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def report(self):
+        return (f"Event store: {self.written} rows in {self.transactions} transactions, "
+                f"{self.dropped} dropped -> {self.path}")
+
+
+# --- QUERY API ---
+
+def _where(camera=None, since=None, until=None, **equals):
+    clauses, params = [], []
+    if camera is not None:
+        clauses.append("camera = ?")
+        params.append(camera)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    for column, value in equals.items():
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _query(path, table, columns, limit, **filters):
+    where, params = _where(**filters)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        sql = f"SELECT {columns} FROM {table}{where} ORDER BY ts DESC LIMIT ?"
+        return [dict(row) for row in conn.execute(sql, params + [limit])]
+    finally:
+        conn.close()
+
+
+def query_risk_events(path=DEFAULT_DB_PATH, camera=None, risk_type=None, event=None,
+                      since=None, until=None, limit=1000):
+    """
+    Returns risk events (newest first), e.g. all spill risks on camera 2 last week:
+
+        query_risk_events(camera=2, risk_type='spill_risk', since=time.time() - 7 * 86400)
+    """
+    return _query(path, 'risk_events', 'ts, camera, event, risk_type, obj_a, obj_b, start, duration', limit,
+                  camera=camera, since=since, until=until, risk_type=risk_type, event=event)
+
+
+def query_detections(path=DEFAULT_DB_PATH, camera=None, class_name=None, since=None, until=None, limit=1000):
+    """
+    Returns detections (newest first), optionally filtered by object class.
+    """
+    return _query(path, 'detections', 'ts, camera, frame, class_name, conf, x1, y1, x2, y2', limit,
+                  camera=camera, since=since, until=until, class_name=class_name)
+
+
+def query_explanations(path=DEFAULT_DB_PATH, camera=None, risk_type=None, since=None, until=None, limit=1000):
+    """
+    Returns generated explanations (newest first).
+    """
+    return _query(path, 'explanations', 'ts, camera, risk_type, text', limit,
+                  camera=camera, since=since, until=until, risk_type=risk_type)
+
+
+def parse_time(value):
+    """
+    Accepts relative ages ('30m', '12h', '7d') or ISO dates ('2024-05-01').
+    """
+    if value is None:
+        return None
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if value[-1] in units and value[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+# --- BENCHMARK ---
+
+def benchmark(rows=200000, queries=50):
+    """
+    Measures background write throughput and indexed query latency on a temp DB.
+    """
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    classes = ['cup', 'laptop', 'bottle', 'book', 'person', 'keyboard', 'mouse', 'cell phone']
+    risks = ['spill_risk', 'damage_risk']
+    now = time.time()
+
+    store = EventStore(path, max_queue=rows * 2)
+    start = time.perf_counter()
+    enqueue_time = 0.0
+    for i in range(rows):
+        ts = now - 14 * 86400 + i * (14 * 86400 / rows)
+        store.camera = i % 4
+        t = time.perf_counter()
+        store.add_detections([{'name': classes[i % len(classes)], 'box': (i % 640, i % 480, 50, 50), 'conf': 0.5}],
+                             ts=ts, frame=i)
+        if i % 20 == 0:
+            store.camera = (i // 20) % 4
+            store.add_event({'time': ts, 'event': 'onset', 'risk_type': risks[(i // 80) % 2],
+                             'obj_a': 'cup', 'obj_b': 'laptop', 'start': ts, 'duration': 0.0})
+        enqueue_time += time.perf_counter() - t
+    store.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Write: {store.written} rows in {elapsed:.2f}s -> {store.written / elapsed:,.0f} rows/s "
+          f"({store.transactions} transactions, {store.dropped} dropped)")
+    print(f"Live-loop cost: {1e6 * enqueue_time / rows:.1f}us per frame enqueue")
+
+    cases = {
+        'spill risks, camera 2, last 7d': lambda: query_risk_events(
+            path, camera=2, risk_type='spill_risk', since=now - 7 * 86400),
+        'cups, last 1h': lambda: query_detections(path, class_name='cup', since=now - 3600),
+        'camera 1, last 1d (limit 100)': lambda: query_detections(path, camera=1, since=now - 86400, limit=100)
+    }
+    for name, fn in cases.items():
+        times = []
+        for _ in range(queries):
+            t = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - t)
+        times.sort()
+        print(f"Query '{name}': {len(result)} rows, p50 {1e3 * times[len(times) // 2]:.2f}ms, "
+              f"p95 {1e3 * times[int(len(times) * 0.95)]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the ESUA event store.")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Database path")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    events = sub.add_parser('events', help="Risk events")
+    events.add_argument('--risk', help="Risk type, e.g. spill_risk")
+    events.add_argument('--event', choices=EVENT_KINDS)
+
+    dets = sub.add_parser('detections', help="Detections")
+    dets.add_argument('--class', dest='class_name', help="Object class, e.g. cup")
+
+    expl = sub.add_parser('explanations', help="Generated explanations")
+    expl.add_argument('--risk', help="Risk type")
+
+    for p in (events, dets, expl):
+        p.add_argument('--camera', type=int)
+        p.add_argument('--since', help="e.g. 7d, 12h or 2024-05-01")
+        p.add_argument('--until', help="e.g. 1d or 2024-05-08")
+        p.add_argument('--limit', type=int, default=100)
+
+    bench = sub.add_parser('bench', help="Write-throughput and query-latency benchmark")
+    bench.add_argument('--rows', type=int, default=200000)
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        benchmark(args.rows)
+        return
+
+    if not os.path.exists(args.db):
+        print(f"Error: No event store at {args.db}")
+        return
+
+    filters = dict(camera=args.camera, since=parse_time(args.since), until=parse_time(args.until), limit=args.limit)
+    if args.command == 'events':
+        rows = query_risk_events(args.db, risk_type=args.risk, event=args.event, **filters)
+    elif args.command == 'detections':
+        rows = query_detections(args.db, class_name=args.class_name, **filters)
+    else:
+        rows = query_explanations(args.db, risk_type=args.risk, **filters)
+
+    for row in rows:
+        stamp = datetime.datetime.fromtimestamp(row.pop('ts')).strftime('%Y-%m-%d %H:%M:%S')
+        print(stamp, ' '.join(f"{k}={v}" for k, v in row.items()))
+    print(f"({len(rows)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,11 +26,35 @@ TEMPLATES = {
         "Please consider keeping the area around the {obj_b} clear."
     ],
     'sharp_risk': [
-        "A {obj_a} was detected near the edge or near a {obj_b}.",
+        "A {obj_a} was detected on the {obj_b}.",
         "Sharp objects can cause injury if not stored safely.",
         "An accidental bump could cause the {obj_a} to fall or hurt someone.",
         "Storing the {obj_a} in a safer spot is recommended."
     ],
+    'trip_risk': [
+        "A {obj_a} is standing in the {obj_b}.",
+        "Objects in walkways are easy to miss.",
+        "Someone could trip over it or bump into it.",
+        "Moving the {obj_a} out of the {obj_b} would keep the way clear."
+    ],
+    'prolonged_spill_risk': [
+        "A {obj_a} has been next to a {obj_b} for {minutes} min.",
+        "The longer a drink stays beside electronics, the more chances there are to knock it over.",
+        "A single spill could damage the device.",
+        "Giving the {obj_a} a permanent spot away from the {obj_b} would help."
+    ],
+    'prolonged_damage_risk': [
+        "A {obj_a} has been next to a {obj_b} for {minutes} min.",
+        "Liquids left beside paper-based items for a long time are easy to forget.",
+        "A spill could ruin the {obj_b}.",
+        "Please consider moving the {obj_a} somewhere else."
+    ],
+    'unattended_sharp': [
+        "A {obj_a} has been left out with nobody around for {minutes} min.",
+        "Sharp objects left unattended can catch someone by surprise.",
+        "Someone could reach for it or knock it without noticing.",
+        "Please put the {obj_a} away when it is not in use."
+    ],
     'default': [
         "A {obj_a} is near a {obj_b}.",
         "Objects placed close together can sometimes interact unexpectedly.",
@@ -64,3 +88,31 @@ def get_explanation(risk_type, context):
             formatted_lines.append(line + f" [Missing data: {e}]")
             
     return "\n".join(formatted_lines)
+
+
+def describe_risk(risk_type, t_obj_a, t_obj_b, explain=get_explanation):
+    """
+    Builds the short on-screen text for a risk pair (obj_a is the liquid).
+
+    Args:
+        risk_type (str): Key for the template (e.g., 'spill_risk').
+        t_obj_a (dict): Object A with 'name' and 'categories'.
+        t_obj_b (dict): Object B with 'name' and 'categories'.
+        explain (callable): (risk_type, context) -> text, e.g. a rule_config.RuleTables.explain.
+
+    Returns:
+        str: First line (observation) and last line (suggestion) of the explanation.
+    """
+    context_data = {
+        'obj_a': t_obj_a['name'],
+        'cat_a': t_obj_a['categories'][0] if t_obj_a['categories'] else 'object',
+        'obj_b': t_obj_b['name'],
+        'cat_b': ','.join(t_obj_b['categories'])
+    }
+
+    # Get full text
+    full_expl = explain(risk_type, context_data)
+
+    # Just take the first line (Observation) and last (Suggestion) for on-screen display to save space
+    lines = full_expl.split('\n')
+    return f"⚠️ {lines[0]} -> {lines[-1]}"
@@ -0,0 +1,86 @@
+# Frame Pool: preallocated, fixed-resolution ring of frames
+
+# Appending camera frames to a deque allocates a new full-resolution array per
+# frame, and cv2.resize without a destination allocates another one. The pool
+# allocates all slots once, at the analysis resolution, and fills them in place
+# (cv2.resize(dst=...) or a straight copy). Slots are recycled by sequence
+# number: frame `seq` lives in slot `seq % capacity` until it is overwritten
+# `capacity` frames later. Holders keep the sequence number, not the array, and
+# check validity with get().
+
+import cv2
+import numpy as np
+
+ANALYSIS_SIZE = (640, 480)  # (width, height)
+
+
+class FramePool:
+    """
+    Ring of `capacity` preallocated BGR frames of a fixed size.
+    """
+
+    def __init__(self, capacity, size=ANALYSIS_SIZE):
+        """
+        Args:
+            capacity (int): Number of frames kept. Must exceed the number of
+                frames any consumer holds at once, plus the one being written.
+            size (tuple): (width, height) of every slot.
+        """
+        self.capacity = capacity
+        self.size = size
+        w, h = size
+        self._frames = np.empty((capacity, h, w, 3), dtype=np.uint8)
+        self._raw = None      # Reused camera read buffer (native resolution)
+        self.seq = -1         # Sequence number of the newest frame
+
+    def put(self, frame):
+        """
+        Copies/resizes `frame` into the next slot.
+
+        Returns:
+            tuple: (seq, view) where view is the slot array (do not keep it
+            beyond `capacity` further puts).
+        """
+        seq = self.seq + 1
+        slot = self._frames[seq % self.capacity]
+        if frame.shape[1] == self.size[0] and frame.shape[0] == self.size[1]:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, self.size, dst=slot)
+        self.seq = seq
+        return seq, slot
+
+    def read(self, cap):
+        """
+        Reads the next frame from a cv2.VideoCapture-like source into the pool.
+
+        The native-resolution read buffer is reused between calls, so a
+        steady-state read allocates nothing.
+
+        Returns:
+            tuple: (ok, seq, view). ok is False at end of stream / camera error.
+        """
+        ok, frame = cap.read(self._raw) if self._raw is not None else cap.read()
+        if not ok or frame is None:
+            return False, None, None
+        self._raw = frame
+        seq, slot = self.put(frame)
+        return True, seq, slot
+
+    def get(self, seq):
+        """
+        Returns the frame with sequence number `seq`, or None if it was recycled.
+        """
+        if seq < 0 or seq > self.seq or seq <= self.seq - self.capacity:
+            return None
+        return self._frames[seq % self.capacity]
+
+    def latest(self, n):
+        """
+        Returns the newest `n` (seq, view) pairs, oldest first.
+        """
+        first = max(0, self.seq - min(n, self.capacity) + 1)
+        return [(s, self._frames[s % self.capacity]) for s in range(first, self.seq + 1)]
+
+    def nbytes(self):
+        return self._frames.nbytes
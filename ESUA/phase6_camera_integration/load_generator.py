@@ -0,0 +1,132 @@
+# Load Generator for the ESUA Analysis Service
+
+# Fires concurrent POST /analyze requests and reports throughput and tail
+# latency. With --sweep it starts a fresh service for each batch window, so the
+# effect of micro-batching can be compared in one run.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/load_generator.py --concurrency 16 --duration 20
+#   python ESUA/phase6_camera_integration/load_generator.py --sweep 0,5,10,25,50
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_IMAGE = 'ESUA/phase4_explanation_generation/sample.jpg'
+
+
+async def post(host, port, path, body=b''):
+    """
+    Sends one request and returns (status, parsed JSON body).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    method = 'POST' if body else 'GET'
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+
+    head, _, payload = data.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    return status, json.loads(payload) if payload else None
+
+
+async def run_load(host, port, image_bytes, concurrency, duration):
+    """
+    Keeps `concurrency` requests in flight for `duration` seconds.
+    """
+    latencies = []
+    errors = 0
+    end = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                status, _ = await post(host, port, '/analyze', image_bytes)
+            except (ConnectionError, OSError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    _, metrics = await post(host, port, '/metrics')
+    latencies.sort()
+
+    def pct(p):
+        return 1e3 * latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float('nan')
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed,
+        'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+        'avg_batch_size': metrics.get('avg_batch_size') if metrics else None
+    }
+
+
+async def wait_healthy(host, port, timeout=120.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            status, _ = await post(host, port, '/health')
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+def print_result(label, r):
+    print(f"{label:>12} | {r['throughput']:7.1f} req/s | p50 {r['p50']:7.1f}ms | p95 {r['p95']:7.1f}ms | "
+          f"p99 {r['p99']:7.1f}ms | batch {r['avg_batch_size']} | errors {r['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for analysis_service.py")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--image', default=DEFAULT_IMAGE)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--sweep', help="Comma-separated batch windows (ms); starts a service per window")
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+
+    if not args.sweep:
+        result = asyncio.run(run_load(args.host, args.port, image_bytes, args.concurrency, args.duration))
+        print_result('service', result)
+        return
+
+    service = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_service.py')
+    print(f"Concurrency {args.concurrency}, {args.duration:.0f}s per batch window")
+    for window in args.sweep.split(','):
+        proc = subprocess.Popen([sys.executable, service, '--host', args.host, '--port', str(args.port),
+                                 '--batch-window-ms', window], stdout=subprocess.DEVNULL)
+        try:
+            if not asyncio.run(wait_healthy(args.host, args.port)):
+                print(f"Service with window {window}ms did not start.")
+                continue
+            result = asyncio.run(run_load(args.host, args.port, image_bytes, args.concurrency, args.duration))
+            print_result(f"{window}ms", result)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
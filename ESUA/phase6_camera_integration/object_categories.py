@@ -11,6 +11,9 @@ CATEGORIES = {
     'furniture': ['dining table', 'chair', 'couch', 'bed']
 }
 
+# Classes detected and drawn even though no rule uses them
+DISPLAY_ONLY_CLASSES = ['person']
+
 def get_categories(class_name):
     """
     Returns a list of categories for a given object class name.
@@ -23,3 +26,23 @@ def get_categories(class_name):
             found_categories.append(category)
             
     return found_categories
+
+def class_ids_for(names, display_only=DISPLAY_ONLY_CLASSES):
+    """
+    Returns the detector class ids worth detecting, derived from CATEGORIES.
+
+    Passing these as YOLO `classes=` lets NMS and postprocessing skip the
+    other COCO classes entirely. Category entries the model does not know
+    (e.g. 'paper') are ignored.
+
+    Args:
+        names (dict): Class id -> class name mapping from the model.
+        display_only (list): Extra classes kept for overlays only.
+
+    Returns:
+        list: Sorted class ids.
+    """
+    wanted = set(display_only)
+    for items in CATEGORIES.values():
+        wanted.update(items)
+    return sorted(class_id for class_id, name in names.items() if name in wanted)
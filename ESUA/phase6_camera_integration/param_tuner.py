@@ -0,0 +1,273 @@
+# Detection Parameter Autotuner (speed vs. recall)
+
+# SKIP_FRAMES, the 640x480 resize, NEAR_THRESHOLD, GROUPING_DISTANCE_THRESHOLD,
+# BUFFER_SIZE and the class-aware thresholds were picked by hand. This tool
+# replays labeled recordings, sweeps those parameters plus YOLO imgsz, and
+# measures FPS, time per frame and risk-detection precision/recall.
+#
+# Detection-level settings (analysis size, imgsz) need a detector pass per
+# setting. Everything else only changes which detections are used and how, so
+# each recording is detected once per detection setting (at a low confidence)
+# and the reasoning-level settings are simulated on the stored detections.
+# A simulated run is charged wall-clock time: the measured capture cost
+# (decode + resize) of every frame, skipped or not, plus the measured
+# inference and reasoning time of the frames it would have analyzed. FPS is
+# frames per charged second, i.e. what a single live loop would reach.
+#
+# Labels: for every video `clip.mp4` a `clip.labels.jsonl` file lists the risk
+# types that are present per frame, one JSON object per line:
+#   {"frame": 120, "risks": ["spill_risk"]}
+# Frames without a line are treated as risk-free.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/param_tuner.py recordings/*.mp4 --min-fps 15
+
+import argparse
+import itertools
+import json
+import os
+import time
+import cv2
+import numpy as np
+import detection_cache
+import detections
+import recording
+import risk_rules
+import runtime_config
+
+DETECTION_GRID = {
+    'analysis_size': [[640, 480], [480, 360]],
+    'imgsz': [320, 480, 640]
+}
+REASONING_GRID = {
+    'skip_frames': [1, 3, 5, 8],
+    'near_threshold': [200, 300, 400],
+    'grouping_distance_threshold': [30, 50, 80],
+    'buffer_size': [1, 3, 5],
+    'small_object_threshold': [0.10, 0.15, 0.25]
+}
+DETECT_CONF = 0.05   # Keep almost everything; thresholds are applied in simulation
+SMALL_OBJECTS = ['cup', 'bottle', 'wine glass', 'cell phone', 'mouse', 'remote']
+
+
+def load_labels(video_path):
+    """
+    Returns {frame_index: set(risk types)} for a recording.
+    """
+    path = os.path.splitext(video_path)[0] + '.labels.jsonl'
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                labels[int(entry['frame'])] = set(entry['risks'])
+    return labels
+
+
+def detect_recording(model, video_path, analysis_size, imgsz, cache_dir=None):
+    """
+    Runs the detector on every frame of a recording.
+
+    With `cache_dir`, cached detector output (and its recorded inference
+    time) is reused, so repeated tuning runs only pay for decoding.
+
+    Returns:
+        tuple: (per-frame list of (boxes, confs, class_ids), names,
+                (N, 2) wall seconds per frame: capture+resize, inference)
+    """
+    cached = None
+    if cache_dir:
+        cached = detection_cache.CachedDetector(model, cache_dir, imgsz=imgsz, conf=DETECT_CONF)
+    cap = recording.open_source(video_path)
+    frame = np.empty((analysis_size[1], analysis_size[0], 3), dtype=np.uint8)
+    frames, costs = [], []
+    while True:
+        start = time.perf_counter()
+        ok, raw = cap.read()
+        if not ok:
+            break
+        cv2.resize(raw, tuple(analysis_size), dst=frame)
+        captured = time.perf_counter()
+        if cached is not None:
+            hits = cached.cache.hits
+            frames.append(cached.detect(frame))
+            infer = time.perf_counter() - captured
+            if cached.cache.hits > hits:
+                infer = cached.cache.last_cost  # Inference time measured when the entry was cached
+        else:
+            frames.append(detections.result_to_arrays(model(frame, imgsz=imgsz, conf=DETECT_CONF, verbose=False)[0]))
+            infer = time.perf_counter() - captured
+        costs.append((captured - start, infer))
+    cap.release()
+    if cached is not None:
+        cached.close()
+    return frames, model.names, np.array(costs, dtype=np.float64).reshape(-1, 2)
+
+
+def confirm_objects(window, grouping_distance, min_frames):
+    """
+    Quiet version of the snapshot analyzer's temporal aggregation.
+
+    Args:
+        window (list): Per-frame lists of object dicts (newest last).
+
+    Returns:
+        list: Objects seen in at least `min_frames` frames of the window,
+        represented by their newest detection.
+    """
+    groups = []  # [representative, frames seen, newest object]
+    for f_idx, objects in enumerate(window):
+        for obj in objects:
+            for group in groups:
+                rep = group[0]
+                if rep['name'] == obj['name'] and \
+                   (rep['center'][0] - obj['center'][0])**2 + (rep['center'][1] - obj['center'][1])**2 \
+                   < grouping_distance**2:
+                    group[1].add(f_idx)
+                    group[2] = obj
+                    break
+            else:
+                groups.append([obj, {f_idx}, obj])
+    return [newest for _, seen, newest in groups if len(seen) >= min_frames]
+
+
+def simulate(frames, names, costs, labels, params, config):
+    """
+    Replays stored detections with one reasoning-level parameter set.
+
+    Returns:
+        dict: tp/fp/fn counts, simulated wall seconds and frame count.
+    """
+    small_thr = params['small_object_threshold']
+    person_thr = config['person_threshold']
+    default_thr = config['default_threshold']
+    min_frames = min(config['confirmation_threshold_frames'], params['buffer_size'])
+
+    window = []
+    predicted = set()
+    tp = fp = fn = 0
+    seconds = 0.0
+    for idx, (boxes, confs, class_ids) in enumerate(frames):
+        seconds += costs[idx, 0]   # Every frame is captured, analyzed or not
+        if idx % params['skip_frames'] == 0:
+            start = time.perf_counter()
+            seconds += costs[idx, 1]
+
+            # Class-aware thresholds, as in snapshot_analyzer.get_confidence_threshold
+            thr = np.array([small_thr if names[c] in SMALL_OBJECTS else person_thr if names[c] == 'person'
+                            else default_thr for c in class_ids.tolist()], dtype=np.float32)
+            keep = confs >= thr if len(confs) else np.zeros(0, dtype=bool)
+            objects = [o for o in detections.to_objects(boxes[keep], confs[keep], class_ids[keep], names)
+                       if o['categories']]
+
+            window.append(objects)
+            if len(window) > params['buffer_size']:
+                window.pop(0)
+            confirmed = confirm_objects(window, params['grouping_distance_threshold'], min_frames)
+            predicted = {r for r, _, _ in risk_rules.find_risk_pairs(confirmed, params['near_threshold'])}
+            seconds += time.perf_counter() - start
+
+        # Predictions persist over skipped frames, as in the live runner
+        truth = labels.get(idx, set())
+        tp += len(predicted & truth)
+        fp += len(predicted - truth)
+        fn += len(truth - predicted)
+
+    return {'tp': tp, 'fp': fp, 'fn': fn, 'seconds': seconds, 'frames': len(frames)}
+
+
+def pareto_front(results):
+    """
+    Keeps the results not dominated in (fps, f1).
+    """
+    front = []
+    for r in results:
+        dominated = any(o['fps'] >= r['fps'] and o['f1'] >= r['f1'] and (o['fps'] > r['fps'] or o['f1'] > r['f1'])
+                        for o in results)
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: -r['fps'])
+
+
+def tune(model, videos, detection_grid=DETECTION_GRID, reasoning_grid=REASONING_GRID, cache_dir=None):
+    config = runtime_config.load_config(None)
+    labels = {v: load_labels(v) for v in videos}
+    keys = list(reasoning_grid)
+    results = []
+
+    for analysis_size, imgsz in itertools.product(detection_grid['analysis_size'], detection_grid['imgsz']):
+        print(f"Detecting at {analysis_size[0]}x{analysis_size[1]}, imgsz {imgsz}...")
+        detected = {v: detect_recording(model, v, analysis_size, imgsz, cache_dir) for v in videos}
+
+        for values in itertools.product(*(reasoning_grid[k] for k in keys)):
+            params = dict(zip(keys, values))
+            total = {'tp': 0, 'fp': 0, 'fn': 0, 'seconds': 0.0, 'frames': 0}
+            for v in videos:
+                frames, names, costs = detected[v]
+                run = simulate(frames, names, costs, labels[v], params, config)
+                for k in total:
+                    total[k] += run[k]
+
+            precision = total['tp'] / (total['tp'] + total['fp']) if total['tp'] + total['fp'] else 0.0
+            recall = total['tp'] / (total['tp'] + total['fn']) if total['tp'] + total['fn'] else 0.0
+            results.append(dict(params, analysis_size=analysis_size, imgsz=imgsz,
+                                fps=total['frames'] / total['seconds'] if total['seconds'] else float('inf'),
+                                ms_per_frame=1e3 * total['seconds'] / max(1, total['frames']),
+                                precision=precision, recall=recall,
+                                f1=2 * precision * recall / (precision + recall) if precision + recall else 0.0))
+    return results
+
+
+def recommend(front, min_fps):
+    """
+    Best F1 among frontier configs reaching `min_fps` (fastest one otherwise).
+    """
+    fast_enough = [r for r in front if r['fps'] >= min_fps]
+    if fast_enough:
+        return max(fast_enough, key=lambda r: r['f1'])
+    return max(front, key=lambda r: r['fps'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep ESUA parameters on labeled recordings.")
+    parser.add_argument('videos', nargs='+', help="Videos or recording directories with matching .labels.jsonl files")
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--min-fps', type=float, default=15.0, help="Wall-clock speed target (frames per second) for the recommendation")
+    parser.add_argument('--grid', help="JSON file overriding DETECTION_GRID/REASONING_GRID keys")
+    parser.add_argument('--output', default=runtime_config.CONFIG_PATH, help="Recommended config file")
+    parser.add_argument('--cache-dir', default=detection_cache.DEFAULT_CACHE_DIR,
+                        help="Detection cache ('' disables it)")
+    args = parser.parse_args()
+
+    detection_grid, reasoning_grid = dict(DETECTION_GRID), dict(REASONING_GRID)
+    if args.grid:
+        with open(args.grid) as f:
+            for key, values in json.load(f).items():
+                (detection_grid if key in detection_grid else reasoning_grid)[key] = values
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+
+    results = tune(model, args.videos, detection_grid, reasoning_grid, args.cache_dir)
+    front = pareto_front(results)
+
+    print(f"\n--- Pareto frontier ({len(front)} of {len(results)} configs) ---")
+    for r in front:
+        print(f"{r['fps']:7.1f} FPS | {r['ms_per_frame']:6.1f}ms/frame | P {r['precision']:.2f} "
+              f"R {r['recall']:.2f} F1 {r['f1']:.2f} | size {r['analysis_size']} imgsz {r['imgsz']} "
+              f"skip {r['skip_frames']} near {r['near_threshold']} group {r['grouping_distance_threshold']} "
+              f"buffer {r['buffer_size']} small_thr {r['small_object_threshold']}")
+
+    best = recommend(front, args.min_fps)
+    config = runtime_config.load_config(args.output)   # Keeps zones, thread split, etc.
+    for key in ('analysis_size', 'imgsz', 'skip_frames', 'near_threshold',
+                'grouping_distance_threshold', 'buffer_size', 'small_object_threshold'):
+        config[key] = best[key]
+    config['snapshot_near_threshold'] = best['near_threshold']
+    config['_tuner'] = {k: round(best[k], 3) for k in ('fps', 'ms_per_frame', 'precision', 'recall', 'f1')}
+    runtime_config.save_config(config, args.output)
+    print(f"\n✅ Recommended config ({best['fps']:.1f} FPS, F1 {best['f1']:.2f}) saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# Preview Server: local HTTP MJPEG stream of the annotated feed
+
+# cv2.imshow needs a desktop session. This server lets any number of browsers
+# (or VLC, curl, ...) watch the annotated frames instead:
+#
+#   GET /              minimal viewer page
+#   GET /stream        multipart/x-mixed-replace MJPEG stream
+#   GET /snapshot.jpg  newest frame
+#   GET /stats         JSON counters
+#   GET /<command>     e.g. /capture, for runners without a keyboard (headless)
+#
+# The pipeline only copies its frame into a preallocated buffer (publish()).
+# A single encoder thread turns the newest frame into JPEG bytes at most
+# MAX_FPS times per second, independently of the inference rate, and every
+# viewer is sent those same bytes. Each viewer has its own thread and always
+# jumps to the newest JPEG, so a slow client skips frames instead of stalling
+# the encoder or the pipeline.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/camera_runner.py --serve 8080 --headless
+#   then open http://127.0.0.1:8080/
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+HOST = '127.0.0.1'
+MAX_FPS = 10.0          # Encode rate cap
+JPEG_QUALITY = 80
+BOUNDARY = 'esuaframe'
+
+VIEWER_PAGE = b"""<!doctype html><html><head><title>ESUA Preview</title></head>
+<body style="margin:0;background:#111"><img src="/stream" style="max-width:100%"></body></html>"""
+
+
+class PreviewServer:
+    """
+    Encodes the newest published frame once and fans it out to all viewers.
+    """
+
+    def __init__(self, port, host=HOST, max_fps=MAX_FPS, quality=JPEG_QUALITY, commands=()):
+        """
+        Args:
+            port (int): HTTP port.
+            host (str): Bind address (local only by default).
+            max_fps (float): Encode rate cap (0 = encode every published frame).
+            quality (int): JPEG quality.
+            commands (list): Names accepted as GET /<name>; see take_command().
+        """
+        self.host = host
+        self.port = port
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.quality = quality
+
+        self._frame = None            # Preallocated copy of the newest published frame
+        self._frame_lock = threading.Lock()
+        self._published_seq = 0
+
+        self._jpeg = None             # Newest encoded frame, shared by all viewers
+        self._jpeg_seq = 0
+        self._jpeg_cond = threading.Condition()
+        self._new_frame = threading.Event()
+        self._running = True
+        self._commands = set(commands)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+        # Statistics
+        self.published = 0
+        self.encoded = 0
+        self.encode_time = 0.0
+        self.viewers = 0
+        self.sent = 0
+        self.skipped = 0              # Frames viewers never received (slow clients)
+
+        self._encoder = threading.Thread(target=self._encode_loop, name='preview-encoder', daemon=True)
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._http_thread = threading.Thread(target=self._httpd.serve_forever, name='preview-http', daemon=True)
+
+    def start(self):
+        self._encoder.start()
+        self._http_thread.start()
+        print(f"📺 Preview at http://{self.host}:{self.port}/ (max {1 / self.min_interval if self.min_interval else 0:.0f} FPS)")
+        return self
+
+    def publish(self, frame):
+        """
+        Offers the newest annotated frame (copied; never blocks on encoding or viewers).
+        """
+        with self._frame_lock:
+            if self._frame is None or self._frame.shape != frame.shape:
+                self._frame = np.empty_like(frame)
+            np.copyto(self._frame, frame)
+            self._published_seq += 1
+        self.published += 1
+        self._new_frame.set()
+
+    def _encode_loop(self):
+        encoded_seq = 0
+        buffer = None
+        next_time = 0.0
+        while self._running:
+            self._new_frame.wait(timeout=0.5)
+            self._new_frame.clear()
+
+            # Rate cap: frames published meanwhile are simply superseded
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._frame_lock:
+                if self._frame is None or self._published_seq == encoded_seq:
+                    continue
+                if buffer is None or buffer.shape != self._frame.shape:
+                    buffer = np.empty_like(self._frame)
+                np.copyto(buffer, self._frame)
+                encoded_seq = self._published_seq
+
+            start = time.perf_counter()
+            ok, jpeg = cv2.imencode('.jpg', buffer, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self.encode_time += time.perf_counter() - start
+            next_time = time.monotonic() + self.min_interval
+            if not ok:
+                continue
+
+            with self._jpeg_cond:
+                self._jpeg = jpeg.tobytes()
+                self._jpeg_seq += 1
+                self.encoded += 1
+                self._jpeg_cond.notify_all()
+
+    def take_command(self, name):
+        """
+        Returns True once per GET /<name> request received since the last call.
+        """
+        with self._pending_lock:
+            if name in self._pending:
+                self._pending.discard(name)
+                return True
+            return False
+
+    def wait_jpeg(self, after_seq, timeout=1.0):
+        """
+        Returns (seq, jpeg bytes) newer than `after_seq`, or (after_seq, None) on timeout.
+        """
+        with self._jpeg_cond:
+            self._jpeg_cond.wait_for(lambda: self._jpeg_seq > after_seq or not self._running, timeout)
+            if self._jpeg_seq > after_seq:
+                return self._jpeg_seq, self._jpeg
+            return after_seq, None
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'encoded': self.encoded,
+            'encode_ms': round(1e3 * self.encode_time / self.encoded, 2) if self.encoded else None,
+            'viewers': self.viewers,
+            'sent': self.sent,
+            'skipped': self.skipped
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass  # Keep the runner's console clean
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/':
+                    self._send(200, 'text/html', VIEWER_PAGE)
+                elif self.path == '/stats':
+                    self._send(200, 'application/json', json.dumps(server.stats()).encode())
+                elif self.path.startswith('/snapshot'):
+                    _, jpeg = server.wait_jpeg(0, timeout=2.0)
+                    if jpeg is None:
+                        self._send(503, 'text/plain', b'no frame yet')
+                    else:
+                        self._send(200, 'image/jpeg', jpeg)
+                elif self.path == '/stream':
+                    self._stream()
+                elif self.path[1:] in server._commands:
+                    with server._pending_lock:
+                        server._pending.add(self.path[1:])
+                    self._send(202, 'text/plain', b'ok')
+                else:
+                    self._send(404, 'text/plain', b'not found')
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                server.viewers += 1
+                seq = 0
+                try:
+                    while server._running:
+                        new_seq, jpeg = server.wait_jpeg(seq)
+                        if jpeg is None:
+                            continue
+                        if seq:
+                            server.skipped += new_seq - seq - 1
+                        seq = new_seq
+                        self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+                        server.sent += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    server.viewers -= 1
+
+        return Handler
+
+    def close(self):
+        self._running = False
+        self._new_frame.set()
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._encoder.join()
+
+    def report(self):
+        s = self.stats()
+        return (f"Preview: {s['encoded']}/{s['published']} frames encoded "
+                f"({s['encode_ms']}ms each), {s['sent']} sent, {s['skipped']} skipped by slow viewers")
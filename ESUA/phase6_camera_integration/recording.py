@@ -0,0 +1,392 @@
+# Recording & Replay: what the camera saw and what the detector said
+
+# A recording is a directory of append-only files:
+#   meta.json           encoding, frame size, model class names
+#   frames_00000.bin    frame payloads (raw BGR or JPEG), new chunk every CHUNK_BYTES
+#   frames.idx          one FRAME_DTYPE record per frame (timestamp, chunk, offset, ...)
+#   dets.idx            one DET_INDEX_DTYPE record per analyzed frame
+#   dets.bin            DET_DTYPE rows (box, conf, class id) referenced by dets.idx
+#
+# The .idx/.bin files are flat NumPy record arrays, so readers np.memmap them
+# and find a frame or its detections without parsing anything. Writing happens
+# on a background thread (JPEG encoding and disk I/O stay off the live loop);
+# the queue is bounded and blocks rather than drops, so a replay reproduces
+# exactly what was captured.
+#
+# ReplayCapture stands in for cv2.VideoCapture (read/isOpened/get/set/release),
+# either at the recorded pace or as fast as possible, and exposes the recorded
+# timestamps and detections.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/recording.py record --source 0 --out recordings/desk --seconds 60
+#   python ESUA/phase6_camera_integration/recording.py info recordings/desk
+#   python ESUA/phase6_camera_integration/recording.py play recordings/desk --fast
+#   python ESUA/phase6_camera_integration/camera_runner.py --source recordings/desk
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+CHUNK_BYTES = 256 * 1024 * 1024   # Start a new frames_*.bin after this many bytes
+JPEG_QUALITY = 90
+MAX_QUEUE = 64                    # Frames waiting for the writer thread
+
+FRAME_DTYPE = np.dtype([('ts', '<f8'), ('chunk', '<i4'), ('offset', '<i8'), ('length', '<i4'),
+                        ('height', '<i4'), ('width', '<i4')])
+DET_INDEX_DTYPE = np.dtype([('frame', '<i8'), ('start', '<i8'), ('count', '<i4')])
+DET_DTYPE = np.dtype([('box', '<f4', (4,)), ('conf', '<f4'), ('cls', '<i4')])
+
+
+def is_recording(path):
+    return isinstance(path, str) and os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def open_source(source):
+    """
+    Opens a camera index, a video file or a recording directory.
+
+    Args:
+        source: int / digit string (camera), recording directory or video path.
+
+    Returns:
+        cv2.VideoCapture or ReplayCapture.
+    """
+    if is_recording(source):
+        return ReplayCapture(source)
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+def source_time(cap):
+    """
+    Timestamp for the frame just read: the recorded one when replaying, else now.
+    """
+    if isinstance(cap, ReplayCapture):
+        return cap.timestamp
+    return time.time()
+
+
+def _load_records(path, dtype):
+    """
+    Memory-maps a flat record file (empty array if missing or empty).
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(os.path.getsize(path) // dtype.itemsize,))
+
+
+class Recorder:
+    """
+    Appends frames and detections to a recording directory.
+    """
+
+    def __init__(self, path, encoding='jpeg', names=None, jpeg_quality=JPEG_QUALITY, fps=None):
+        """
+        Args:
+            path (str): Recording directory (created; must not already hold a recording).
+            encoding (str): 'jpeg' (compact) or 'raw' (bit-exact, ~0.9 MB per 640x480 frame).
+            names (dict): Model class id -> name, stored for replay consumers.
+            fps (float): Nominal source frame rate, informational.
+        """
+        if encoding not in ('jpeg', 'raw'):
+            raise ValueError(f"Unknown encoding: {encoding}")
+        if is_recording(path):
+            raise ValueError(f"{path} already contains a recording")
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.encoding = encoding
+        self.jpeg_quality = jpeg_quality
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'encoding': encoding, 'fps': fps, 'created': time.time(),
+                       'names': {str(k): v for k, v in (names or {}).items()}}, f, indent=2)
+
+        self.frames = 0          # Sequence number of the next frame
+        self.bytes_written = 0
+        self._queue = queue.Queue(maxsize=MAX_QUEUE)
+        self._thread = threading.Thread(target=self._writer, name='recorder', daemon=True)
+        self._thread.start()
+
+    def write_frame(self, frame, ts=None):
+        """
+        Queues a copy of `frame`.
+
+        Returns:
+            int: The frame's sequence number in the recording.
+        """
+        seq = self.frames
+        self.frames += 1
+        self._queue.put(('frame', seq, time.time() if ts is None else ts, frame.copy()))
+        return seq
+
+    def write_detections(self, seq, boxes, confs, class_ids):
+        """
+        Queues the detector output for recorded frame `seq` (may be empty).
+        """
+        self._queue.put(('dets', seq, boxes.copy(), confs.copy(), class_ids.copy()))
+
+    def _writer(self):
+        frame_index = open(os.path.join(self.path, 'frames.idx'), 'ab')
+        det_index = open(os.path.join(self.path, 'dets.idx'), 'ab')
+        det_rows = open(os.path.join(self.path, 'dets.bin'), 'ab')
+        chunk, chunk_file, chunk_offset = -1, None, CHUNK_BYTES
+        det_start = 0
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            if item[0] == 'frame':
+                _, seq, ts, frame = item
+                if self.encoding == 'jpeg':
+                    _, payload = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    payload = payload.tobytes()
+                else:
+                    payload = np.ascontiguousarray(frame).tobytes()
+
+                if chunk_offset + len(payload) > CHUNK_BYTES and chunk_offset > 0:
+                    if chunk_file is not None:
+                        chunk_file.close()
+                    chunk += 1
+                    chunk_file = open(os.path.join(self.path, f'frames_{chunk:05d}.bin'), 'ab')
+                    chunk_offset = 0
+
+                chunk_file.write(payload)
+                record = np.array([(ts, chunk, chunk_offset, len(payload), frame.shape[0], frame.shape[1])],
+                                  dtype=FRAME_DTYPE)
+                frame_index.write(record.tobytes())
+                chunk_offset += len(payload)
+                self.bytes_written += len(payload)
+            else:
+                _, seq, boxes, confs, class_ids = item
+                rows = np.zeros(len(boxes), dtype=DET_DTYPE)
+                rows['box'] = boxes.reshape(-1, 4)
+                rows['conf'] = confs
+                rows['cls'] = class_ids
+                det_rows.write(rows.tobytes())
+                det_index.write(np.array([(seq, det_start, len(rows))], dtype=DET_INDEX_DTYPE).tobytes())
+                det_start += len(rows)
+
+        for f in (frame_index, det_index, det_rows, chunk_file):
+            if f is not None:
+                f.close()
+
+    def close(self):
+        """
+        Writes everything still queued and stops the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def report(self):
+        return f"Recording: {self.frames} frames, {self.bytes_written / 1e6:.1f} MB ({self.encoding}) in {self.path}"
+
+
+class ReplayCapture:
+    """
+    cv2.VideoCapture-compatible reader for a recording directory.
+    """
+
+    def __init__(self, path, realtime=False, speed=1.0):
+        """
+        Args:
+            path (str): Recording directory.
+            realtime (bool): Pace reads by the recorded timestamps; False = as fast as possible.
+            speed (float): Playback speed factor in realtime mode.
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.encoding = meta['encoding']
+        self.fps_hint = meta.get('fps')
+        self.names = {int(k): v for k, v in meta.get('names', {}).items()}
+        self.realtime = realtime
+        self.speed = speed
+
+        self.index = _load_records(os.path.join(path, 'frames.idx'), FRAME_DTYPE)
+        self.det_index = _load_records(os.path.join(path, 'dets.idx'), DET_INDEX_DTYPE)
+        self.det_rows = _load_records(os.path.join(path, 'dets.bin'), DET_DTYPE)
+        self._chunks = {}
+        self.pos = 0              # Next frame to read
+        self.timestamp = None     # Recorded timestamp of the frame last read
+        self._clock_start = None  # (wall clock, recorded ts) when realtime playback started
+        self._opened = True
+
+    def _chunk(self, chunk):
+        if chunk not in self._chunks:
+            self._chunks[chunk] = np.memmap(os.path.join(self.path, f'frames_{chunk:05d}.bin'),
+                                            dtype=np.uint8, mode='r')
+        return self._chunks[chunk]
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self, image=None):
+        """
+        Returns (ok, frame) like cv2.VideoCapture.read. A raw frame is copied
+        into `image` when its shape matches (no allocation).
+        """
+        if not self._opened or self.pos >= len(self.index):
+            return False, None
+        rec = self.index[self.pos]
+        self.pos += 1
+
+        if self.realtime:
+            if self._clock_start is None:
+                self._clock_start = (time.perf_counter(), float(rec['ts']))
+            due = self._clock_start[0] + (float(rec['ts']) - self._clock_start[1]) / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        data = self._chunk(int(rec['chunk']))[int(rec['offset']):int(rec['offset']) + int(rec['length'])]
+        if self.encoding == 'raw':
+            frame = data.reshape(int(rec['height']), int(rec['width']), 3)
+            if image is not None and image.shape == frame.shape:
+                np.copyto(image, frame)
+                frame = image
+            else:
+                frame = np.array(frame)
+        else:
+            frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        self.timestamp = float(rec['ts'])
+        return True, frame
+
+    def detections(self, seq):
+        """
+        Returns the recorded (boxes, confs, class_ids) for frame `seq`, or
+        None if the detector did not run on that frame.
+        """
+        i = np.searchsorted(self.det_index['frame'], seq)
+        if i >= len(self.det_index) or self.det_index['frame'][i] != seq:
+            return None
+        start, count = int(self.det_index['start'][i]), int(self.det_index['count'][i])
+        rows = self.det_rows[start:start + count]
+        return (np.array(rows['box'], dtype=np.float32), np.array(rows['conf'], dtype=np.float32),
+                np.array(rows['cls'], dtype=np.int32))
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.index))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.pos)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.index['width'][0]) if len(self.index) else 0.0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.index['height'][0]) if len(self.index) else 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            if len(self.index) > 1:
+                return (len(self.index) - 1) / max(1e-6, float(self.index['ts'][-1] - self.index['ts'][0]))
+            return float(self.fps_hint or 0.0)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.pos = int(max(0, min(value, len(self.index))))
+            self._clock_start = None
+            return True
+        return False
+
+    def release(self):
+        self._opened = False
+        self._chunks.clear()
+
+
+def add_source_arguments(parser, record=True):
+    """
+    Adds the shared --source / --realtime (and --record) options to a runner's CLI.
+    """
+    parser.add_argument('--source', default='0', help="Camera index, video file or recording directory")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Replay recordings at the recorded pace (default: as fast as possible)")
+    if record:
+        parser.add_argument('--record', metavar='DIR', help="Record frames and detections to this directory")
+        parser.add_argument('--record-encoding', choices=['jpeg', 'raw'], default='jpeg')
+
+
+def open_runner_source(args):
+    """
+    Opens the source selected by add_source_arguments options.
+    """
+    cap = open_source(args.source)
+    if isinstance(cap, ReplayCapture):
+        cap.realtime = args.realtime
+        print(f"Replaying {args.source} ({len(cap.index)} frames, "
+              f"{'realtime' if args.realtime else 'as fast as possible'})")
+    return cap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and inspect ESUA recordings.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help="Record a camera or video without running the pipeline")
+    rec.add_argument('--source', default='0')
+    rec.add_argument('--out', required=True)
+    rec.add_argument('--seconds', type=float, default=30.0)
+    rec.add_argument('--encoding', choices=['jpeg', 'raw'], default='jpeg')
+    rec.add_argument('--size', default='640x480', help="Frames are resized to WxH (as the runners do)")
+
+    info = sub.add_parser('info', help="Summarize a recording")
+    info.add_argument('path')
+
+    play = sub.add_parser('play', help="Play a recording (or measure read speed with --fast)")
+    play.add_argument('path')
+    play.add_argument('--fast', action='store_true')
+    play.add_argument('--speed', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        import frame_pool
+        width, height = (int(v) for v in args.size.split('x'))
+        cap = open_source(args.source)
+        pool = frame_pool.FramePool(4, (width, height))
+        recorder = Recorder(args.out, args.encoding, fps=cap.get(cv2.CAP_PROP_FPS) or None)
+        end = time.time() + args.seconds
+        while time.time() < end:
+            ok, _, frame = pool.read(cap)
+            if not ok:
+                break
+            recorder.write_frame(frame)
+        cap.release()
+        recorder.close()
+        print(recorder.report())
+
+    elif args.command == 'info':
+        cap = ReplayCapture(args.path)
+        n = len(cap.index)
+        size = sum(os.path.getsize(os.path.join(args.path, f)) for f in os.listdir(args.path))
+        duration = float(cap.index['ts'][-1] - cap.index['ts'][0]) if n > 1 else 0.0
+        print(f"{args.path}: {n} frames ({cap.encoding}), {duration:.1f}s at {cap.get(cv2.CAP_PROP_FPS):.1f} FPS, "
+              f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}, "
+              f"{len(cap.det_index)} analyzed frames / {len(cap.det_rows)} detections, {size / 1e6:.1f} MB")
+
+    else:
+        cap = ReplayCapture(args.path, realtime=not args.fast, speed=args.speed)
+        start = time.perf_counter()
+        frames = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames += 1
+            if not args.fast:
+                cv2.imshow('ESUA Replay', frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        elapsed = time.perf_counter() - start
+        if not args.fast:
+            cv2.destroyAllWindows()
+        print(f"Played {frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-6):.1f} FPS)")
+
+
+if __name__ == "__main__":
+    main()
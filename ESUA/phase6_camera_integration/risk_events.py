@@ -0,0 +1,178 @@
+# Risk Event Stream: onset / ongoing / resolved events with hysteresis
+
+# The live loop rebuilds its list of risks on every inference frame, so the same
+# warning flickers on and off and anything downstream would receive it again on
+# every frame. The tracker below turns per-frame risk pairs into a small,
+# deduplicated event stream:
+#
+#   onset    - a risk has been seen in ENTER_HITS consecutive inference frames
+#              and has lasted at least MIN_DURATION seconds
+#   ongoing  - heartbeat for an active risk, at most every ONGOING_INTERVAL seconds
+#   resolved - an active risk has been missing for EXIT_MISSES consecutive frames
+#   confirmed / retracted - a later check (burst_confirm.py) verified or
+#              rejected an active risk; retracted risks are dropped at once
+#
+# Consumers (overlay, logger, storage, ...) only need to react to these events.
+
+import time
+import risk_rules
+
+# --- CONFIGURATION ---
+ENTER_HITS = 2            # Consecutive inference frames before a risk becomes active
+EXIT_MISSES = 3           # Consecutive misses before an active risk is resolved
+MIN_DURATION = 0.5        # Seconds a risk must persist before its onset is reported
+ONGOING_INTERVAL = 30.0   # Seconds between 'ongoing' heartbeats (0 disables them)
+
+
+class _RiskState:
+    __slots__ = ('key', 'pair', 'first_seen', 'last_seen', 'hits', 'misses',
+                 'active', 'onset_time', 'last_emit', 'text', 'confirmed')
+
+    def __init__(self, key, pair, now):
+        self.key = key
+        self.pair = pair
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 0
+        self.misses = 0
+        self.active = False
+        self.onset_time = None
+        self.last_emit = None
+        self.text = None
+        self.confirmed = False
+
+
+class RiskEventTracker:
+    """
+    Converts per-frame (risk_type, obj_a, obj_b) lists into risk events.
+
+    An optional `describe` callback turns a pair into display text once, at
+    onset, instead of regenerating the explanation on every frame.
+    """
+
+    def __init__(self, enter_hits=ENTER_HITS, exit_misses=EXIT_MISSES,
+                 min_duration=MIN_DURATION, ongoing_interval=ONGOING_INTERVAL, describe=None):
+        self.enter_hits = enter_hits
+        self.exit_misses = exit_misses
+        self.min_duration = min_duration
+        self.ongoing_interval = ongoing_interval
+        self.describe = describe
+        self._states = {}
+
+        # Statistics
+        self.frames = 0
+        self.raw_items = 0      # What a per-frame consumer would have received
+        self.events_out = 0
+
+    def _event(self, kind, state, now):
+        risk_type, obj_a, obj_b = state.pair
+        self.events_out += 1
+        state.last_emit = now
+        return {
+            'event': kind,
+            'risk_type': risk_type,
+            'obj_a': obj_a['name'],
+            'obj_b': obj_b['name'],
+            'box_a': obj_a.get('box'),
+            'box_b': obj_b.get('box'),
+            'start': state.onset_time,
+            'time': now,
+            'duration': now - state.onset_time,
+            'text': state.text
+        }
+
+    def update(self, risk_pairs, now=None):
+        """
+        Feeds the risk pairs of one inference frame.
+
+        Args:
+            risk_pairs (list): (risk_type, obj_a, obj_b) tuples for this frame.
+            now (float): Timestamp in seconds (defaults to time.time()).
+
+        Returns:
+            list: Event dicts ('onset', 'ongoing' or 'resolved') produced by this frame.
+        """
+        now = time.time() if now is None else now
+        self.frames += 1
+        self.raw_items += len(risk_pairs)
+        events = []
+
+        seen = set()
+        for pair in risk_pairs:
+            key = risk_rules.risk_key(*pair)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _RiskState(key, pair, now)
+            state.pair = pair
+            state.last_seen = now
+            state.hits += 1
+            state.misses = 0
+
+            if not state.active:
+                if state.hits >= self.enter_hits and now - state.first_seen >= self.min_duration:
+                    state.active = True
+                    state.onset_time = state.first_seen
+                    if self.describe is not None:
+                        state.text = self.describe(*pair)
+                    events.append(self._event('onset', state, now))
+            elif self.ongoing_interval and now - state.last_emit >= self.ongoing_interval:
+                events.append(self._event('ongoing', state, now))
+
+        for key in list(self._states):
+            if key in seen:
+                continue
+            state = self._states[key]
+            if not state.active:
+                # Candidates must be seen in consecutive frames: forget it quietly
+                del self._states[key]
+                continue
+            state.misses += 1
+            if state.misses >= self.exit_misses:
+                events.append(self._event('resolved', state, state.last_seen))
+                del self._states[key]
+
+        return events
+
+    def confirm(self, key, now=None):
+        """
+        Marks the active risk `key` as verified.
+
+        Returns:
+            dict: A 'confirmed' event, or None if the risk is no longer active.
+        """
+        now = time.time() if now is None else now
+        state = self._states.get(key)
+        if state is None or not state.active or state.confirmed:
+            return None
+        state.confirmed = True
+        if state.text is not None:
+            state.text += " [confirmed]"
+        return self._event('confirmed', state, now)
+
+    def retract(self, key, now=None):
+        """
+        Drops the risk `key` (a false alarm) without waiting for EXIT_MISSES.
+
+        Returns:
+            dict: A 'retracted' event, or None if the risk was not active.
+        """
+        now = time.time() if now is None else now
+        state = self._states.pop(key, None)
+        if state is None or not state.active:
+            return None
+        return self._event('retracted', state, now)
+
+    def active(self):
+        """
+        Returns the currently active risks as (risk_type, obj_a, obj_b, text) tuples.
+        """
+        return [state.pair + (state.text,) for state in self._states.values() if state.active]
+
+    def report(self):
+        reduction = self.raw_items / self.events_out if self.events_out else float(self.raw_items)
+        return (f"Risk events: {self.events_out} events from {self.raw_items} per-frame risk items "
+                f"over {self.frames} frames ({reduction:.0f}x less output)")
@@ -0,0 +1,277 @@
+# Risk Heatmap: where do risks keep recurring?
+
+# Warnings come and go per frame; facility staff want to know which spots of
+# a desk or shelf are risky over hours. Each camera keeps a small accumulator
+# grid (one cell per CELL_SIZE x CELL_SIZE pixels). Every analyzed frame adds
+# the seconds since the previous update to the cell under each risk pair's
+# midpoint, and older contributions fade with a half-life of HALF_LIFE.
+#
+# The decay is not applied to the whole grid on every update. The grid stores
+# values divided by a running scale factor: decaying multiplies one float, a
+# deposit adds weight / scale to one cell per pair (np.add.at for many pairs),
+# and the scale is folded back into the grid only once it gets tiny (every
+# ~20 half-lives).
+# An update therefore costs a few microseconds however long the runner is up,
+# and the grid never grows.
+#
+# Exports (npz + PNG overlay) must not stall the live loop either: the loop
+# only copies the grid and the frame, and a single background worker renders
+# and writes them. While an export is still being written, the next one due is
+# skipped rather than queued.
+#
+# Usage:
+#   heatmap = RiskHeatmap((640, 480), camera=0)
+#   heatmap.update(risk_pairs, now)
+#   heatmap.render(display)            # Overlay in place
+#   heatmap.maybe_export(now, frame)   # heatmaps/camera_0.npz + .png every EXPORT_INTERVAL
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+CELL_SIZE = 16                # Pixels per grid cell
+HALF_LIFE = 600.0             # Seconds until a contribution counts half
+EXPORT_INTERVAL = 60.0        # Seconds between snapshot exports
+EXPORT_DIR = 'ESUA/phase6_camera_integration/heatmaps'
+OVERLAY_ALPHA = 0.45
+OVERLAY_MIN = 0.05            # Cells below this fraction of the peak are not drawn
+MIN_SCALE = 1e-6              # Fold the decay scale into the grid below this
+VECTOR_MIN_PAIRS = 16         # Use np.add.at from this many pairs per update
+
+
+def blend(grid, image, alpha=OVERLAY_ALPHA, heat=None, color=None, out=None):
+    """
+    Blends `grid` (relative to its peak) onto `image` in place.
+
+    Args:
+        grid (np.ndarray): Cell values (any scale).
+        image (np.ndarray): BGR frame to draw on.
+        alpha (float): Overlay opacity.
+        heat, color, out: Optional preallocated (h, w), (h, w, 3), (h, w, 3) uint8 buffers.
+
+    Returns:
+        np.ndarray: `image`.
+    """
+    peak = grid.max()
+    if peak <= 0:
+        return image
+    h, w = image.shape[:2]
+    small = cv2.convertScaleAbs(grid, alpha=255.0 / peak)
+    heat = cv2.resize(small, (w, h), dst=heat, interpolation=cv2.INTER_LINEAR)
+    color = cv2.applyColorMap(heat, cv2.COLORMAP_JET, dst=color)
+    out = cv2.addWeighted(image, 1.0 - alpha, color, alpha, 0.0, dst=out)
+    mask = heat >= int(255 * OVERLAY_MIN)
+    np.copyto(image, out, where=mask[..., None])
+    return image
+
+
+class RiskHeatmap:
+    """
+    Exponentially decayed risk-seconds per grid cell for one camera.
+    """
+
+    def __init__(self, frame_size, camera=0, cell_size=CELL_SIZE, half_life=HALF_LIFE,
+                 export_dir=EXPORT_DIR, export_interval=EXPORT_INTERVAL):
+        """
+        Args:
+            frame_size (tuple): (width, height) of the analyzed frames.
+            camera (int): Camera id, used in export file names.
+            cell_size (int): Pixels per grid cell.
+            half_life (float): Decay half-life in seconds.
+            export_dir (str): Directory for snapshot exports (None disables them).
+            export_interval (float): Seconds between exports.
+        """
+        self.frame_size = tuple(frame_size)
+        self.camera = camera
+        self.cell_size = cell_size
+        self.half_life = half_life
+        self.export_dir = export_dir
+        self.export_interval = export_interval
+
+        w, h = self.frame_size
+        self.shape = (-(-h // cell_size), -(-w // cell_size))
+        self._grid = np.zeros(self.shape, dtype=np.float64)  # True value = grid * scale
+        self._scale = 1.0
+        self._last_update = None
+        self._last_export = None
+        self._executor = None      # Export worker, started on the first export
+        self._pending = None       # Future of the export being written
+
+        # Render buffers at frame resolution
+        self._heat = np.empty((h, w), dtype=np.uint8)
+        self._color = np.empty((h, w, 3), dtype=np.uint8)
+        self._blend = np.empty((h, w, 3), dtype=np.uint8)
+
+        # Statistics
+        self.updates = 0
+        self.deposits = 0
+        self.update_time = 0.0
+        self.exports = 0
+        self.export_skips = 0      # Exports due while the previous one was still being written
+        self.export_time = 0.0     # Seconds the worker spent writing
+        self.export_stall = 0.0    # Seconds the caller spent snapshotting for exports
+        self.export_errors = 0
+
+    def update(self, risk_pairs, now):
+        """
+        Decays the grid to `now` and adds the current risk pairs.
+
+        Args:
+            risk_pairs (list): (risk_type, obj_a, obj_b) tuples from risk_rules.find_risk_pairs.
+            now (float): Timestamp in seconds.
+        """
+        start = time.perf_counter()
+        dt = 0.0 if self._last_update is None else max(0.0, now - self._last_update)
+        self._last_update = now
+
+        self._scale *= 0.5 ** (dt / self.half_life)
+        if self._scale < MIN_SCALE:
+            self._grid *= self._scale
+            self._scale = 1.0
+
+        if risk_pairs and dt > 0:
+            weight = dt / self._scale
+            half_cell = 0.5 / self.cell_size
+            rows, cols = self.shape
+            # Zone risks (scene_zones) are located at the object, not between it and the zone
+            cells = [min(int((a['center'][1] + (a if 'zone' in b else b)['center'][1]) * half_cell), rows - 1) * cols +
+                     min(int((a['center'][0] + (a if 'zone' in b else b)['center'][0]) * half_cell), cols - 1)
+                     for _, a, b in risk_pairs]
+            flat = self._grid.reshape(-1)
+            if len(cells) < VECTOR_MIN_PAIRS:
+                # A handful of scalar adds beats NumPy's per-call overhead
+                for cell in cells:
+                    flat[cell] += weight
+            else:
+                np.add.at(flat, np.array(cells, dtype=np.intp), weight)
+            self.deposits += len(cells)
+
+        self.updates += 1
+        self.update_time += time.perf_counter() - start
+
+    def values(self):
+        """
+        Returns the decayed risk-seconds per cell as of the last update (a copy).
+        """
+        return self._grid * self._scale
+
+    def hottest(self):
+        """
+        Returns ((x, y) pixel centre of the hottest cell, risk-seconds), or None if empty.
+        """
+        index = int(np.argmax(self._grid))
+        peak = self._grid.flat[index] * self._scale
+        if peak <= 0:
+            return None
+        row, col = divmod(index, self.shape[1])
+        return ((col + 0.5) * self.cell_size, (row + 0.5) * self.cell_size), peak
+
+    def render(self, image, alpha=OVERLAY_ALPHA):
+        """
+        Blends the heatmap (relative to its peak) onto `image` in place.
+        """
+        return blend(self._grid, image, alpha, self._heat, self._color, self._blend)
+
+    def _write(self, base, values, image, now):
+        """
+        Worker: writes the npz and the PNG overlay, each via a temp file and a rename.
+        """
+        start = time.perf_counter()
+        os.makedirs(self.export_dir, exist_ok=True)
+        tmp = base + '.tmp.npz'
+        np.savez(tmp, values=values, cell_size=self.cell_size, half_life=self.half_life,
+                 frame_size=np.array(self.frame_size), camera=self.camera, ts=now)
+        os.replace(tmp, base + '.npz')
+
+        blend(values, image, 0.6)
+        tmp = base + '.tmp.png'
+        cv2.imwrite(tmp, image)
+        os.replace(tmp, base + '.png')
+        return time.perf_counter() - start
+
+    def _collect(self):
+        """
+        Accounts for a finished export; returns False while one is still being written.
+        """
+        if self._pending is None:
+            return True
+        if not self._pending.done():
+            return False
+        try:
+            self.export_time += self._pending.result()
+            self.exports += 1
+        except (OSError, ValueError, cv2.error) as e:
+            self.export_errors += 1
+            print(f"Warning: Heatmap export failed: {e}")
+        self._pending = None
+        return True
+
+    def export(self, now, frame=None, block=False):
+        """
+        Starts writing camera_<id>.npz (values + metadata) and camera_<id>.png
+        (overlay on `frame`) on the export worker; only the copies are made here.
+
+        Args:
+            now (float): Timestamp stored with the export.
+            frame (np.ndarray): Frame to draw the overlay on (black if None).
+            block (bool): Wait for a running export instead of skipping (e.g. the final export).
+
+        Returns:
+            str: Path of the .npz file, or None if the previous export is still being written.
+        """
+        if block and self._pending is not None:
+            self._pending.exception()   # Waits; errors are reported by _collect()
+        if not self._collect():
+            self.export_skips += 1
+            return None
+        start = time.perf_counter()
+        w, h = self.frame_size
+        image = np.zeros((h, w, 3), dtype=np.uint8) if frame is None else frame.copy()
+        base = os.path.join(self.export_dir, f"camera_{self.camera}")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='heatmap-export')
+        self._pending = self._executor.submit(self._write, base, self.values(), image, now)
+        self._last_export = now
+        self.export_stall += time.perf_counter() - start
+        return base + '.npz'
+
+    def maybe_export(self, now, frame=None):
+        """
+        Exports if EXPORT_INTERVAL has passed since the last export.
+        """
+        if self.export_dir is None:
+            return None
+        if self._last_export is None:
+            self._last_export = now
+            return None
+        if now - self._last_export >= self.export_interval:
+            return self.export(now, frame)
+        return None
+
+    def close(self):
+        """
+        Waits for the export being written (call before reading the files or exiting).
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._collect()
+
+    def report(self):
+        rows, cols = self.shape
+        avg_us = 1e6 * self.update_time / self.updates if self.updates else 0.0
+        line = (f"Risk heatmap: {cols}x{rows} cells ({self._grid.nbytes / 1024:.1f} KB), {self.updates} updates "
+                f"({avg_us:.1f}us each), {self.deposits} risk deposits, {self.exports} exports")
+        if self.exports:
+            line += (f" ({1e3 * self.export_stall / self.exports:.2f}ms in the loop, "
+                     f"{1e3 * self.export_time / self.exports:.1f}ms written in the background)")
+        if self.export_skips or self.export_errors:
+            line += f", {self.export_skips} skipped while busy, {self.export_errors} failed"
+        hot = self.hottest()
+        if hot is not None:
+            (x, y), value = hot
+            line += f", hottest spot ({x:.0f}, {y:.0f}) px with {value:.1f} risk-seconds"
+        return line
@@ -1,5 +1,8 @@
 # Simple Rule Engine for Risk Detection
 
+import math
+import numpy as np
+
 def check_risks(obj_a, obj_b, distance, relation_type):
     """
     Checks for risks between two objects based on their categories and proximity.
@@ -45,3 +48,108 @@ def check_risks(obj_a, obj_b, distance, relation_type):
              risks.append(f"Damage Risk detected: {obj_a['name']} (liquid) is near {obj_b['name']}")
              
     return risks
+
+
+# --- Pair-level helpers used by the live pipeline ---
+
+# Categories that can take part in a risk pair (used e.g. to decide which
+# low-confidence detections are worth a second look)
+RISK_CATEGORIES = ('liquid', 'electronics', 'flammable')
+
+# From this many objects on, near pairs come from one NumPy pass instead of
+# a Python loop (below it the array set-up costs more than the loop saves)
+VECTOR_MIN_OBJECTS = 24
+
+
+def get_risk_type(cats_a, cats_b):
+    """
+    Returns the template key for the risk between two nearby objects.
+
+    Args:
+        cats_a (list): Categories of object A.
+        cats_b (list): Categories of object B.
+
+    Returns:
+        str or None: 'spill_risk', 'damage_risk' or None if no rule matches.
+    """
+    if ('liquid' in cats_a and 'electronics' in cats_b) or \
+       ('liquid' in cats_b and 'electronics' in cats_a):
+        return 'spill_risk'
+    elif ('liquid' in cats_a and 'flammable' in cats_b) or \
+         ('liquid' in cats_b and 'flammable' in cats_a):
+        return 'damage_risk'
+    return None
+
+
+def risk_key(risk_type, obj_a, obj_b):
+    """
+    Identity of a risk across frames (there is no tracker, so class names only).
+    """
+    return (risk_type, obj_a['name'], obj_b['name'])
+
+
+def near_pairs(objects, near_threshold):
+    """
+    Index pairs (i, j), i < j, of objects whose box centres are closer than
+    `near_threshold`. Small scenes use a plain loop; from VECTOR_MIN_OBJECTS
+    objects on, one NumPy pass over the upper triangle is cheaper.
+    """
+    n = len(objects)
+    if n < VECTOR_MIN_OBJECTS:
+        centers = [((o['box'][0] + o['box'][2]) / 2, (o['box'][1] + o['box'][3]) / 2) for o in objects]
+        pairs = []
+        for i in range(n):
+            ax, ay = centers[i]
+            for j in range(i + 1, n):
+                bx, by = centers[j]
+                if math.hypot(ax - bx, ay - by) < near_threshold:
+                    pairs.append((i, j))
+        return pairs
+
+    b = np.array([obj['box'] for obj in objects], dtype=np.float32)
+    cx = (b[:, 0] + b[:, 2]) / 2
+    cy = (b[:, 1] + b[:, 3]) / 2
+    first, second = np.triu_indices(n, 1)
+    near = np.hypot(cx[first] - cx[second], cy[first] - cy[second]) < near_threshold
+    return list(zip(first[near].tolist(), second[near].tolist()))
+
+
+def find_risk_pairs(objects, near_threshold, risk_of=None, out=None):
+    """
+    Checks every pair of objects and returns the risky ones.
+
+    Args:
+        objects (list): Object dicts with 'name', 'box' and 'categories'.
+        near_threshold (float): Centre distance (pixels) below which objects are "near".
+        risk_of (callable): Optional (obj_a, obj_b) -> (risk_type, swap) or None
+            lookup replacing get_risk_type (e.g. rule_config.RuleTables.risk_of).
+        out (list): Optional list to clear and fill instead of a new one
+            (reused per frame by the live loop).
+
+    Returns:
+        list: (risk_type, obj_a, obj_b) tuples. obj_a is the liquid, so the
+        tuple can be passed straight to the explanation templates.
+    """
+    pairs = [] if out is None else out
+    pairs.clear()
+    if len(objects) < 2:
+        return pairs
+
+    for i, j in near_pairs(objects, near_threshold):
+        obj_a = objects[i]
+        obj_b = objects[j]
+
+        if risk_of is not None:
+            hit = risk_of(obj_a, obj_b)
+            if hit:
+                pairs.append((hit[0], obj_b, obj_a) if hit[1] else (hit[0], obj_a, obj_b))
+            continue
+
+        risk_type = get_risk_type(obj_a['categories'], obj_b['categories'])
+        if risk_type:
+            # Context swap for template
+            if 'liquid' in obj_b['categories']:
+                obj_a, obj_b = obj_b, obj_a
+            pairs.append((risk_type, obj_a, obj_b))
+
+    return pairs
@@ -0,0 +1,361 @@
+# Rule Configuration: categories, risk rules and templates, hot-reloaded
+
+# object_categories.CATEGORIES, the conditions in risk_rules.get_risk_type and
+# explanation_templates.TEMPLATES are Python literals, so changing a rule used
+# to mean restarting the runner (model reload, camera reopen). They can now be
+# overridden by a JSON file; every section is optional and falls back to the
+# built-in literals:
+#
+#   {
+#     "categories":   {"liquid": ["cup", "bottle"], "electronics": ["laptop"], ...},
+#     "display_only": ["person"],
+#     "rules":        [{"risk_type": "spill_risk", "a": "liquid", "b": "electronics"}, ...],
+#     "templates":    {"spill_risk": ["A {obj_a} is placed close to a {obj_b}.", ...], ...}
+#   }
+#
+# Rules are checked in order; the first whose categories match a near pair
+# wins, and the object with category "a" becomes obj_a of the risk.
+#
+# compile_rules() validates a spec and builds immutable lookup tables (class
+# name -> categories, (class a, class b) -> risk type and orientation).
+# RuleWatcher polls the file on a background thread, compiles edits off the
+# hot path and publishes them by assigning one attribute (`watcher.tables`);
+# the live loop reads that reference once per analyzed frame, so an edit
+# takes effect on the next frame without a restart or a dropped frame. Invalid
+# files are rejected and the previous tables stay in use.
+#
+# Usage:
+#   rules = RuleWatcher().start()
+#   tables = rules.tables            # Once per frame
+#   objects = detections.to_objects(boxes, confs, class_ids, names, categories=tables.categories)
+#   pairs = tables.find_risk_pairs(objects, near_threshold)
+#   python ESUA/phase6_camera_integration/rule_config.py export    # Built-in rules -> esua_rules.json
+#   python ESUA/phase6_camera_integration/rule_config.py check
+
+import argparse
+import json
+import os
+import string
+import threading
+import time
+import explanation_templates
+import object_categories
+import risk_rules
+
+# --- CONFIGURATION ---
+RULES_PATH = 'ESUA/phase6_camera_integration/esua_rules.json'
+POLL_INTERVAL = 0.25   # Seconds between checks of the file's mtime
+TEMPLATE_FIELDS = ('obj_a', 'cat_a', 'obj_b', 'cat_b', 'minutes')
+
+DEFAULT_RULES = [
+    {'risk_type': 'spill_risk', 'a': 'liquid', 'b': 'electronics'},
+    {'risk_type': 'damage_risk', 'a': 'liquid', 'b': 'flammable'}
+]
+
+
+def default_spec():
+    """
+    Returns the built-in categories, rules and templates as a rules spec.
+    """
+    return {
+        'categories': {k: list(v) for k, v in object_categories.CATEGORIES.items()},
+        'display_only': list(object_categories.DISPLAY_ONLY_CLASSES),
+        'rules': [dict(rule) for rule in DEFAULT_RULES],
+        'templates': {k: list(v) for k, v in explanation_templates.TEMPLATES.items()}
+    }
+
+
+def _is_str_list(value):
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def validate_spec(spec):
+    """
+    Checks a rules spec (missing sections count as built-in).
+
+    Raises:
+        ValueError: On unknown sections, wrong types, rules on unknown
+        categories, template fields other than TEMPLATE_FIELDS, or
+        templates that do not format (bad format specs or conversions).
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Rules file must contain an object")
+    for key in spec:
+        if not key.startswith('_') and key not in ('categories', 'display_only', 'rules', 'templates'):
+            raise ValueError(f"Unknown rules section: {key}")
+
+    categories = spec.get('categories', object_categories.CATEGORIES)
+    if not isinstance(categories, dict) or not all(_is_str_list(v) for v in categories.values()):
+        raise ValueError("'categories' must map category names to lists of class names")
+    if not _is_str_list(spec.get('display_only', [])):
+        raise ValueError("'display_only' must be a list of class names")
+
+    rules = spec.get('rules', DEFAULT_RULES)
+    if not isinstance(rules, list):
+        raise ValueError("'rules' must be a list")
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict) or set(rule) != {'risk_type', 'a', 'b'} or \
+                not all(isinstance(v, str) for v in rule.values()):
+            raise ValueError(f"Rule {i} must be {{'risk_type': str, 'a': category, 'b': category}}")
+        for side in ('a', 'b'):
+            if rule[side] not in categories:
+                raise ValueError(f"Rule {i} ({rule['risk_type']}) uses unknown category '{rule[side]}'")
+
+    templates = spec.get('templates', explanation_templates.TEMPLATES)
+    if not isinstance(templates, dict) or not all(_is_str_list(v) and v for v in templates.values()):
+        raise ValueError("'templates' must map risk types to non-empty lists of lines")
+    if 'default' not in templates:
+        raise ValueError("'templates' needs a 'default' entry")
+    sample = {field: field for field in TEMPLATE_FIELDS}   # Every field is filled with a string
+    for risk_type, lines in templates.items():
+        for line in lines:
+            try:
+                fields = [f for _, f, _, _ in string.Formatter().parse(line) if f is not None]
+            except ValueError as e:
+                raise ValueError(f"Template {risk_type}: {e}")
+            unknown = [f for f in fields if f not in TEMPLATE_FIELDS]
+            if unknown:
+                raise ValueError(f"Template {risk_type} uses unknown field(s) {unknown}; "
+                                 f"allowed: {', '.join(TEMPLATE_FIELDS)}")
+            try:
+                line.format(**sample)
+            except (ValueError, IndexError, KeyError, TypeError) as e:
+                raise ValueError(f"Template {risk_type} does not format: {line!r} ({e})")
+    for rule in rules:
+        if rule['risk_type'] not in templates:
+            raise ValueError(f"Rule {rule['risk_type']} has no template")
+
+
+class RuleTables:
+    """
+    Compiled, read-only lookup tables of one rules spec. Never mutated after
+    construction, so the live loop can use a reference without locking.
+    """
+
+    def __init__(self, spec, source='built-in'):
+        """
+        Args:
+            spec (dict): Validated rules spec (missing sections = built-in).
+            source (str): Where the spec came from (for reports).
+        """
+        defaults = default_spec()
+        category_map = spec.get('categories', defaults['categories'])
+        self.display_only = tuple(spec.get('display_only', defaults['display_only']))
+        self.rules = tuple(dict(r) for r in spec.get('rules', defaults['rules']))
+        self.templates = {k: tuple(v) for k, v in spec.get('templates', defaults['templates']).items()}
+        self.source = source
+        # Categories some rule uses (cf. risk_rules.RISK_CATEGORIES)
+        self.risk_categories = tuple(dict.fromkeys(r[side] for r in self.rules for side in ('a', 'b')))
+
+        # Class name -> category list, in category order (shared by all objects; do not mutate)
+        self.categories = {}
+        for category, items in category_map.items():
+            for name in items:
+                self.categories.setdefault(name, []).append(category)
+
+        # (class a, class b) -> (risk_type, swap): first matching rule, either orientation
+        self._pairs = {}
+        for name_a, cats_a in self.categories.items():
+            for name_b, cats_b in self.categories.items():
+                for rule in self.rules:
+                    if rule['a'] in cats_a and rule['b'] in cats_b:
+                        self._pairs[(name_a, name_b)] = (rule['risk_type'], False)
+                        break
+                    if rule['a'] in cats_b and rule['b'] in cats_a:
+                        self._pairs[(name_a, name_b)] = (rule['risk_type'], True)
+                        break
+
+    def risk_of(self, obj_a, obj_b):
+        """
+        Returns (risk_type, swap) for two nearby objects, or None.
+        """
+        return self._pairs.get((obj_a['name'], obj_b['name']))
+
+    def find_risk_pairs(self, objects, near_threshold, out=None):
+        """
+        risk_rules.find_risk_pairs() with these tables' rules.
+        """
+        return risk_rules.find_risk_pairs(objects, near_threshold, risk_of=self.risk_of, out=out)
+
+    def class_ids_for(self, names, display_only=None):
+        """
+        Detector class ids worth detecting (see object_categories.class_ids_for).
+
+        Args:
+            names (dict): Detector class id -> name.
+            display_only (iterable): Uncategorized classes to keep as well
+                (None = this spec's display_only list).
+        """
+        wanted = set(self.display_only if display_only is None else display_only) | set(self.categories)
+        return sorted(class_id for class_id, name in names.items() if name in wanted)
+
+    def explain(self, risk_type, context):
+        """
+        explanation_templates.get_explanation() with these tables' templates.
+        """
+        lines = self.templates.get(risk_type, self.templates['default'])
+        formatted_lines = []
+        for line in lines:
+            try:
+                formatted_lines.append(line.format(**context))
+            except KeyError as e:
+                formatted_lines.append(line + f" [Missing data: {e}]")
+            except (ValueError, IndexError) as e:
+                formatted_lines.append(line + f" [Bad template: {e}]")
+        return "\n".join(formatted_lines)
+
+
+def compile_rules(spec, source='built-in'):
+    """
+    Validates `spec` and returns its RuleTables.
+
+    Raises:
+        ValueError: If the spec is invalid.
+    """
+    validate_spec(spec)
+    return RuleTables(spec, source)
+
+
+def load_rules(path=RULES_PATH):
+    """
+    Returns the RuleTables for the file at `path`, or the built-in ones if it
+    does not exist or is invalid (reported, like runtime_config.load_config).
+    """
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                tables = compile_rules(json.load(f), path)
+            print(f"Loaded rules from {path}")
+            return tables
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring rules {path}: {e}")
+    return compile_rules(default_spec())
+
+
+class RuleWatcher:
+    """
+    Keeps `tables` in sync with the rules file; edits are compiled on a
+    background thread and published with a single reference assignment.
+    """
+
+    def __init__(self, path=RULES_PATH, interval=POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.tables = load_rules(path)
+        self._stamp = self._stat()
+        self._saved_at = None     # mtime of the file behind the published tables
+        self._used = self.tables  # Tables last handed out by use()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Statistics
+        self.reloads = 0
+        self.rejected = 0
+        self.compile_time = []   # Seconds from reading the file to the swap
+        self.swap_lag = []       # Seconds from the file's mtime to the swap
+        self.apply_lag = []      # Seconds from the file's mtime to the first use()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='rule-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stamp = self._stat()
+            if stamp != self._stamp:
+                self._stamp = stamp
+                self.reload()
+
+    def reload(self):
+        """
+        Recompiles the file and swaps it in. Returns True on success.
+        """
+        start = time.perf_counter()
+        try:
+            if self._stat() is None:
+                tables = compile_rules(default_spec())
+            else:
+                with open(self.path) as f:
+                    tables = compile_rules(json.load(f), self.path)
+        except (OSError, ValueError) as e:
+            self.rejected += 1
+            print(f"❌ Rejected rules {self.path}: {e} (keeping the previous rules)")
+            return False
+
+        self._saved_at = self._stamp[0] / 1e9 if self._stamp is not None else None
+        self.tables = tables   # The swap: readers see the old or the new tables, never a mix
+        elapsed = time.perf_counter() - start
+        self.reloads += 1
+        self.compile_time.append(elapsed)
+        if self._saved_at is not None:
+            self.swap_lag.append(max(0.0, time.time() - self._saved_at))
+        print(f"🔄 Rules reloaded from {tables.source}: {len(tables.rules)} rules, "
+              f"{len(tables.categories)} classes, {len(tables.templates)} templates ({elapsed * 1000:.1f}ms)")
+        return True
+
+    def use(self):
+        """
+        Returns the current tables for the frame about to be analyzed.
+
+        The first use of reloaded tables records the lag from saving the file,
+        which includes frames the caller skipped (e.g. the motion gate).
+        """
+        tables = self.tables
+        if tables is not self._used:
+            self._used = tables
+            if self._saved_at is not None:
+                self.apply_lag.append(max(0.0, time.time() - self._saved_at))
+        return tables
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self):
+        if not self.reloads:
+            return f"Rules: {self.tables.source}, no reloads ({self.rejected} rejected)"
+        avg_ms = 1000 * sum(self.compile_time) / len(self.compile_time)
+        lag = f", {1000 * max(self.swap_lag):.0f}ms max from save to swap" if self.swap_lag else ""
+        if self.apply_lag:
+            lag += f", {1000 * max(self.apply_lag):.0f}ms max from save to use"
+        return (f"Rules: {self.reloads} reloads, {self.rejected} rejected | "
+                f"compile+swap {avg_ms:.1f}ms avg{lag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or check the ESUA rules file.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('export', help="Write the built-in categories, rules and templates")
+    p.add_argument('--out', default=RULES_PATH)
+    p = sub.add_parser('check', help="Validate a rules file and time its compilation")
+    p.add_argument('path', nargs='?', default=RULES_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        with open(args.out, 'w') as f:
+            json.dump(default_spec(), f, indent=2)
+        print(f"✅ Built-in rules written to {args.out}")
+    else:
+        try:
+            with open(args.path) as f:
+                spec = json.load(f)
+            start = time.perf_counter()
+            tables = compile_rules(spec, args.path)
+        except (OSError, ValueError) as e:
+            print(f"❌ {args.path}: {e}")
+            return
+        print(f"✅ {args.path}: {len(tables.rules)} rules, {len(tables.categories)} classes, "
+              f"{len(tables.templates)} templates, compiled in {1000 * (time.perf_counter() - start):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Runtime Configuration shared by the runners
+
+# The performance knobs below used to be hand-picked constants scattered over
+# camera_runner.py and snapshot_analyzer.py. They now have defaults here and
+# can be overridden by a JSON file (written e.g. by param_tuner.py), which the
+# runners load at startup.
+
+import json
+import os
+
+CONFIG_PATH = 'ESUA/phase6_camera_integration/esua_config.json'
+
+DEFAULTS = {
+    # Live runner
+    'skip_frames': 5,                   # Run inference every N frames
+    'analysis_size': [640, 480],        # (width, height) frames are resized to
+    'imgsz': 640,                       # YOLO inference size
+    'near_threshold': 300,              # Pixels, camera_runner "near"
+
+    # Snapshot analyzer
+    'snapshot_near_threshold': 400,     # Pixels, snapshot "near"
+    'buffer_size': 5,                   # Frames in the multi-frame window
+    'confirmation_threshold_frames': 2, # Frames an object must be seen in
+    'grouping_distance_threshold': 50,  # Pixels, same-object grouping across frames
+
+    # Class-aware confidence thresholds
+    'small_object_threshold': 0.10,     # cup, bottle, wine glass, cell phone, mouse, remote
+    'person_threshold': 0.30,
+    'default_threshold': 0.25,
+
+    # CPU budget (see thread_budget.py)
+    'streams': 1,                       # Streams/processes sharing this machine
+    'thread_split': None,               # [capture, detector, reasoning] cores; None = mode default
+    'cpu_affinity': False,              # Pin threads to their cores (Linux only)
+
+    # Scene zones (see scene_zones.py): {camera id: {zone name: [[x, y], ...]}},
+    # polygon points as fractions (0-1) of the frame width and height
+    'zones': {}
+}
+
+# Whole numbers >= 1: divisors, sizes and frame counts (0 or 2.5 would crash a runner)
+POSITIVE_INT_KEYS = ('skip_frames', 'imgsz', 'buffer_size', 'confirmation_threshold_frames', 'streams')
+
+
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+
+def validate_config(config):
+    """
+    Checks keys and value types against DEFAULTS.
+
+    Raises:
+        ValueError: On unknown keys, values of the wrong type, negative
+        numbers, or non-positive/fractional sizes and frame counts.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Config file must contain an object")
+    for key, value in config.items():
+        if key.startswith('_'):
+            continue  # Comments / metadata (e.g. '_tuner' results)
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown config key: {key}")
+        default = DEFAULTS[key]
+        if isinstance(default, list):
+            if not isinstance(value, list) or len(value) != len(default):
+                raise ValueError(f"Config key {key} must be a list of {len(default)} values")
+            if key == 'analysis_size' and not all(_is_positive_int(v) for v in value):
+                raise ValueError(f"Config key {key} must be [width, height] in whole pixels >= 1")
+        elif isinstance(default, (int, float)) and not isinstance(default, bool):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Config key {key} must be a number")
+            if value < 0:
+                raise ValueError(f"Config key {key} must not be negative")
+            if key in POSITIVE_INT_KEYS and not _is_positive_int(value):
+                raise ValueError(f"Config key {key} must be a whole number >= 1")
+        elif default is None and value is not None and not isinstance(value, list):
+            raise ValueError(f"Config key {key} must be a list or null")
+        elif isinstance(default, dict):
+            if not isinstance(value, dict):
+                raise ValueError(f"Config key {key} must be an object")
+            if key == 'zones':
+                validate_zones(value)
+
+
+def validate_zones(zones):
+    """
+    Checks {camera id: {zone name: polygon}} with at least 3 points in [0, 1] per polygon.
+    """
+    for camera, camera_zones in zones.items():
+        if not isinstance(camera_zones, dict):
+            raise ValueError(f"Zones of camera {camera} must be an object")
+        for name, polygon in camera_zones.items():
+            if not isinstance(polygon, list) or len(polygon) < 3 or not all(
+                    isinstance(p, list) and len(p) == 2 and all(
+                        isinstance(v, (int, float)) and not isinstance(v, bool) and 0 <= v <= 1 for v in p)
+                    for p in polygon):
+                raise ValueError(f"Zone {name} (camera {camera}) must be a list of >= 3 [x, y] points in 0-1")
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    Returns DEFAULTS overridden by the JSON file at `path` (if it exists).
+
+    An invalid file is reported and ignored, so a bad edit never stops a runner.
+    """
+    config = dict(DEFAULTS)
+    if not path or not os.path.exists(path):
+        return config
+
+    try:
+        with open(path) as f:
+            overrides = json.load(f)
+        validate_config(overrides)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring config {path}: {e}")
+        return config
+
+    config.update({k: v for k, v in overrides.items() if not k.startswith('_')})
+    print(f"Loaded runtime config from {path}")
+    return config
+
+
+def save_config(config, path=CONFIG_PATH):
+    validate_config(config)
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
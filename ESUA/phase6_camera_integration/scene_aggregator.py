@@ -0,0 +1,295 @@
+# Scene Aggregator: central reasoning, events and storage for many edge nodes
+
+# Edge nodes (edge_node.py) send per-frame detections in the scene_protocol
+# format; the aggregator runs phases 2-4 for all of them: categories and risk
+# rules (hot-reloaded rule_config tables), scene zones of the node's camera,
+# risk event hysteresis, temporal rules and the SQLite event store (camera id =
+# node id). One asyncio server handles every connection; a frame is reasoned
+# about as soon as it is read and then acknowledged, so a slow aggregator
+# acknowledges slowly and the edges, which keep only a few frames
+# unacknowledged, drop their oldest frames instead of building up a backlog.
+#
+# Per node it tracks sequence gaps (frames lost on the edge or the link), stale
+# or duplicate frames, bytes per frame, the transit time (send -> receive) and
+# the end-to-end latency (capture -> reasoned). Clocks of separate machines
+# must be synchronized (NTP) for the latter two; over loopback they share one.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/scene_aggregator.py serve --port 9750
+#   python ESUA/phase6_camera_integration/scene_aggregator.py loopback --nodes 4 --fps 30 --duration 10
+#   python ESUA/phase6_camera_integration/scene_aggregator.py loopback --process-delay-ms 50   # Backpressure
+
+import argparse
+import asyncio
+import collections
+import os
+import subprocess
+import sys
+import time
+import cv2
+import detections
+import event_store
+import risk_events
+import rule_config
+import runtime_config
+import scene_protocol
+import scene_zones
+import temporal_rules
+
+# --- CONFIGURATION ---
+HOST = '127.0.0.1'
+PORT = 9750
+LATENCY_SAMPLES = 10000        # Latency samples kept per node
+SAMPLE_IMAGE = 'ESUA/phase4_explanation_generation/sample.jpg'   # JPEG size comparison
+
+
+class NodeState:
+    """
+    Reasoning state and link statistics of one edge node (kept across reconnects).
+    """
+
+    def __init__(self, node, names, frame_size, config, store):
+        self.node = node
+        self.names = names
+        self.frame_size = frame_size
+        self.tracker = risk_events.RiskEventTracker()
+        self.temporal = temporal_rules.TemporalRuleEngine()
+        self.zones = scene_zones.ZoneMap.from_config(config, node, frame_size)
+        self.store = event_store.EventStore(camera=node) if store else None
+        self.last_seq = None
+        self.reconnected = False
+
+        # Statistics
+        self.connects = 0
+        self.frames = 0
+        self.lost = 0
+        self.stale = 0
+        self.restarts = 0
+        self.bytes = 0
+        self.events = 0
+        self.reason_time = 0.0
+        self.latency = collections.deque(maxlen=LATENCY_SAMPLES)   # Capture -> reasoned (s)
+        self.transit = collections.deque(maxlen=LATENCY_SAMPLES)   # Send -> received (s)
+
+    def accept(self, seq):
+        """
+        Updates the sequence bookkeeping; returns False for stale/duplicate frames.
+        """
+        if self.last_seq is not None and seq <= self.last_seq:
+            if not self.reconnected:
+                self.stale += 1
+                return False
+            self.restarts += 1   # The edge restarted and counts from 0 again
+        elif self.last_seq is not None:
+            self.lost += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.reconnected = False
+        return True
+
+
+class SceneAggregator:
+    """
+    asyncio TCP server running the reasoning stages for all edge nodes.
+    """
+
+    def __init__(self, config, store=True, process_delay=0.0, verbose=True):
+        """
+        Args:
+            config (dict): Runtime config (near threshold, zones).
+            store (bool): Write detections and events to the event store.
+            process_delay (float): Extra seconds per frame (simulates a slow aggregator).
+            verbose (bool): Print onset/resolved events.
+        """
+        self.config = config
+        self.near_threshold = config['near_threshold']
+        self.store = store
+        self.process_delay = process_delay
+        self.verbose = verbose
+        self.rules = rule_config.RuleWatcher().start()
+        self.nodes = {}
+        self.protocol_errors = 0
+
+    def process(self, state, seq, capture_ts, send_ts, payload, size, received):
+        """
+        Runs phases 2-4 on one frame of `state.node`.
+
+        Raises:
+            ValueError: On a class id the node did not name in its HELLO.
+        """
+        start = time.perf_counter()
+        boxes, confs, class_ids = scene_protocol.decode_detections(payload)
+        unknown = set(class_ids.tolist()).difference(state.names)
+        if unknown:
+            raise ValueError(f"Node {state.node} sent class ids {sorted(unknown)} missing from its HELLO")
+        if not state.accept(seq):
+            return
+        tables = self.rules.use()
+        objects = detections.to_objects(boxes, confs, class_ids, state.names, categories=tables.categories)
+        reasoning_objects = [obj for obj in objects if obj['categories']]
+        risk_pairs = tables.find_risk_pairs(reasoning_objects, self.near_threshold)
+        if state.zones is not None:
+            risk_pairs += state.zones.find_zone_risks(reasoning_objects)
+
+        if state.store is not None:
+            state.store.add_detections(objects, ts=capture_ts, frame=seq)
+        events = state.tracker.update(risk_pairs, capture_ts) + state.temporal.update(objects, risk_pairs, capture_ts)
+        for event in events:
+            state.events += 1
+            if state.store is not None:
+                state.store.add_event(event)
+            if self.verbose and event['event'] != 'ongoing':
+                print(f"[node {state.node}] [{event['event'].upper()}] {event['risk_type']}: {event['obj_a']}"
+                      f"{' / ' + event['obj_b'] if event['obj_b'] else ''} ({event['duration']:.1f}s)")
+
+        if self.process_delay:
+            time.sleep(self.process_delay)   # Blocks the loop on purpose: ACKs slow down, edges drop
+        state.frames += 1
+        state.bytes += size
+        state.reason_time += time.perf_counter() - start
+        state.transit.append(received - send_ts)
+        state.latency.append(time.time() - capture_ts)
+
+    async def handle(self, reader, writer):
+        state = None
+        try:
+            kind, node, _, _, _, payload, _ = await scene_protocol.read_message(reader)
+            if kind != scene_protocol.KIND_HELLO:
+                raise ValueError("Expected HELLO")
+            names, frame_size = scene_protocol.decode_hello(payload)
+            state = self.nodes.get(node)
+            if state is None:
+                state = self.nodes[node] = NodeState(node, names, frame_size, self.config, self.store)
+            state.names = names
+            state.reconnected = True
+            state.connects += 1
+            print(f"🔌 Node {node} connected ({len(names)} classes, {frame_size[0]}x{frame_size[1]})")
+
+            while True:
+                kind, msg_node, seq, capture_ts, send_ts, payload, size = await scene_protocol.read_message(reader)
+                if kind != scene_protocol.KIND_FRAME or msg_node != node:
+                    raise ValueError("Unexpected message on an established connection")
+                self.process(state, seq, capture_ts, send_ts, payload, size, time.time())
+                writer.write(scene_protocol.encode_ack(node, seq))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            self.protocol_errors += 1
+            print(f"❌ Dropping connection: {e}")
+        finally:
+            writer.close()
+            if state is not None:
+                print(f"Node {state.node} disconnected")
+
+    async def serve(self, host=HOST, port=PORT, duration=None, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"✅ ESUA scene aggregator listening on {host}:{port}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            if duration is None:
+                await server.serve_forever()
+            else:
+                await asyncio.sleep(duration)
+
+    def close(self):
+        self.rules.close()
+        for state in self.nodes.values():
+            if state.store is not None:
+                state.store.close()
+
+    def report(self):
+        def ms(values, p):
+            values = sorted(values)
+            return 1e3 * values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+        lines = [f"{'node':>4} | {'frames':>7} | {'lost':>6} | {'stale':>5} | {'B/frame':>7} | "
+                 f"{'transit p50':>11} | {'e2e p50':>7} | {'p95':>6} | {'p99':>6} | {'reason':>7} | events"]
+        for node, s in sorted(self.nodes.items()):
+            span = s.frames + s.lost
+            lines.append(
+                f"{node:>4} | {s.frames:>7} | {s.lost:>6} | {s.stale:>5} | {s.bytes / max(1, s.frames):>7.1f} | "
+                f"{ms(s.transit, 0.5):>9.2f}ms | {ms(s.latency, 0.5):>5.2f}ms | {ms(s.latency, 0.95):>4.1f}ms | "
+                f"{ms(s.latency, 0.99):>4.1f}ms | {1e6 * s.reason_time / max(1, s.frames):>5.0f}us | {s.events}"
+                + (f"  ({100 * s.lost / span:.1f}% lost)" if s.lost else ""))
+        if self.protocol_errors:
+            lines.append(f"{self.protocol_errors} connections dropped for protocol errors")
+        lines.append(self.rules.report())
+        return "\n".join(lines)
+
+
+def jpeg_bytes(size, quality=80):
+    """
+    Size of the sample image as a JPEG at `size`, for comparison (None if missing).
+    """
+    image = cv2.imread(SAMPLE_IMAGE)
+    if image is None:
+        return None
+    ok, data = cv2.imencode('.jpg', cv2.resize(image, size), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return len(data) if ok else None
+
+
+async def run_loopback(aggregator, args):
+    ready = asyncio.Event()
+    server = asyncio.get_running_loop().create_task(
+        aggregator.serve(HOST, args.port, duration=args.duration + 3.0, ready=ready))
+    await ready.wait()
+
+    edge = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'edge_node.py')
+    procs = [await asyncio.create_subprocess_exec(
+                 sys.executable, edge, '--synthetic', str(args.fps), '--duration', str(args.duration),
+                 '--node', str(node), '--aggregator', f"{HOST}:{args.port}", stdout=subprocess.PIPE)
+             for node in range(args.nodes)]
+    outputs = [await proc.communicate() for proc in procs]
+    server.cancel()
+    try:
+        await server
+    except asyncio.CancelledError:
+        pass
+    return [out.decode().strip().splitlines()[-1] for out, _ in outputs if out.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESUA scene aggregator for edge nodes.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help="Accept edge nodes and run reasoning, events and storage")
+    p.add_argument('--host', default=HOST)
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--no-store', action='store_true', help="Do not write to the event store")
+    p = sub.add_parser('loopback', help="Measure bytes per frame and latency with local synthetic edge nodes")
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--nodes', type=int, default=4)
+    p.add_argument('--fps', type=float, default=30.0, help="Frames per second per node")
+    p.add_argument('--duration', type=float, default=10.0)
+    p.add_argument('--process-delay-ms', type=float, default=0.0,
+                   help="Extra aggregator time per frame, to see backpressure and drops")
+    args = parser.parse_args()
+
+    config = runtime_config.load_config()
+    if args.command == 'serve':
+        aggregator = SceneAggregator(config, store=not args.no_store)
+        try:
+            asyncio.run(aggregator.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        aggregator.close()
+        print(aggregator.report())
+        print("Scene aggregator stopped.")
+        return
+
+    aggregator = SceneAggregator(config, store=False, process_delay=args.process_delay_ms / 1000, verbose=False)
+    print(f"Loopback: {args.nodes} synthetic edge nodes x {args.fps:.0f} FPS for {args.duration:.0f}s")
+    edge_reports = asyncio.run(run_loopback(aggregator, args))
+    aggregator.close()
+    for line in edge_reports:
+        print(line)
+    print(aggregator.report())
+    jpeg = jpeg_bytes(tuple(config['analysis_size']))
+    frames = sum(s.frames for s in aggregator.nodes.values())
+    if jpeg and frames:
+        per_frame = sum(s.bytes for s in aggregator.nodes.values()) / frames
+        print(f"Wire size: {per_frame:.0f} bytes/frame vs {jpeg / 1024:.0f} KB for a JPEG frame "
+              f"({jpeg / per_frame:.0f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Scene Protocol: compact binary wire format for per-frame detections
+
+# Edge nodes (edge_node.py) run detection only and send each analyzed frame's
+# detections to a central aggregator (scene_aggregator.py) over TCP. A JPEG
+# frame is tens of KB and a JSON object list a few hundred bytes; a frame
+# message here is a fixed header plus a fixed-width record per detection:
+#
+#   header  28 bytes  magic 'ES', version, kind, node id, count, seq,
+#                     capture time, send time (little endian)
+#   record  10 bytes  box x1, y1, x2, y2 (uint16 pixels), class id (uint8),
+#                     confidence (uint8, 1/255 steps)
+#
+# A typical frame with 5 detections is 78 bytes. Boxes are sent as whole
+# pixels (detections.to_objects truncates them to ints anyway) and confidences
+# lose less than 0.002. The first message on a connection is a HELLO whose
+# payload (count bytes) is JSON with the node's class names and frame size.
+#
+# `seq` counts analyzed frames per node, including frames the edge dropped
+# under backpressure, so the aggregator can count losses from gaps. The
+# aggregator answers every frame with a header-only ACK carrying its seq; the
+# edge keeps at most a few frames unacknowledged. With messages this small,
+# TCP flow control alone would only kick in after thousands of frames sat in
+# socket buffers.
+#
+# Usage:
+#   message = encode_frame(node, seq, boxes, confs, class_ids, capture_ts)
+#   kind, node, seq, capture_ts, send_ts, payload, size = await read_message(reader)
+#   boxes, confs, class_ids = decode_detections(payload)
+
+import json
+import struct
+import time
+import numpy as np
+import detections
+
+# --- CONFIGURATION ---
+MAGIC = b'ES'
+VERSION = 1
+KIND_HELLO = 1
+KIND_FRAME = 2
+KIND_ACK = 3
+HEADER = struct.Struct('<2sBBHHIdd')   # magic, version, kind, node, count, seq, capture_ts, send_ts
+DET_WIRE_DTYPE = np.dtype([('box', '<u2', (4,)), ('cls', 'u1'), ('conf', 'u1')])
+MAX_DETECTIONS = 0xFFFF
+MAX_HELLO_BYTES = 64 * 1024
+
+
+def encode_frame(node, seq, boxes, confs, class_ids, capture_ts, send_ts=None):
+    """
+    Packs one frame's detections.
+
+    Args:
+        node (int): Edge node id (0-65535).
+        seq (int): Per-node frame sequence number.
+        boxes, confs, class_ids: Arrays as returned by detections.result_to_arrays.
+        capture_ts (float): time.time() when the frame was captured.
+        send_ts (float): Send time (defaults to now; the sender restamps it).
+
+    Returns:
+        bytes: The message.
+    """
+    count = len(class_ids)
+    if count > MAX_DETECTIONS:
+        raise ValueError(f"At most {MAX_DETECTIONS} detections per frame")
+    records = np.empty(count, dtype=DET_WIRE_DTYPE)
+    if count:
+        if int(class_ids.max()) > 0xFF or int(class_ids.min()) < 0:
+            raise ValueError("Class ids must fit in one byte")
+        records['box'] = np.clip(boxes, 0, 0xFFFF)   # Truncates like detections.to_objects
+        records['cls'] = class_ids
+        records['conf'] = np.clip(np.rint(confs * 255), 0, 255)
+    header = HEADER.pack(MAGIC, VERSION, KIND_FRAME, node, count, seq & 0xFFFFFFFF, capture_ts,
+                         time.time() if send_ts is None else send_ts)
+    return header + records.tobytes()
+
+
+def restamp(message, send_ts):
+    """
+    Returns `message` with its send time replaced (set when it actually leaves the queue).
+    """
+    return message[:HEADER.size - 8] + struct.pack('<d', send_ts) + message[HEADER.size:]
+
+
+def encode_ack(node, seq):
+    """
+    Packs the acknowledgement of frame `seq` (sent by the aggregator once it is processed).
+    """
+    return HEADER.pack(MAGIC, VERSION, KIND_ACK, node, 0, seq & 0xFFFFFFFF, 0.0, time.time())
+
+
+def encode_hello(node, names, frame_size):
+    """
+    Packs the HELLO message: class names and frame size as JSON.
+    """
+    payload = json.dumps({'names': {str(k): v for k, v in names.items()},
+                          'frame_size': list(frame_size)}).encode('utf-8')
+    if len(payload) > MAX_HELLO_BYTES:
+        raise ValueError("HELLO payload too large")
+    return HEADER.pack(MAGIC, VERSION, KIND_HELLO, node, len(payload), 0, time.time(), time.time()) + payload
+
+
+def decode_hello(payload):
+    """
+    Returns (names dict, frame size) from a HELLO payload.
+    """
+    info = json.loads(payload.decode('utf-8'))
+    return {int(k): v for k, v in info['names'].items()}, tuple(info['frame_size'])
+
+
+def decode_detections(payload):
+    """
+    Unpacks frame records into (boxes float32 (N, 4), confs float32, class_ids int32).
+    """
+    if not payload:
+        return detections.empty_arrays()
+    records = np.frombuffer(payload, dtype=DET_WIRE_DTYPE)
+    return (records['box'].astype(np.float32), records['conf'].astype(np.float32) / 255,
+            records['cls'].astype(np.int32))
+
+
+def parse_header(data):
+    """
+    Returns (kind, node, count, seq, capture_ts, send_ts, payload length).
+
+    Raises:
+        ValueError: On a bad magic/version or an oversized HELLO.
+    """
+    magic, version, kind, node, count, seq, capture_ts, send_ts = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not an ESUA scene message (magic {magic!r}, version {version})")
+    if kind == KIND_FRAME:
+        length = count * DET_WIRE_DTYPE.itemsize
+    elif kind == KIND_HELLO:
+        length = count
+    elif kind == KIND_ACK:
+        length = 0
+    else:
+        raise ValueError(f"Unknown message kind {kind}")
+    return kind, node, count, seq, capture_ts, send_ts, length
+
+
+async def read_message(reader):
+    """
+    Reads one message from an asyncio StreamReader.
+
+    Returns:
+        tuple: (kind, node, seq, capture_ts, send_ts, payload bytes, message size)
+    """
+    kind, node, count, seq, capture_ts, send_ts, length = parse_header(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(length) if length else b''
+    return kind, node, seq, capture_ts, send_ts, payload, HEADER.size + length
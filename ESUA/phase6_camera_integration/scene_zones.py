@@ -0,0 +1,193 @@
+# Scene Zones: location-aware rules from precomputed masks
+
+# Some risks depend on *where* an object is, not on what it is next to: a
+# knife on the table edge, a drink on the server rack, a chair in the walkway.
+# Zones are polygons per camera in esua_config.json ("zones"), with points
+# given as fractions of the frame width/height:
+#
+#   "zones": {"0": {"table_edge": [[0.0, 0.80], [1.0, 0.80], [1.0, 1.0], [0.0, 1.0]]}}
+#
+# Each polygon is rasterized once at the analysis resolution into
+#   - a bit mask (bit i set where zone i is), so point-in-zone is one array read, and
+#   - an integral image, so the overlap of any box with a zone is four reads.
+# No polygon math happens per frame. ZONE_RULES combine a category with a zone
+# (e.g. sharp AND in table_edge); matches are returned as ordinary
+# (risk_type, obj, zone_object) pairs, so event tracking, explanations and
+# storage handle them like any other risk.
+#
+# Usage:
+#   zones = ZoneMap.from_config(config, camera=0, size=(640, 480))
+#   risk_pairs += zones.find_zone_risks(objects)
+#   python ESUA/phase6_camera_integration/scene_zones.py --image desk.jpg --camera 0
+
+import argparse
+import cv2
+import numpy as np
+import runtime_config
+
+# --- CONFIGURATION ---
+ZONE_RULES = [
+    {'risk_type': 'sharp_risk', 'category': 'sharp', 'zone': 'table_edge'},
+    {'risk_type': 'spill_risk', 'category': 'liquid', 'zone': 'server_rack'},
+    {'risk_type': 'trip_risk', 'category': 'furniture', 'zone': 'walkway'}
+]
+MIN_OVERLAP = 0.25     # Fraction of an object's box inside a zone to count as "in" it
+MAX_ZONES = 32         # One bit per zone in the uint32 mask
+ZONE_COLOR = (255, 160, 0)
+
+
+class ZoneMap:
+    """
+    Rasterized zones of one camera at a fixed frame size.
+    """
+
+    def __init__(self, zones, size):
+        """
+        Args:
+            zones (dict): Zone name -> polygon, points as [x, y] fractions of the frame.
+            size (tuple): (width, height) of the analyzed frames.
+        """
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"At most {MAX_ZONES} zones per camera")
+        w, h = size
+        self.size = (w, h)
+        self.names = list(zones)
+        self.mask = np.zeros((h, w), dtype=np.uint32)
+        self._integrals = np.empty((len(self.names), h + 1, w + 1), dtype=np.int32)
+        self._polygons = []
+        self._bounds = []        # Zone bounding boxes: cheap reject before the integral lookup
+        self._zone_objects = {}  # Zone name -> pseudo-object used as the second half of a risk pair
+
+        layer = np.empty((h, w), dtype=np.uint8)
+        for i, name in enumerate(self.names):
+            points = np.round(np.array(zones[name], dtype=np.float64) * (w - 1, h - 1)).astype(np.int32)
+            layer.fill(0)
+            cv2.fillPoly(layer, [points], 1)
+            self.mask |= layer.astype(np.uint32) << i
+            self._integrals[i] = cv2.integral(layer, sdepth=cv2.CV_32S)
+            self._polygons.append(points)
+
+            x, y, bw, bh = cv2.boundingRect(points)
+            self._bounds.append((x, y, x + bw, y + bh))
+            self._zone_objects[name] = {
+                'name': name.replace('_', ' '),
+                'box': (x, y, x + bw, y + bh),
+                'center': (x + bw // 2, y + bh // 2),
+                'categories': ['zone'],
+                'conf': 1.0,
+                'track_id': -(i + 1),   # Stable identity for temporal rules
+                'zone': name
+            }
+
+    @classmethod
+    def from_config(cls, config, camera, size):
+        """
+        Returns the ZoneMap for `camera`, or None if it has no zones.
+        """
+        zones = config.get('zones', {}).get(str(camera))
+        return cls(zones, size) if zones else None
+
+    def zones_at(self, x, y):
+        """
+        Returns the names of the zones containing pixel (x, y).
+        """
+        w, h = self.size
+        bits = int(self.mask[min(max(int(y), 0), h - 1), min(max(int(x), 0), w - 1)])
+        return [name for i, name in enumerate(self.names) if bits >> i & 1]
+
+    def overlap(self, box, name):
+        """
+        Returns the fraction of `box` (x1, y1, x2, y2) inside zone `name`.
+        """
+        w, h = self.size
+        x1, y1, x2, y2 = (int(v) for v in box)
+        x1, x2 = min(max(x1, 0), w), min(max(x2, 0), w)
+        y1, y2 = min(max(y1, 0), h), min(max(y2, 0), h)
+        area = (x2 - x1) * (y2 - y1)
+        if area <= 0:
+            return 0.0
+        s = self._integrals[self.names.index(name)]
+        inside = s[y2, x2] - s[y1, x2] - s[y2, x1] + s[y1, x1]
+        return float(inside) / area
+
+    def annotate(self, objects, min_overlap=MIN_OVERLAP):
+        """
+        Sets obj['zones'] (names of the zones the object is in) on every object.
+
+        An object is in a zone if its centre is, or at least `min_overlap` of its box.
+        """
+        w, h = self.size
+        for obj in objects:
+            cx, cy = obj['center']
+            bits = int(self.mask[min(max(int(cy), 0), h - 1), min(max(int(cx), 0), w - 1)])
+            x1, y1, x2, y2 = obj['box']
+            x1, x2 = min(max(int(x1), 0), w), min(max(int(x2), 0), w)
+            y1, y2 = min(max(int(y1), 0), h), min(max(int(y2), 0), h)
+            area = (x2 - x1) * (y2 - y1)
+            names = []
+            for i, name in enumerate(self.names):
+                if bits >> i & 1:
+                    names.append(name)
+                    continue
+                zx1, zy1, zx2, zy2 = self._bounds[i]
+                if area > 0 and x1 < zx2 and zx1 < x2 and y1 < zy2 and zy1 < y2:
+                    s = self._integrals[i]
+                    if s[y2, x2] - s[y1, x2] - s[y2, x1] + s[y1, x1] >= min_overlap * area:
+                        names.append(name)
+            obj['zones'] = names
+        return objects
+
+    def find_zone_risks(self, objects, rules=ZONE_RULES):
+        """
+        Applies ZONE_RULES to categorized objects.
+
+        Returns:
+            list: (risk_type, obj, zone_object) tuples; rules for zones this
+            camera does not have are skipped.
+        """
+        self.annotate(objects)
+        pairs = []
+        for rule in rules:
+            zone_object = self._zone_objects.get(rule['zone'])
+            if zone_object is None:
+                continue
+            for obj in objects:
+                if rule['category'] in obj['categories'] and rule['zone'] in obj['zones']:
+                    pairs.append((rule['risk_type'], obj, zone_object))
+        return pairs
+
+    def draw(self, image):
+        """
+        Draws zone outlines and names in place.
+        """
+        cv2.polylines(image, self._polygons, True, ZONE_COLOR, 1, cv2.LINE_AA)
+        for name, points in zip(self.names, self._polygons):
+            x, y = points.min(axis=0)
+            cv2.putText(image, name, (int(x) + 4, int(y) + 14), cv2.FONT_HERSHEY_SIMPLEX, 0.4, ZONE_COLOR, 1)
+        return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview the configured zones of a camera on an image.")
+    parser.add_argument('--image', required=True, help="Frame from the camera")
+    parser.add_argument('--camera', default='0')
+    parser.add_argument('--config', default=runtime_config.CONFIG_PATH)
+    parser.add_argument('--out', default='ESUA/phase6_camera_integration/zones_preview.jpg')
+    args = parser.parse_args()
+
+    config = runtime_config.load_config(args.config)
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"❌ Could not read {args.image}")
+        return
+    image = cv2.resize(image, tuple(config['analysis_size']))
+    zones = ZoneMap.from_config(config, args.camera, tuple(config['analysis_size']))
+    if zones is None:
+        print(f"No zones configured for camera {args.camera} in {args.config}")
+        return
+    cv2.imwrite(args.out, zones.draw(image))
+    print(f"✅ {len(zones.names)} zones drawn to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
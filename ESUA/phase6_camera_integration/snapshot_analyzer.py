@@ -1,9 +1,13 @@
 
+import argparse
 import cv2
 import math
+import signal
 import sys
 import os
 import collections
+import threading
+import time
 import numpy as np
 from ultralytics import YOLO
 
@@ -15,6 +19,13 @@ try:
     import object_categories
     import risk_rules
     import explanation_templates
+    import detections
+    import crop_refinement
+    import frame_pool
+    import runtime_config
+    import thread_budget
+    import recording
+    import preview_server
 except ImportError:
     # Fallback to importing from previous phases
     try:
@@ -27,114 +38,109 @@ except ImportError:
         sys.exit(1)
 
 # --- CONFIGURATION ---
+# (defaults; tuned values from esua_config.json are applied in main())
 BUFFER_SIZE = 5
 CONFIRMATION_THRESHOLD_FRAMES = 2  # Object must be seen in at least this many frames
 GROUPING_DISTANCE_THRESHOLD = 50   # Pixels
+NEAR_THRESHOLD = 400               # Pixels
+SMALL_OBJECTS = ['cup', 'bottle', 'wine glass', 'cell phone', 'mouse', 'remote']
+SMALL_OBJECT_THRESHOLD = 0.10
+PERSON_THRESHOLD = 0.30
+DEFAULT_THRESHOLD = 0.25
+HIGH_RES_REFINEMENT = True         # Second pass on crops around electronics/liquids (see crop_refinement.py)
+OUTPUT_PATH = 'ESUA/phase6_camera_integration/result_robust.jpg'
+ANALYSIS_SIZE = (640, 480)         # Frames are stored and analyzed at this (width, height)
+IMGSZ = 640                        # YOLO inference size
+POOL_CAPACITY = 32                 # Preallocated live frames (~0.9 MB each at 640x480)
+CLASS_FILTER = True                # Only detect categorized (+ display-only) classes
+DETECT_CLASSES = None              # Class ids passed to YOLO; set from the model in main()
 
 # Class-Aware Thresholds
 def get_confidence_threshold(class_name):
     # Lower threshold for small/hard objects
-    if class_name in ['cup', 'bottle', 'wine glass', 'cell phone', 'mouse', 'remote']:
-        return 0.10
+    if class_name in SMALL_OBJECTS:
+        return SMALL_OBJECT_THRESHOLD
     # Stricter for people to avoid ghosts
     elif class_name == 'person':
-        return 0.30
+        return PERSON_THRESHOLD
     # Standard for others
-    return 0.25
+    return DEFAULT_THRESHOLD
 
-def main():
-    print("Initializing Robust ESUA Camera System...")
-    print("Controls:\n  'c' - Capture (Multi-Frame Analysis)\n  'q' - Quit")
-    
-    # 1. CAMERA SETUP
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open camera.")
-        return
-
-    # Ring Buffer
-    frame_buffer = collections.deque(maxlen=BUFFER_SIZE)
-    
-    capture_triggered = False
-    final_frame = None
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Add to buffer
-        frame_buffer.append(frame)
-
-        # Display
-        cv2.imshow('ESUA Live Feed (Buffering 5 Frames)', frame)
-
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            break
-        elif key == ord('c'):
-            if len(frame_buffer) < BUFFER_SIZE:
-                print("Buffer filling... wait a moment.")
-                continue
-            capture_triggered = True
-            print("Capturing burst of frames for analysis...")
-            break
-    
-    cap.release()
-    cv2.destroyAllWindows()
-
-    if not capture_triggered:
-        return
+def apply_config(config):
+    """
+    Overrides the module configuration with values from runtime_config.
+    """
+    global BUFFER_SIZE, CONFIRMATION_THRESHOLD_FRAMES, GROUPING_DISTANCE_THRESHOLD, NEAR_THRESHOLD
+    global SMALL_OBJECT_THRESHOLD, PERSON_THRESHOLD, DEFAULT_THRESHOLD, ANALYSIS_SIZE, IMGSZ
+    BUFFER_SIZE = config['buffer_size']
+    CONFIRMATION_THRESHOLD_FRAMES = config['confirmation_threshold_frames']
+    GROUPING_DISTANCE_THRESHOLD = config['grouping_distance_threshold']
+    NEAR_THRESHOLD = config['snapshot_near_threshold']
+    SMALL_OBJECT_THRESHOLD = config['small_object_threshold']
+    PERSON_THRESHOLD = config['person_threshold']
+    DEFAULT_THRESHOLD = config['default_threshold']
+    ANALYSIS_SIZE = tuple(config['analysis_size'])
+    IMGSZ = config['imgsz']
 
-    # 2. MULTI-FRAME ANALYSIS
-    print("\n" + "="*50)
-    print("� ROBUSTNESS PHASE: MULTI-FRAME AGGREGATION")
-    print("="*50)
+def detect_frame(model, frame, refiner=None):
+    """
+    Runs detection on one frame and applies the class-aware thresholds.
     
-    model = YOLO('yolov8n.pt')
+    Returns:
+        list: Detection dicts with 'class', 'box', 'conf' and 'center'
+              ('frame_idx' is filled in when a window is aggregated).
+    """
+    frame_detections = []
     
-    # Store all detections from all frames
-    # Structure: { 'frame_idx': int, 'class': str, 'box': tuple, 'conf': float, 'center': tuple }
-    all_detections = []
+    start = time.perf_counter()
+    results = model(frame, imgsz=IMGSZ, conf=min(SMALL_OBJECT_THRESHOLD, PERSON_THRESHOLD, DEFAULT_THRESHOLD),
+                    classes=DETECT_CLASSES, verbose=False) # valid=False to reduce spam
+    result = results[0]
+    boxes, confs, class_ids = detections.result_to_arrays(result)
     
-    # Use the last frame as the "Reference Frame" for display
-    reference_frame_idx = len(frame_buffer) - 1
-    reference_image = frame_buffer[reference_frame_idx].copy()
+    # Two-pass mode: high-resolution crops around candidate risk regions
+    if refiner is not None:
+        boxes, confs, class_ids = refiner.refine(frame, boxes, confs, class_ids, result.names,
+                                                 base_time=time.perf_counter() - start)
     
-    print(f"Analyzing {len(frame_buffer)} frames...")
-    
-    for f_idx, frame in enumerate(frame_buffer):
-        results = model(frame, verbose=False) # valid=False to reduce spam
-        result = results[0]
+    for (x1, y1, x2, y2), conf, cls_id in zip(boxes.astype(int).tolist(), confs.tolist(), class_ids.tolist()):
+        cls_name = result.names[cls_id]
         
-        for box in result.boxes:
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            cls_id = int(box.cls[0].item())
-            cls_name = result.names[cls_id]
-            conf = box.conf[0].item()
-            
-            # --- DEBUG LOGGING (Before Threshold) ---
-            # print(f"DEBUG: Frame {f_idx} Raw: {cls_name} ({conf:.2f})")
+        # --- DEBUG LOGGING (Before Threshold) ---
+        # print(f"DEBUG: Raw: {cls_name} ({conf:.2f})")
+        
+        # --- CLASS-AWARE THRESHOLDING ---
+        thresh = get_confidence_threshold(cls_name)
+        if conf >= thresh:
+            cx = (x1 + x2) // 2
+            cy = (y1 + y2) // 2
             
-            # --- CLASS-AWARE THRESHOLDING ---
-            thresh = get_confidence_threshold(cls_name)
-            if conf >= thresh:
-                cx = (x1 + x2) // 2
-                cy = (y1 + y2) // 2
-                
-                all_detections.append({
-                    'frame_idx': f_idx,
-                    'class': cls_name,
-                    'box': (x1, y1, x2, y2),
-                    'conf': conf,
-                    'center': (cx, cy)
-                })
-                # print(f"  -> ACCEPTED (Thresh {thresh})")
-            else:
-                pass
-                # print(f"  -> REJECTED (Thresh {thresh})")
+            frame_detections.append({
+                'class': cls_name,
+                'box': (x1, y1, x2, y2),
+                'conf': conf,
+                'center': (cx, cy)
+            })
+            # print(f"  -> ACCEPTED (Thresh {thresh})")
+        else:
+            pass
+            # print(f"  -> REJECTED (Thresh {thresh})")
 
+    return frame_detections
+
+
+def aggregate_detections(all_detections, reference_frame_idx, n_frames):
+    """
+    Groups detections across the temporal window and keeps the stable ones.
+    
+    Args:
+        all_detections (list): Detection dicts with 'frame_idx' set.
+        reference_frame_idx (int): Index of the frame used for display.
+        n_frames (int): Number of frames in the window.
+        
+    Returns:
+        list: Confirmed object dicts.
+    """
     # 3. AGGREGATION LOGIC
     # Group detections that are spatially close and same class
     print(f"\nAggregating {len(all_detections)} candidates across temporal buffer...")
@@ -173,7 +179,7 @@ def main():
         cls_name = rep['class']
         
         status = "CONFIRMED" if count >= CONFIRMATION_THRESHOLD_FRAMES else "DISCARDED (Transient/Noise)"
-        print(f"Object '{cls_name}': Seen in {count}/{BUFFER_SIZE} frames -> {status}")
+        print(f"Object '{cls_name}': Seen in {count}/{n_frames} frames -> {status}")
         
         if count >= CONFIRMATION_THRESHOLD_FRAMES:
             # Select the detection from the Reference Frame (most recent) if available,
@@ -205,6 +211,13 @@ def main():
                 "frames_count": count
             })
 
+    return confirmed_objects
+
+
+def run_pipeline(confirmed_objects, reference_image, n_frames):
+    """
+    Runs Phases 2-4 on the confirmed objects and draws them on `reference_image`.
+    """
     # 4. RUN ESUA PIPELINE ON CONFIRMED OBJECTS
     print("\n" + "="*50)
     print("🚀 RUNNING ESUA PIPELINE (Spatial & Risk)")
@@ -235,17 +248,18 @@ def main():
             "conf": obj['conf']
         })
         
-        print(f"• {obj['display_name']} (Stability: {obj['frames_count']}/5 frames)")
+        print(f"• {obj['display_name']} (Stability: {obj['frames_count']}/{n_frames} frames)")
 
     # Spatial Logic (Phase 2)
+    # Uncategorized (display-only) objects are drawn above but never paired
     print("\n[Phase 2] Spatial Relationships:")
-    NEAR_THRESHOLD = 400
     relationships = []
+    reasoning_objects = [obj for obj in processed_objects if obj['categories']]
     
-    for i in range(len(processed_objects)):
-        for j in range(i + 1, len(processed_objects)):
-            obj_a = processed_objects[i]
-            obj_b = processed_objects[j]
+    for i in range(len(reasoning_objects)):
+        for j in range(i + 1, len(reasoning_objects)):
+            obj_a = reasoning_objects[i]
+            obj_b = reasoning_objects[j]
             
             dist = math.sqrt((obj_a['center'][0] - obj_b['center'][0])**2 + 
                              (obj_a['center'][1] - obj_b['center'][1])**2)
@@ -304,14 +318,215 @@ def main():
     if not risks_found:
         print("✅ No immediate risks detected.")
 
-    # Save and Show
-    output_path = 'ESUA/phase6_camera_integration/result_robust.jpg'
-    cv2.imwrite(output_path, reference_image)
-    print(f"\nSaved robust analysis result to {output_path}")
+    return reference_image
+
+
+class BurstWorker(threading.Thread):
+    """
+    Keeps the model warm and runs rolling detections in the background.
+    
+    The worker always analyzes the newest pooled frame, so the detections for
+    the last BUFFER_SIZE analyzed frames already exist when 'c' is pressed.
+    The live view never waits for inference.
+    
+    The worker copies each frame into its own preallocated buffer before
+    inference, so the live loop can keep recycling pool slots meanwhile.
+    """
+    
+    def __init__(self, model, pool, refiner=None, window_size=None, cpus=None):
+        super().__init__(name='burst-worker', daemon=True)
+        self.model = model
+        self.pool = pool
+        self.refiner = refiner
+        self.cpus = cpus  # Detector cores to pin to (None = no pinning)
+        self.window = collections.deque(maxlen=window_size or BUFFER_SIZE)  # (seq, detections)
+        w, h = pool.size
+        self._input = np.empty((h, w, 3), dtype=np.uint8)
+        self._analyzed = np.empty((h, w, 3), dtype=np.uint8)  # Newest analyzed frame
+        self._latest_seq = -1
+        self._cond = threading.Condition()
+        self._running = True
+        
+    def submit(self, seq):
+        """
+        Offers the newest pooled frame; older unprocessed frames are simply skipped.
+        """
+        with self._cond:
+            self._latest_seq = seq
+            self._cond.notify()
+            
+    def run(self):
+        thread_budget.pin_thread(self.cpus)
+        done_seq = -1
+        while True:
+            with self._cond:
+                while self._running and self._latest_seq == done_seq:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                done_seq = self._latest_seq
+                
+            frame = self.pool.get(done_seq)
+            if frame is None:
+                continue
+            np.copyto(self._input, frame)
+            
+            frame_detections = detect_frame(self.model, self._input, self.refiner)
+            with self._cond:
+                self.window.append((done_seq, frame_detections))
+                self._input, self._analyzed = self._analyzed, self._input
+                
+    def snapshot(self, reference_out):
+        """
+        Copies the newest analyzed frame into `reference_out`.
+        
+        Returns:
+            list: Per-frame detection lists of the current window (oldest first).
+        """
+        with self._cond:
+            if self.window:
+                np.copyto(reference_out, self._analyzed)
+            return [frame_detections for _, frame_detections in self.window]
+            
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.join()
+
+
+def analyze_window(window, reference_image):
+    """
+    Aggregates an analyzed window and runs the ESUA pipeline on it.
+    
+    Args:
+        window (list): Per-frame detection lists, oldest first.
+        reference_image (np.ndarray): The newest analyzed frame; drawn on in place.
+    
+    Returns:
+        np.ndarray: The annotated reference image.
+    """
+    print("\n" + "="*50)
+    print("� ROBUSTNESS PHASE: MULTI-FRAME AGGREGATION")
+    print("="*50)
+    
+    # Store all detections from all frames
+    # Structure: { 'frame_idx': int, 'class': str, 'box': tuple, 'conf': float, 'center': tuple }
+    all_detections = []
+    for f_idx, frame_detections in enumerate(window):
+        for det in frame_detections:
+            all_detections.append(dict(det, frame_idx=f_idx))
+    
+    # The last frame is the "Reference Frame" for display
+    reference_frame_idx = len(window) - 1
+    
+    confirmed_objects = aggregate_detections(all_detections, reference_frame_idx, len(window))
+    return run_pipeline(confirmed_objects, reference_image, len(window))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESUA multi-frame snapshot analyzer.")
+    recording.add_source_arguments(parser, record=False)
+    parser.add_argument('--serve', type=int, metavar='PORT', help="Stream the live feed over local HTTP (MJPEG)")
+    parser.add_argument('--preview-fps', type=float, default=preview_server.MAX_FPS,
+                        help="Encode rate cap for --serve")
+    parser.add_argument('--headless', action='store_true',
+                        help="No window; capture with GET /capture on the --serve port, stop with Ctrl+C")
+    args = parser.parse_args()
+    if args.headless and not args.serve:
+        parser.error("--headless needs --serve (captures are requested over HTTP)")
+    
+    print("Initializing Robust ESUA Camera System...")
+    if args.headless:
+        print(f"Controls:\n  http://127.0.0.1:{args.serve}/capture - Capture (Multi-Frame Analysis)\n  Ctrl+C - Quit")
+    else:
+        print("Controls:\n  'c' - Capture (Multi-Frame Analysis)\n  'q' - Quit")
+    
+    config = runtime_config.load_config()
+    apply_config(config)
+    
+    # CPU budget: torch gets the detector cores, OpenCV the capture cores
+    stream_plan = thread_budget.setup('snapshot', config)
     
-    cv2.imshow('ESUA Robust Analysis', reference_image)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    # 1. MODEL SETUP (loaded once, kept warm by the background worker)
+    global DETECT_CLASSES
+    model = YOLO('yolov8n.pt')
+    if CLASS_FILTER:
+        DETECT_CLASSES = object_categories.class_ids_for(model.names)
+    refiner = crop_refinement.CropRefiner(model, classes=DETECT_CLASSES) if HIGH_RES_REFINEMENT else None
+    
+    # 2. CAMERA SETUP
+    cap = recording.open_runner_source(args)
+    if not cap.isOpened():
+        print("Error: Could not open camera.")
+        return
+    
+    # Preallocated frame ring: no per-frame allocation in steady state
+    pool = frame_pool.FramePool(POOL_CAPACITY, ANALYSIS_SIZE)
+    reference_image = np.empty((ANALYSIS_SIZE[1], ANALYSIS_SIZE[0], 3), dtype=np.uint8)
+    
+    worker = BurstWorker(model, pool, refiner, cpus=stream_plan['detector'] if config['cpu_affinity'] else None)
+    worker.start()
+    if config['cpu_affinity']:
+        thread_budget.pin_thread(stream_plan['capture'])  # This thread only captures and displays
+    
+    snapshots = 0
+    
+    # Preview server: the live feed for any number of browsers, encoded once per frame
+    preview = None
+    if args.serve:
+        preview = preview_server.PreviewServer(args.serve, max_fps=args.preview_fps, commands=['capture']).start()
+    stop = threading.Event()
+    if args.headless:
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    
+    while not stop.is_set():
+        ret, seq, frame = pool.read(cap)
+        if not ret:
+            break
+        
+        # Hand the newest frame to the background worker
+        worker.submit(seq)
+        
+        # Display
+        if preview is not None:
+            preview.publish(frame)
+        if args.headless:
+            key = ord('c') if preview.take_command('capture') else 0
+        else:
+            cv2.imshow('ESUA Live Feed (Buffering 5 Frames)', frame)
+            key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+        elif key == ord('c'):
+            window = worker.snapshot(reference_image)
+            if len(window) < BUFFER_SIZE:
+                print("Buffer filling... wait a moment.")
+                continue
+            
+            # The multi-frame detections already exist: only aggregation and rules run here
+            print("Capturing burst of frames for analysis...")
+            start = time.perf_counter()
+            analyze_window(window, reference_image)
+            snapshots += 1
+            
+            if refiner is not None:
+                print(refiner.report())
+            
+            # Save and Show (the camera keeps running for further snapshots)
+            cv2.imwrite(OUTPUT_PATH, reference_image)
+            print(f"\nSaved robust analysis result to {OUTPUT_PATH} "
+                  f"(snapshot #{snapshots}, ready in {1e3 * (time.perf_counter() - start):.0f}ms)")
+            if not args.headless:
+                cv2.imshow('ESUA Robust Analysis', reference_image)
+    
+    worker.stop()
+    cap.release()
+    if preview is not None:
+        preview.close()
+        print(preview.report())
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
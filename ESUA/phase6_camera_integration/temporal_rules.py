@@ -0,0 +1,280 @@
+# Temporal Risk Rules: duration and persistence
+
+# risk_rules only sees one instant, so a cup that brushes past a laptop raises
+# the same warning as one left beside it for an hour. The rules below look at
+# how long a situation has lasted:
+#
+#   pair        - a risk pair (e.g. spill_risk) between the *same two tracked
+#                 objects* has lasted at least min_duration seconds
+#   unattended  - an object of a category (e.g. sharp) has stayed in view for
+#                 min_duration seconds without a person within attend_distance
+#
+# Objects get a track id from a small nearest-centre tracker, and rule state is
+# keyed by track ids. Risk pairs built from other detections (e.g. the
+# detector cascade's larger model) are mapped onto the tracked objects by
+# class and nearest centre; pairs with no tracked counterpart are skipped. Each state is a handful of running counters plus a
+# HISTORY_SAMPLES-bit presence ring (one int), so evaluation is O(active
+# states) per analyzed frame. States and tracks that go unseen for
+# EXIT_MISSES / TRACK_MAX_MISSES analyzed frames are evicted, which bounds
+# memory however long the runner stays up. Misses are counted in analyzed
+# frames, not seconds, so a static scene the motion gate stops analyzing keeps
+# its state (and its duration keeps growing).
+#
+# Usage:
+#   engine = TemporalRuleEngine()
+#   for event in engine.update(objects, risk_pairs, now): ...
+
+import time
+import explanation_templates
+
+# --- CONFIGURATION ---
+TEMPORAL_RULES = {
+    'prolonged_spill_risk': {'type': 'pair', 'risk_type': 'spill_risk', 'min_duration': 30.0},
+    'prolonged_damage_risk': {'type': 'pair', 'risk_type': 'damage_risk', 'min_duration': 120.0},
+    'unattended_sharp': {'type': 'unattended', 'category': 'sharp', 'min_duration': 60.0,
+                         'attendant': 'person', 'attend_distance': 250}
+}
+TRACK_MATCH_DISTANCE = 60   # Pixels a tracked object may move between analyzed frames
+TRACK_MAX_MISSES = 5        # Analyzed frames a track survives without a matching detection
+EXIT_MISSES = 3             # Analyzed frames a rule state survives without its condition
+HISTORY_SAMPLES = 32        # Presence ring size (analyzed frames)
+MIN_PRESENCE = 0.6          # Fraction of the ring the condition must have held to fire
+
+
+class ObjectTracker:
+    """
+    Gives detections stable 'track_id's: greedy nearest-centre matching per class.
+    """
+
+    def __init__(self, match_distance=TRACK_MATCH_DISTANCE, max_misses=TRACK_MAX_MISSES):
+        self.match_distance = match_distance
+        self.max_misses = max_misses
+        self._tracks = {}  # id -> [name, (cx, cy), misses]
+        self._next_id = 1
+
+    def update(self, objects):
+        """
+        Sets obj['track_id'] on every object (in place).
+        """
+        max_d2 = self.match_distance ** 2
+        candidates = []
+        for i, obj in enumerate(objects):
+            cx, cy = obj['center']
+            for track_id, (name, (tx, ty), _) in self._tracks.items():
+                if name == obj['name']:
+                    d2 = (cx - tx) ** 2 + (cy - ty) ** 2
+                    if d2 <= max_d2:
+                        candidates.append((d2, i, track_id))
+        candidates.sort()
+
+        matched_objects, matched_tracks = set(), set()
+        for _, i, track_id in candidates:
+            if i in matched_objects or track_id in matched_tracks:
+                continue
+            matched_objects.add(i)
+            matched_tracks.add(track_id)
+            objects[i]['track_id'] = track_id
+            self._tracks[track_id] = [objects[i]['name'], objects[i]['center'], 0]
+
+        for i, obj in enumerate(objects):
+            if i not in matched_objects:
+                obj['track_id'] = self._next_id
+                self._tracks[self._next_id] = [obj['name'], obj['center'], 0]
+                matched_tracks.add(self._next_id)
+                self._next_id += 1
+
+        for track_id in list(self._tracks):
+            if track_id not in matched_tracks:
+                track = self._tracks[track_id]
+                track[2] += 1
+                if track[2] > self.max_misses:
+                    del self._tracks[track_id]
+
+    def __len__(self):
+        return len(self._tracks)
+
+
+class _RuleState:
+    __slots__ = ('rule', 'obj_a', 'obj_b', 'first_seen', 'last_seen', 'history', 'samples',
+                 'misses', 'fired', 'text')
+
+    def __init__(self, rule, now):
+        self.rule = rule
+        self.obj_a = None
+        self.obj_b = None
+        self.first_seen = now
+        self.last_seen = now
+        self.history = 0       # Presence ring: bit i = condition held i analyzed frames ago
+        self.samples = 1       # Analyzed frames covered by the ring, including this one
+        self.misses = 0
+        self.fired = False
+        self.text = None
+
+    def presence(self):
+        return bin(self.history).count('1') / min(self.samples, HISTORY_SAMPLES)
+
+
+class TemporalRuleEngine:
+    """
+    Evaluates TEMPORAL_RULES and emits 'onset' / 'resolved' events in the same
+    format as risk_events.RiskEventTracker (risk_type is the rule name).
+    """
+
+    def __init__(self, rules=TEMPORAL_RULES, exit_misses=EXIT_MISSES, min_presence=MIN_PRESENCE,
+                 explain=explanation_templates.get_explanation):
+        """
+        Args:
+            explain (callable): (risk_type, context) -> explanation text, e.g. a
+                hot-reloaded rule_config.RuleTables.explain.
+        """
+        self.rules = rules
+        self.explain = explain
+        self.exit_misses = exit_misses
+        self.min_presence = min_presence
+        self.tracker = ObjectTracker()
+        self._states = {}  # (rule, track id(s)) -> _RuleState
+        self._mask = (1 << HISTORY_SAMPLES) - 1
+
+        # Statistics
+        self.updates = 0
+        self.evaluated = 0      # State evaluations (sum of active states over updates)
+        self.peak_states = 0
+        self.fired = 0
+        self.update_time = 0.0
+
+    def _observe(self, key, rule, obj_a, obj_b, now, seen):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _RuleState(rule, now)
+        state.obj_a = obj_a
+        state.obj_b = obj_b
+        state.last_seen = now
+        state.history |= 1
+        state.misses = 0
+        seen.add(key)
+
+    def _event(self, kind, state, now):
+        obj_b = state.obj_b
+        return {
+            'event': kind,
+            'risk_type': state.rule,
+            'obj_a': state.obj_a['name'],
+            'obj_b': obj_b['name'] if obj_b is not None else None,
+            'box_a': state.obj_a.get('box'),
+            'box_b': obj_b.get('box') if obj_b is not None else None,
+            'start': state.first_seen,
+            'time': now,
+            'duration': now - state.first_seen,
+            'text': state.text
+        }
+
+    def _tracked(self, obj, objects):
+        """
+        Returns the tracked object `obj` stands for: itself if it has a track id,
+        else the nearest tracked object of the same class within match distance.
+        """
+        if 'track_id' in obj:
+            return obj
+        cx, cy = obj['center']
+        best, best_d2 = None, self.tracker.match_distance ** 2
+        for other in objects:
+            if other['name'] == obj['name']:
+                d2 = (cx - other['center'][0]) ** 2 + (cy - other['center'][1]) ** 2
+                if d2 <= best_d2:
+                    best, best_d2 = other, d2
+        return best
+
+    def _describe(self, state, now):
+        full = self.explain(state.rule, {
+            'obj_a': state.obj_a['name'],
+            'obj_b': state.obj_b['name'] if state.obj_b is not None else 'nobody',
+            'minutes': f"{(now - state.first_seen) / 60:.1f}"
+        })
+        lines = full.split('\n')
+        return f"⏱️ {lines[0]} -> {lines[-1]}"
+
+    def update(self, objects, risk_pairs, now=None):
+        """
+        Feeds one analyzed frame.
+
+        Args:
+            objects (list): All object dicts of the frame (attendants such as
+                'person' included); 'track_id' is set on them.
+            risk_pairs (list): (risk_type, obj_a, obj_b) tuples; objects that are not
+                in `objects` (no 'track_id') are matched to the nearest tracked
+                object of their class, and pairs without a match are ignored.
+            now (float): Timestamp in seconds (defaults to time.time()).
+
+        Returns:
+            list: 'onset' and 'resolved' event dicts produced by this frame.
+        """
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        self.tracker.update(objects)
+        events = []
+
+        # Age every ring by one analyzed frame; _observe() sets the new bit
+        for state in self._states.values():
+            state.history = (state.history << 1) & self._mask
+            state.samples += 1
+
+        seen = set()
+        for rule, spec in self.rules.items():
+            if spec['type'] == 'pair':
+                for risk_type, obj_a, obj_b in risk_pairs:
+                    if risk_type == spec['risk_type']:
+                        obj_a, obj_b = self._tracked(obj_a, objects), self._tracked(obj_b, objects)
+                        if obj_a is None or obj_b is None:
+                            continue
+                        key = (rule, obj_a['track_id'], obj_b['track_id'])
+                        self._observe(key, rule, obj_a, obj_b, now, seen)
+
+            elif spec['type'] == 'unattended':
+                attendants = [obj['center'] for obj in objects if obj['name'] == spec['attendant']]
+                max_d2 = spec['attend_distance'] ** 2
+                for obj in objects:
+                    if spec['category'] not in obj['categories']:
+                        continue
+                    key = (rule, obj['track_id'])
+                    cx, cy = obj['center']
+                    if any((cx - px) ** 2 + (cy - py) ** 2 <= max_d2 for px, py in attendants):
+                        # Someone is next to it: the clock starts over
+                        state = self._states.pop(key, None)
+                        if state is not None and state.fired:
+                            events.append(self._event('resolved', state, now))
+                        continue
+                    self._observe(key, rule, obj, None, now, seen)
+
+        for key in list(self._states):
+            state = self._states[key]
+            if key not in seen:
+                state.misses += 1
+                if state.misses >= self.exit_misses:
+                    if state.fired:
+                        events.append(self._event('resolved', state, state.last_seen))
+                    del self._states[key]
+                continue
+            if not state.fired and now - state.first_seen >= self.rules[state.rule]['min_duration'] \
+                    and state.presence() >= self.min_presence:
+                state.fired = True
+                state.text = self._describe(state, now)
+                self.fired += 1
+                events.append(self._event('onset', state, now))
+
+        self.updates += 1
+        self.evaluated += len(self._states)
+        self.peak_states = max(self.peak_states, len(self._states))
+        self.update_time += time.perf_counter() - start
+        return events
+
+    def active(self):
+        """
+        Returns the display texts of the rules currently firing.
+        """
+        return [state.text for state in self._states.values() if state.fired]
+
+    def report(self):
+        avg_us = 1e6 * self.update_time / self.updates if self.updates else 0.0
+        avg_states = self.evaluated / self.updates if self.updates else 0.0
+        return (f"Temporal rules: {self.fired} fired over {self.updates} frames | {avg_states:.1f} active states "
+                f"on average (peak {self.peak_states}), {len(self.tracker)} live tracks, {avg_us:.1f}us/frame")
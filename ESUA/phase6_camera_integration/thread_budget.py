@@ -0,0 +1,353 @@
+# CPU Thread Budget Planner
+
+# By default torch sizes its intra-op pool to all cores, OpenCV sizes its own
+# pool to all cores, and our worker threads (burst worker, cascade, event store,
+# service executors) come on top. With several streams/processes on one box the
+# pools oversubscribe the cores and throughput drops as processes are added.
+#
+# The planner splits the available cores into one slice per stream and each
+# slice into capture / detector / reasoning budgets:
+#   capture   -> cv2.setNumThreads (decode, resize) and the capture thread
+#   detector  -> torch.set_num_threads (YOLO inference) and the detector thread
+#   reasoning -> rules / templates / storage worker threads
+# Optionally every thread is pinned to its cores (Linux sched_setaffinity).
+#
+# `calibrate` measures end-to-end throughput of a capture -> detect -> reason
+# pipeline for several splits (one process per stream, all running at once)
+# and saves the best split to esua_config.json.
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/thread_budget.py plan --mode live --streams 2
+#   python ESUA/phase6_camera_integration/thread_budget.py calibrate --video clip.mp4 --streams 2
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import runtime_config
+
+# --- CONFIGURATION ---
+ROLES = ('capture', 'detector', 'reasoning')
+# Default core weights per mode (capture, detector, reasoning)
+MODE_SPLITS = {
+    'live': (1, 6, 1),       # Capture + display, detection on the main loop, light rules
+    'snapshot': (1, 6, 1),   # Live view + background burst worker
+    'service': (2, 5, 1)     # Image decoding is a real share of the work
+}
+CALIBRATION_SECONDS = 15
+CALIBRATION_MODEL = 'yolov8n.pt'
+
+
+def available_cpus():
+    """
+    Returns the sorted list of CPU ids this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_budget(mode='live', streams=1, split=None, cpus=None):
+    """
+    Splits the available cores between streams and pipeline roles.
+
+    Every role gets at least one core. When a stream's slice has fewer cores
+    than roles, roles share cores instead of oversubscribing other streams.
+
+    Args:
+        mode (str): 'live', 'snapshot' or 'service'.
+        streams (int): Camera streams / processes sharing the machine.
+        split (list): Core weights (capture, detector, reasoning); None = mode default.
+        cpus (list): CPU ids to plan for; None = available_cpus().
+
+    Returns:
+        dict: {'mode', 'streams', 'split', 'stream_plans'} where each stream
+        plan maps 'cpus' and every role to a list of CPU ids.
+    """
+    cpus = available_cpus() if cpus is None else list(cpus)
+    split = tuple(split) if split else MODE_SPLITS[mode]
+    if len(split) != len(ROLES) or min(split) <= 0:
+        raise ValueError(f"Thread split must be {len(ROLES)} positive weights, got {split}")
+
+    per_stream = max(1, len(cpus) // streams)
+    stream_plans = []
+    for s in range(streams):
+        if per_stream * streams <= len(cpus):
+            slice_cpus = cpus[s * per_stream:(s + 1) * per_stream]
+        else:
+            slice_cpus = [cpus[s % len(cpus)]]  # More streams than cores
+
+        n = len(slice_cpus)
+        capture = max(1, round(n * split[0] / sum(split)))
+        reasoning = max(1, round(n * split[2] / sum(split)))
+        detector = max(1, n - capture - reasoning)
+
+        # Hand out cores: detector first (largest), then capture, then reasoning;
+        # wrap around when the slice is too small so roles share cores
+        plan = {'cpus': slice_cpus}
+        pos = 0
+        for role, count in (('detector', detector), ('capture', capture), ('reasoning', reasoning)):
+            plan[role] = [slice_cpus[(pos + i) % n] for i in range(count)]
+            pos += count
+        stream_plans.append(plan)
+
+    return {'mode': mode, 'streams': streams, 'split': list(split), 'stream_plans': stream_plans}
+
+
+def pin_thread(cpus):
+    """
+    Restricts the calling thread (and threads it starts later) to `cpus`.
+
+    No-op where CPU affinity is unsupported (macOS, Windows).
+    """
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        # On Linux pid 0 means the calling thread, not the whole process
+        os.sched_setaffinity(0, set(cpus))
+
+
+def apply_budget(plan, stream=0, affinity=False):
+    """
+    Applies a plan to this process (call once at startup, before loading models).
+
+    Sets the torch intra-op pool to the detector budget, torch inter-op to 1,
+    OpenCV's pool to the capture budget and, with `affinity`, pins the process
+    to the stream's cores.
+
+    Returns:
+        dict: The stream plan that was applied.
+    """
+    stream_plan = plan['stream_plans'][stream % len(plan['stream_plans'])]
+
+    if affinity:
+        pin_thread(stream_plan['cpus'])
+
+    cv2.setNumThreads(len(stream_plan['capture']))
+    try:
+        import torch
+        torch.set_num_threads(len(stream_plan['detector']))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Only allowed before the first parallel op; intra-op limit still applies
+    except ImportError:
+        pass
+
+    return stream_plan
+
+
+def setup(mode, config, stream=0):
+    """
+    Plans and applies the budget stored in a runtime config.
+
+    Returns:
+        dict: The applied stream plan (role -> CPU ids).
+    """
+    plan = plan_budget(mode, config['streams'], config['thread_split'])
+    stream_plan = apply_budget(plan, stream, config['cpu_affinity'])
+    print(f"Thread budget ({mode}, stream {stream % plan['streams'] + 1}/{plan['streams']}): " +
+          ", ".join(f"{role} {len(stream_plan[role])}" for role in ROLES) +
+          (f" | pinned to CPUs {stream_plan['cpus']}" if config['cpu_affinity'] else ""))
+    return stream_plan
+
+
+# --- CALIBRATION ---
+
+def benchmark_pipeline(model, video_path, seconds, stream_plan=None, affinity=False, imgsz=640,
+                       analysis_size=(640, 480), near_threshold=300):
+    """
+    Runs capture -> detect -> reason for `seconds` and returns frames/second.
+
+    Capture and reasoning run on their own threads; detection runs on the
+    calling thread. With a stream plan and `affinity`, each thread pins itself
+    to its role's cores.
+    """
+    import detections
+    import frame_pool
+    import recording
+    import risk_rules
+
+    pool = frame_pool.FramePool(8, analysis_size)
+    frames = queue.Queue(maxsize=4)     # Pool sequence numbers
+    results = queue.Queue(maxsize=4)
+    stop = threading.Event()
+    reasoned = [0]
+
+    def pin(role):
+        if stream_plan and affinity:
+            pin_thread(stream_plan[role])
+
+    def capture():
+        pin('capture')
+        cap = recording.open_source(video_path)
+        while not stop.is_set():
+            ok, seq, _ = pool.read(cap)
+            if not ok:
+                cap.release()
+                cap = recording.open_source(video_path)  # Loop the recording
+                continue
+            while not stop.is_set():
+                try:
+                    frames.put(seq, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+        cap.release()
+
+    def reason():
+        pin('reasoning')
+        while not stop.is_set():
+            try:
+                boxes, confs, class_ids, names = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            objects = detections.to_objects(boxes, confs, class_ids, names)
+            risk_rules.find_risk_pairs(objects, near_threshold)
+            reasoned[0] += 1
+
+    threads = [threading.Thread(target=capture, daemon=True), threading.Thread(target=reason, daemon=True)]
+    for t in threads:
+        t.start()
+    pin('detector')
+
+    # Warm-up (first call builds the model graph)
+    warm = frames.get()
+    model(pool.get(warm), imgsz=imgsz, verbose=False)
+
+    start = time.perf_counter()
+    counted_from = reasoned[0]
+    while time.perf_counter() - start < seconds:
+        seq = frames.get()
+        frame = pool.get(seq)
+        if frame is None:
+            continue  # Recycled while waiting
+        result = model(frame, imgsz=imgsz, verbose=False)[0]
+        results.put(detections.result_to_arrays(result) + (result.names,))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for t in threads:
+        t.join()
+    return (reasoned[0] - counted_from) / elapsed
+
+
+def candidate_splits(cores_per_stream):
+    """
+    Splits (capture, detector, reasoning) worth measuring for a slice size.
+    """
+    splits = []
+    for capture in (1, 2):
+        for reasoning in (1, 2):
+            detector = cores_per_stream - capture - reasoning
+            if detector >= 1:
+                splits.append([capture, detector, reasoning])
+    return splits or [[1, 1, 1]]
+
+
+def run_streams(args, split, affinity, managed=True):
+    """
+    Runs one benchmark process per stream at the same time; returns total FPS.
+    """
+    procs = []
+    for stream in range(args.streams):
+        cmd = [sys.executable, os.path.abspath(__file__), 'bench', '--video', args.video,
+               '--model', args.model, '--mode', args.mode, '--streams', str(args.streams),
+               '--stream', str(stream), '--seconds', str(args.seconds)]
+        if managed:
+            cmd += ['--split', ','.join(str(v) for v in split)]
+        if affinity:
+            cmd.append('--affinity')
+        procs.append(subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True))
+
+    total = 0.0
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"Benchmark process failed (exit {proc.returncode})")
+        total += json.loads(out.strip().splitlines()[-1])['fps']
+    return total
+
+
+def calibrate(args):
+    per_stream = max(1, len(available_cpus()) // args.streams)
+    affinity_options = [False, True] if hasattr(os, 'sched_setaffinity') else [False]
+    print(f"Calibrating {args.mode} with {args.streams} stream(s), {per_stream} core(s) each, "
+          f"{args.seconds:.0f}s per run...")
+
+    baseline = run_streams(args, None, False, managed=False)
+    print(f"{'unmanaged':>22} | {baseline:7.1f} FPS total")
+
+    best = None
+    for split in candidate_splits(per_stream):
+        for affinity in affinity_options:
+            fps = run_streams(args, split, affinity)
+            label = f"{split}{' pinned' if affinity else ''}"
+            print(f"{label:>22} | {fps:7.1f} FPS total")
+            if best is None or fps > best[0]:
+                best = (fps, split, affinity)
+
+    fps, split, affinity = best
+    if fps <= baseline:
+        print("\nNo split beat the unmanaged baseline; nothing saved.")
+        return
+
+    config = runtime_config.load_config(args.config)
+    config.update(thread_split=split, cpu_affinity=affinity, streams=args.streams)
+    runtime_config.save_config(config, args.config)
+    print(f"\n✅ Best split {split}{' (pinned)' if affinity else ''}: {fps:.1f} FPS "
+          f"({fps / baseline:.2f}x unmanaged). Saved to {args.config}")
+
+
+def bench(args):
+    config = runtime_config.load_config(None)
+    stream_plan = None
+    if args.split:
+        plan = plan_budget(args.mode, args.streams, [int(v) for v in args.split.split(',')])
+        stream_plan = apply_budget(plan, args.stream, args.affinity)
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    fps = benchmark_pipeline(model, args.video, args.seconds, stream_plan, args.affinity,
+                             config['imgsz'], tuple(config['analysis_size']), config['near_threshold'])
+    print(json.dumps({'fps': fps}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan and calibrate CPU thread budgets.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    plan_cmd = sub.add_parser('plan', help="Show the core assignment for a mode")
+    cal_cmd = sub.add_parser('calibrate', help="Measure splits and save the best one")
+    bench_cmd = sub.add_parser('bench', help=argparse.SUPPRESS)
+    for p in (plan_cmd, cal_cmd, bench_cmd):
+        p.add_argument('--mode', choices=sorted(MODE_SPLITS), default='live')
+        p.add_argument('--streams', type=int, default=1)
+    for p in (cal_cmd, bench_cmd):
+        p.add_argument('--video', required=True, help="Recording used as the camera")
+        p.add_argument('--model', default=CALIBRATION_MODEL)
+        p.add_argument('--seconds', type=float, default=CALIBRATION_SECONDS)
+    plan_cmd.add_argument('--split', help="capture,detector,reasoning weights")
+    cal_cmd.add_argument('--config', default=runtime_config.CONFIG_PATH)
+    bench_cmd.add_argument('--stream', type=int, default=0)
+    bench_cmd.add_argument('--split')
+    bench_cmd.add_argument('--affinity', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        split = [float(v) for v in args.split.split(',')] if args.split else None
+        plan = plan_budget(args.mode, args.streams, split)
+        print(f"{len(available_cpus())} CPUs, mode {plan['mode']}, split {plan['split']}")
+        for s, stream_plan in enumerate(plan['stream_plans']):
+            print(f"  stream {s}: " + " | ".join(f"{role} {stream_plan[role]}" for role in ROLES))
+    elif args.command == 'calibrate':
+        calibrate(args)
+    else:
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# Offline Video Annotator: headless, pipelined decode -> detect -> reason/draw -> encode
+
+# Annotates recorded footage (video files or recording directories) with boxes
+# and risk overlays and writes an annotated video plus a JSONL track of risk
+# events. No window is opened.
+#
+# Each stage runs on its own thread, connected by bounded queues, so decoding,
+# inference and encoding overlap instead of taking turns:
+#
+#   decode --q--> detect (batches of BATCH_SIZE) --q--> reason + draw --q--> encode
+#
+# Every stage records how long it was busy, waiting for input and blocked on a
+# full output queue; the report shows which stage is the bottleneck (the one
+# that is busy while the others wait).
+#
+# Usage:
+#   python ESUA/phase6_camera_integration/video_annotator.py clip.mp4 --out clip_annotated.mp4
+#   python ESUA/phase6_camera_integration/video_annotator.py recordings/desk --batch 8 --imgsz 480
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+import detections
+import explanation_templates
+import object_categories
+import recording
+import risk_events
+import risk_rules
+
+# --- CONFIGURATION ---
+QUEUE_SIZE = 16          # Items per queue between stages
+BATCH_SIZE = 8           # Frames per detector call
+IMGSZ = 640
+CONF = 0.25
+NEAR_THRESHOLD = 300
+DEFAULT_FPS = 30.0       # When the source does not report one
+FOURCC = 'mp4v'
+
+
+class Stage(threading.Thread):
+    """
+    One pipeline stage: takes items from `inbox` and runs `work` on each; work
+    passes results on with put(). None is the end-of-stream marker and is
+    passed on. Stages with a loop of their own (decode, batched detection)
+    override run() instead and take no `work`.
+    """
+
+    def __init__(self, name, inbox, outbox, work=None):
+        """
+        Args:
+            name (str): Stage name (thread name and report row).
+            inbox (queue.Queue): Input items (None for a source stage).
+            outbox (queue.Queue): Output items (None for a sink stage).
+            work (callable): item -> None, called once per input item.
+        """
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.work = work
+        self.items = 0
+        self.busy = 0.0       # Seconds processing
+        self.wait_in = 0.0    # Seconds waiting for input
+        self.wait_out = 0.0   # Seconds blocked on a full output queue
+        self.error = None
+        self.ended = False    # End-of-stream marker received
+
+    def get(self):
+        start = time.perf_counter()
+        item = self.inbox.get()
+        self.wait_in += time.perf_counter() - start
+        self.ended = item is None
+        return item
+
+    def put(self, item):
+        if self.outbox is None:
+            return
+        start = time.perf_counter()
+        self.outbox.put(item)
+        self.wait_out += time.perf_counter() - start
+
+    def finish(self):
+        """
+        Called once after the end-of-stream marker (flush partial work).
+        """
+
+    def fail(self, error):
+        """
+        Records an error and keeps draining the inbox, so upstream stages never
+        block on a queue nobody reads.
+        """
+        self.error = error
+        if self.inbox is not None and not self.ended:
+            while self.inbox.get() is not None:
+                pass
+
+    def run(self):
+        try:
+            while True:
+                item = self.get()
+                if item is None:
+                    start = time.perf_counter()
+                    self.finish()
+                    self.busy += time.perf_counter() - start
+                    break
+                start = time.perf_counter()
+                self.work(item)
+                self.busy += time.perf_counter() - start
+                self.items += 1
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.put(None)
+
+
+class DecodeStage(Stage):
+    """
+    Reads frames; the source plays the role of the inbox.
+    """
+
+    def __init__(self, cap, outbox, fps):
+        super().__init__('decode', None, outbox)
+        self.cap = cap
+        self.fps = fps
+        self._first_ts = None
+
+    def run(self):
+        try:
+            index = 0
+            while True:
+                start = time.perf_counter()
+                ok, frame = self.cap.read()
+                if not ok:
+                    self.busy += time.perf_counter() - start
+                    break
+                if isinstance(self.cap, recording.ReplayCapture):
+                    if self._first_ts is None:
+                        self._first_ts = self.cap.timestamp
+                    ts = self.cap.timestamp - self._first_ts
+                else:
+                    ts = index / self.fps
+                self.busy += time.perf_counter() - start
+                self.items += 1
+                self.put((index, ts, frame))
+                index += 1
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.put(None)
+
+
+class DetectStage(Stage):
+    """
+    Runs the detector on batches of up to `batch_size` frames.
+    """
+
+    def __init__(self, model, inbox, outbox, batch_size=BATCH_SIZE, imgsz=IMGSZ, conf=CONF):
+        super().__init__('detect', inbox, outbox)
+        self.model = model
+        self.batch_size = batch_size
+        self.imgsz = imgsz
+        self.conf = conf
+        self.classes = object_categories.class_ids_for(model.names)
+        self.batches = 0
+
+    def run(self):
+        try:
+            done = False
+            while not done:
+                # Block for the first frame, then take whatever is already queued
+                item = self.get()
+                if item is None:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        done = self.ended = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                results = self.model([frame for _, _, frame in batch], imgsz=self.imgsz, conf=self.conf,
+                                     classes=self.classes, verbose=False)
+                outputs = [detections.result_to_arrays(r) for r in results]
+                self.busy += time.perf_counter() - start
+                self.batches += 1
+                self.items += len(batch)
+                for (index, ts, frame), arrays in zip(batch, outputs):
+                    self.put((index, ts, frame) + arrays)
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.put(None)
+
+
+class ReasonDrawStage(Stage):
+    """
+    Risk rules, event tracking (JSONL track) and overlay drawing.
+    """
+
+    def __init__(self, names, inbox, outbox, track_file, near_threshold=NEAR_THRESHOLD):
+        super().__init__('reason+draw', inbox, outbox, self.process)
+        self.names = names
+        self.track_file = track_file
+        self.near_threshold = near_threshold
+        self.tracker = risk_events.RiskEventTracker(describe=explanation_templates.describe_risk, ongoing_interval=0)
+        self.events = 0
+
+    def process(self, item):
+        index, ts, frame, boxes, confs, class_ids = item
+        objects = detections.to_objects(boxes, confs, class_ids, self.names)
+        reasoning_objects = [obj for obj in objects if obj['categories']]
+        pairs = risk_rules.find_risk_pairs(reasoning_objects, self.near_threshold)
+
+        for event in self.tracker.update(pairs, ts):
+            self.track_file.write(json.dumps(dict(event, frame=index)) + '\n')
+            self.events += 1
+
+        draw_overlay(frame, objects, [text for (_, _, _, text) in self.tracker.active()])
+        self.put(frame)
+
+
+def draw_overlay(image, objects, explanations):
+    """
+    Draws boxes and up to three explanations in place (same look as the live runner).
+    """
+    for obj in objects:
+        x1, y1, x2, y2 = obj['box']
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(image, obj['name'], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    for i, text in enumerate(explanations[:3]):
+        cv2.putText(image, text, (10, 30 + i * 25), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1, cv2.LINE_AA)
+
+
+def annotate(model, source, out_path, track_path, batch_size=BATCH_SIZE, imgsz=IMGSZ, conf=CONF):
+    """
+    Runs the pipeline over one source.
+
+    Returns:
+        dict: frames, elapsed seconds, source fps, events and the stage objects.
+    """
+    cap = recording.open_source(source)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open {source}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*FOURCC), fps, (width, height))
+
+    decoded, detected, drawn = (queue.Queue(maxsize=QUEUE_SIZE) for _ in range(3))
+    with open(track_path, 'w') as track_file:
+        reason = ReasonDrawStage(model.names, detected, drawn, track_file)
+        stages = [DecodeStage(cap, decoded, fps),
+                  DetectStage(model, decoded, detected, batch_size, imgsz, conf),
+                  reason,
+                  Stage('encode', drawn, None, writer.write)]
+
+        start = time.perf_counter()
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        elapsed = time.perf_counter() - start
+
+    cap.release()
+    writer.release()
+    for stage in stages:
+        if stage.error is not None:
+            raise RuntimeError(f"Stage {stage.name} failed") from stage.error
+
+    return {'frames': stages[-1].items, 'elapsed': elapsed, 'fps': fps, 'events': reason.events, 'stages': stages}
+
+
+def report(run):
+    frames, elapsed = run['frames'], run['elapsed']
+    speed = frames / max(elapsed, 1e-6)
+    lines = [f"Annotated {frames} frames in {elapsed:.2f}s: {speed:.1f} FPS "
+             f"({speed / run['fps']:.2f}x real time at {run['fps']:.1f} FPS source), {run['events']} risk events"]
+    lines.append(f"{'stage':>12} | {'busy':>6} | {'wait in':>7} | {'blocked':>7} | ms/frame")
+    bottleneck = max(run['stages'], key=lambda s: s.busy)
+    for stage in run['stages']:
+        lines.append(f"{stage.name:>12} | {100 * stage.busy / elapsed:5.1f}% | {100 * stage.wait_in / elapsed:6.1f}% | "
+                     f"{100 * stage.wait_out / elapsed:6.1f}% | {1e3 * stage.busy / max(1, stage.items):7.2f}"
+                     f"{'  <- bottleneck' if stage is bottleneck else ''}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate a video or recording without a display.")
+    parser.add_argument('source', help="Video file or recording directory")
+    parser.add_argument('--out', help="Annotated video (default: <source>_annotated.mp4)")
+    parser.add_argument('--track', help="JSONL risk event track (default: <source>_events.jsonl)")
+    parser.add_argument('--model', default='yolov8n.pt')
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE)
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--conf', type=float, default=CONF)
+    args = parser.parse_args()
+
+    base = os.path.splitext(args.source.rstrip('/'))[0]
+    out_path = args.out or base + '_annotated.mp4'
+    track_path = args.track or base + '_events.jsonl'
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    run = annotate(model, args.source, out_path, track_path, args.batch, args.imgsz, args.conf)
+    print(report(run))
+    print(f"✅ Video: {out_path} | Events: {track_path}")
+
+
+if __name__ == "__main__":
+    main()